@@ -0,0 +1,50 @@
+#!/bin/sh
+
+# Slurm flags
+#SBATCH -p ProdQ
+#SBATCH -N {{ nodes }}
+#SBATCH --ntasks-per-node={{ tasks_per_node }}
+#SBATCH --cpus-per-task={{ cpus_per_task }}
+#SBATCH -t 01:00:00
+#SBATCH --job-name={{ m }}_ddp_{{ s }}_{{ r }}_{{ i }}_{{ nq }}_{{ qd }}_{{ sb }}_{{ lr }}_{{ wd }}_{{ slr }}_{{ g }}
+
+# Charge job to my project
+#SBATCH -A iccom018c
+
+# Write stdout+stderr to file
+#SBATCH -o ./benchmarking/hpc/slurm_output/{{ m }}_ddp_{{ s }}_{{ r }}_{{ i }}_{{ nq }}_{{ qd }}_{{ sb }}_{{ lr }}_{{ wd }}_{{ slr }}_{{ g }}.txt
+
+cd /ichec/work/iccom018c
+
+cd WP6_QNLP/neasqc_wp61
+
+module load conda
+
+source activate /ichec/work/iccom018c/.conda/alpha
+
+# Each task of the job is one process of the distributed run. The
+# processes find each other on the first node of the job, from the
+# SLURM variables set by srun.
+export MASTER_PORT=29500
+
+# -m : Model to be ran - either beta_2 or beta_3
+# -op : Choice of torch optimiser
+# -s : Seed for the initial parameters
+# -i : Number of iterations of the optimiser
+# -r : Number of runs
+# -dat : Directory of the full dataset
+# -te : Directory of the test datset
+# -o : Output directory with the predictions
+# -nq : Number of qubits in our circuit
+# -qd : Initial spread of the parameters
+# -b : Batch size, summed over the processes
+# -lr : Learning rate
+# -wd : Weight decay
+# -slr : Step size for the learning rate scheduler
+# -g : Gamma for the learning rate scheduler
+# -ddp : Distributed data parallel training
+
+echo "`date +%T`"
+
+srun python ./data/data_processing/use_beta_2_3.py -m {{ m }} -op {{ op }} -s {{ s }} -i {{ i }} -r {{ r }} -dat {{ dat }} -te {{ te }} -o ./benchmarking/results/raw/ -nq {{ nq }} -qd {{ qd }} -b {{ sb }} -lr {{ lr }} -wd {{ wd }} -slr {{ slr }} -g {{ g }} -sim torch -ddp
+echo "`date +%T`"
@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../../models/quantum/beta_1/")
+from quantum_distance import QuantumDistance as qd
+from index_register_distance import IndexRegisterDistance
+
+
+def random_normalised_vectors(rng, n_vectors, dimension):
+    X = rng.normal(size=(n_vectors, dimension))
+    return X / np.linalg.norm(X, axis=1, keepdims=True)
+
+
+def benchmark_size(rng, n_train, dimension, n_queries):
+    """
+    Times the per-pair circuits and the index register circuit for
+    one training-set size, checking that both give the same result
+    """
+    X_train = random_normalised_vectors(rng, n_train, dimension)
+    X_test = random_normalised_vectors(rng, n_queries, dimension)
+    t1 = time.time()
+    per_pair = np.array([qd.compute_many(x, X_train) for x in X_test])
+    t2 = time.time()
+    engine = IndexRegisterDistance(X_train)
+    t3 = time.time()
+    index_register = np.array(
+        [engine.compute_ancilla_probabilities(x) for x in X_test])
+    t4 = time.time()
+    return {
+        'n_train' : n_train,
+        'n_qubits_per_pair' : engine.nq_encoding + 3,
+        'n_qubits_index_register' : engine.nq,
+        'per_pair_time_per_query' : (t2 - t1) / n_queries,
+        'index_register_setup_time' : t3 - t2,
+        'index_register_time_per_query' : (t4 - t3) / n_queries,
+        'max_abs_difference' : float(np.abs(per_pair - index_register).max())
+    }
+
+
+def find_crossover(results, n_queries):
+    """
+    Smallest training-set size from which the index register is faster
+    per query, first ignoring and then amortising its setup time over
+    n_queries test vectors
+    """
+    crossover = {'per_query' : None, 'amortised' : None}
+    for result in results:
+        amortised = (
+            result['index_register_time_per_query'] +
+            result['index_register_setup_time'] / n_queries
+        )
+        if (crossover['per_query'] is None and
+                result['index_register_time_per_query'] <
+                result['per_pair_time_per_query']):
+            crossover['per_query'] = result['n_train']
+        if (crossover['amortised'] is None and
+                amortised < result['per_pair_time_per_query']):
+            crossover['amortised'] = result['n_train']
+    return crossover
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for n_train in args.train_sizes:
+        result = benchmark_size(rng, n_train, args.dimension, args.queries)
+        print(result)
+        results.append(result)
+    output = {
+        'dimension' : args.dimension,
+        'queries' : args.queries,
+        'amortised_queries' : args.amortised_queries,
+        'results' : results,
+        'crossover' : find_crossover(results, args.amortised_queries)
+    }
+    print('Crossover : ', output['crossover'])
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as file:
+        json.dump(output, file, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark of the index register quantum KNN against "
+        "one SWAP test circuit per training vector")
+    parser.add_argument("-n", "--train_sizes", nargs='+', help = "Training-set sizes to benchmark", type = int, default = [2, 4, 8, 16, 32, 64, 128])
+    parser.add_argument("-d", "--dimension", help = "Dimension of the vectors", type = int, default = 8)
+    parser.add_argument("-q", "--queries", help = "Number of test vectors timed for each size", type = int, default = 5)
+    parser.add_argument("-aq", "--amortised_queries", help = "Number of test vectors over which the setup of the index register is amortised", type = int, default = 1000)
+    parser.add_argument("-s", "--seed", help = "Seed of the random vectors", type = int, default = 0)
+    parser.add_argument("-o", "--output", help = "Path of the JSON file with the results", type = str, default = current_path + "/../results/raw/benchmark_index_register.json")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,101 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+import torch
+import torch.nn as nn
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../../models/quantum/alpha/module/")
+sys.path.append(current_path + "/../../models/quantum/beta_2_3/")
+from alpha_3_multiclass_model import Alpha_3_multiclass_model
+from beta_2_3_model import Beta_2_3_model
+
+models = {
+    'alpha_3_multiclass' : (Alpha_3_multiclass_model, 768),
+    'beta_2_3' : (Beta_2_3_model, None)
+}
+# beta_2_3 takes as many features as qubits
+
+qml_devices = ('default.qubit', 'lightning.qubit')
+diff_methods = ('backprop', 'adjoint', 'parameter-shift')
+
+
+def time_training_step(qml_device, diff_method, args):
+    """
+    Times the forward and backward passes of a training step on a
+    random batch, keeping the fastest of a few repeats. A combination
+    that PennyLane rejects (for instance backprop on lightning.qubit or
+    adjoint with shots) is reported with the error instead of a time.
+    """
+    result = {
+        'qml_device' : qml_device,
+        'diff_method' : diff_method,
+        'shots' : args.shots
+    }
+    model_class, n_features = models[args.model]
+    n_features = n_features or args.n_qubits
+    torch.manual_seed(args.seed)
+    inputs = torch.randn(args.batch_size, n_features)
+    labels = nn.functional.one_hot(
+        torch.randint(args.n_classes, (args.batch_size,)), args.n_classes
+    ).float()
+    criterion = nn.CrossEntropyLoss()
+    try:
+        model = model_class(
+            args.n_qubits, 0.01, args.n_classes, 'cpu',
+            qml_device=qml_device, diff_method=diff_method, shots=args.shots)
+        step_times = []
+        for _ in range(args.repeats):
+            model.zero_grad()
+            t1 = time.perf_counter()
+            criterion(model(inputs), labels).backward()
+            step_times.append(time.perf_counter() - t1)
+    except Exception as error:
+        result['error'] = repr(error)[:500]
+        return result
+    result['step_time'] = min(step_times)
+    return result
+
+
+def main(args):
+    results = [
+        time_training_step(qml_device, diff_method, args)
+        for qml_device, diff_method in itertools.product(
+            args.qml_devices, args.diff_methods)
+    ]
+    for result in results:
+        print(json.dumps(result))
+    valid = [result for result in results if 'step_time' in result]
+    fastest = min(valid, key=lambda result: result['step_time'], default=None)
+    print('Fastest combination: ', json.dumps(fastest))
+    if args.output is not None:
+        os.makedirs(
+            os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as file:
+            json.dump({
+                'input_args' : vars(args),
+                'results' : results,
+                'fastest' : fastest
+            }, file, indent=4)
+    return fastest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Finds the fastest PennyLane device and differentiation "
+        "method for a training step of a dressed model with a given number "
+        "of qubits and batch size")
+    parser.add_argument("-m", "--model", help = "Model to benchmark", type = str, choices = list(models), default = 'beta_2_3')
+    parser.add_argument("-nq", "--n_qubits", help = "Number of qubits", type = int, default = 3)
+    parser.add_argument("-b", "--batch_size", help = "Batch size", type = int, default = 2048)
+    parser.add_argument("-sh", "--shots", help = "Number of shots, exact expectation values if not given", type = int, default = None)
+    parser.add_argument("-qdev", "--qml_devices", nargs='+', help = "PennyLane devices to compare", type = str, choices = qml_devices, default = list(qml_devices))
+    parser.add_argument("-dm", "--diff_methods", nargs='+', help = "Differentiation methods to compare", type = str, choices = diff_methods, default = list(diff_methods))
+    parser.add_argument("-nc", "--n_classes", help = "Number of classes", type = int, default = 4)
+    parser.add_argument("-r", "--repeats", help = "Number of timed training steps, the fastest is reported", type = int, default = 3)
+    parser.add_argument("-s", "--seed", help = "Seed of the random data", type = int, default = 0)
+    parser.add_argument("-o", "--output", help = "Path of the JSON file with the results", type = str, default = None)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,198 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from qiskit import transpile
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../../models/quantum/beta_1/")
+
+engines = ('per_pair', 'batched', 'template', 'shot_based')
+# per_pair runs the circuit of each pair on its own, batched runs
+# all the pairs of a query as one job (compute_many), template binds
+# them to the transpiled template (compute_many_from_template) and
+# shot_based is the two-dimensional variant in QuantumDistance.py
+
+
+def random_normalised_vectors(rng, n_vectors, dimension):
+    X = rng.normal(size=(n_vectors, dimension))
+    return X / np.linalg.norm(X, axis=1, keepdims=True)
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of the process in MB, which includes the
+    memory allocated by the Aer simulators
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kB elsewhere
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def compute_pair_distance(qd, x, vector, method):
+    """
+    Runs the circuit of one pair with compute_quantum_distance, which
+    saves the statevector. The density_matrix method cannot save it,
+    so with that method the circuit saves the probabilities of the
+    ancilla qubit instead
+    """
+    distance = qd(x, vector)
+    if method != 'density_matrix':
+        return distance.compute_quantum_distance(method=method)
+    distance.build_swap_test_circuit()
+    distance.qc.save_probabilities([distance.nq - 1])
+    sim = qd.get_simulator(method=method)
+    result = sim.run(transpile(distance.qc, sim), shots=None).result()
+    return qd.distance_prob0_relation(result.data(0)['probabilities'][0])
+
+
+def run_case(case):
+    """
+    Runs one benchmark case. Each case runs in a fresh process, so that
+    the peak memory and the caches of QuantumDistance only reflect it.
+    A case that an engine does not support is reported with the error
+    instead of timings.
+    """
+    try:
+        return time_case(case)
+    except Exception as error:
+        result = dict(case)
+        result['error'] = repr(error)[:500]
+        return result
+
+
+def time_case(case):
+    """
+    Times the queries of one benchmark case
+    """
+    from quantum_distance import QuantumDistance as qd
+    from QuantumDistance import QuantumDistance as ShotQuantumDistance
+    rng = np.random.default_rng(case['seed'])
+    X_train = random_normalised_vectors(
+        rng, case['batch_size'], case['dimension'])
+    X_test = random_normalised_vectors(
+        rng, case['queries'], case['dimension'])
+    baseline_rss = peak_rss_mb()
+    query_times = []
+    for x in X_test:
+        t1 = time.perf_counter()
+        if case['engine'] == 'per_pair':
+            for vector in X_train:
+                compute_pair_distance(qd, x, vector, case['method'])
+        elif case['engine'] == 'batched':
+            qd.compute_many(x, X_train, method=case['method'])
+        elif case['engine'] == 'template':
+            qd.compute_many_from_template(x, X_train, method=case['method'])
+        else:
+            for vector in X_train:
+                ShotQuantumDistance(x, vector)
+        query_times.append(time.perf_counter() - t1)
+    wall_time = sum(query_times)
+    result = dict(case)
+    result.update({
+        'pairs' : case['queries'] * case['batch_size'],
+        'wall_time' : wall_time,
+        'pairs_per_second' : case['queries'] * case['batch_size'] / wall_time,
+        'wall_time_per_query' : wall_time / case['queries'],
+        'first_query_time' : query_times[0],
+        'steady_wall_time_per_query' : (
+            np.mean(query_times[1:]) if len(query_times) > 1
+            else query_times[0]
+        ),
+        'baseline_peak_rss_mb' : baseline_rss,
+        'peak_rss_mb' : peak_rss_mb()
+    })
+    return result
+
+
+def build_cases(args):
+    """
+    Builds the grid of cases. The shot based variant only encodes two
+    dimensional vectors and has no simulation method to choose, so it
+    is only run once per batch size.
+    """
+    cases = []
+    for engine, dimension, method, batch_size in itertools.product(
+        args.engines, args.dimensions, args.methods, args.batch_sizes
+    ):
+        if engine == 'shot_based' and (
+            dimension != 2 or method != args.methods[0]
+        ):
+            continue
+        cases.append({
+            'engine' : engine,
+            'dimension' : dimension,
+            'method' : method if engine != 'shot_based' else 'automatic',
+            'batch_size' : batch_size,
+            'queries' : args.queries,
+            'seed' : args.seed
+        })
+    return cases
+
+
+def environment():
+    """
+    Versions and machine the benchmark was run with, to compare runs
+    between releases
+    """
+    import qiskit
+    import qiskit_aer
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=current_path,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'hash' : commit,
+        'python' : platform.python_version(),
+        'numpy' : np.__version__,
+        'qiskit' : qiskit.__version__,
+        'qiskit_aer' : qiskit_aer.__version__,
+        'platform' : platform.platform(),
+        'processor' : platform.processor(),
+        'cpu_count' : os.cpu_count(),
+        'date' : time.strftime("%Y%m%d-%H%M%S")
+    }
+
+
+def main(args):
+    cases = build_cases(args)
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for i, case in enumerate(cases):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(run_case, case).result()
+        print(f'[{i + 1}/{len(cases)}]', json.dumps(result))
+        results.append(result)
+    output = {
+        'environment' : environment(),
+        'input_args' : vars(args),
+        'results' : results
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as file:
+        json.dump(output, file, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark of the quantum distance computation across "
+        "vector dimensions, Aer methods, batch sizes and engines")
+    parser.add_argument("-e", "--engines", nargs='+', help = "Engines to benchmark", type = str, choices = engines, default = list(engines))
+    parser.add_argument("-d", "--dimensions", nargs='+', help = "Dimensions of the vectors", type = int, default = [2, 4, 16, 64, 256])
+    parser.add_argument("-m", "--methods", nargs='+', help = "Aer simulation methods", type = str, choices = ['statevector', 'matrix_product_state', 'density_matrix'], default = ['statevector', 'matrix_product_state', 'density_matrix'])
+    parser.add_argument("-bs", "--batch_sizes", nargs='+', help = "Number of training vectors compared with each query", type = int, default = [1, 16])
+    parser.add_argument("-q", "--queries", help = "Number of queries of each case", type = int, default = 3)
+    parser.add_argument("-s", "--seed", help = "Seed of the random vectors", type = int, default = 0)
+    parser.add_argument("-o", "--output", help = "Path of the JSON file with the results", type = str, default = current_path + "/../results/raw/benchmark_quantum_distance_" + time.strftime("%Y%m%d-%H%M%S") + ".json")
+    args = parser.parse_args()
+    main(args)
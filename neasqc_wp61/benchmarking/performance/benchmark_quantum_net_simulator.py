@@ -0,0 +1,90 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, TensorDataset
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../../models/quantum/alpha/module/")
+sys.path.append(current_path + "/../../models/quantum/beta_2_3/")
+from alpha_3_multiclass_model import Alpha_3_multiclass_model
+from beta_2_3_model import Beta_2_3_model
+
+models = {
+    'alpha_3_multiclass' : (Alpha_3_multiclass_model, 768),
+    'beta_2_3' : (Beta_2_3_model, None)
+}
+# beta_2_3 takes as many features as qubits
+
+
+def time_epochs(model_name, simulator, n_qubits, args):
+    """
+    Trains a dressed model for a few epochs on random features shaped
+    like the sentence embeddings of the AG News runs (four classes),
+    returning the time of each epoch
+    """
+    model_class, n_features = models[model_name]
+    n_features = n_features or n_qubits
+    torch.manual_seed(args.seed)
+    X = torch.randn(args.n_samples, n_features)
+    Y = nn.functional.one_hot(
+        torch.randint(args.n_classes, (args.n_samples,)), args.n_classes
+    ).float()
+    dataloader = DataLoader(
+        TensorDataset(X, Y), batch_size=args.batch_size, shuffle=True)
+    model = model_class(
+        n_qubits, 0.01, args.n_classes, 'cpu', simulator=simulator)
+    criterion = nn.CrossEntropyLoss()
+    opt = torch.optim.Adam(model.parameters(), lr=2e-3)
+    epoch_times = []
+    for _ in range(args.epochs):
+        t1 = time.perf_counter()
+        model.train()
+        for inputs, labels in dataloader:
+            opt.zero_grad()
+            loss = criterion(model(inputs), labels)
+            loss.backward()
+            opt.step()
+        epoch_times.append(time.perf_counter() - t1)
+    return epoch_times
+
+
+def main(args):
+    results = []
+    for model_name, n_qubits in itertools.product(args.models, args.n_qubits):
+        times = {}
+        for simulator in ['pennylane', 'torch']:
+            times[simulator] = time_epochs(model_name, simulator, n_qubits, args)
+        result = {
+            'model' : model_name,
+            'n_qubits' : n_qubits,
+            'pennylane_epoch_time' : min(times['pennylane']),
+            'torch_epoch_time' : min(times['torch']),
+            'speedup' : min(times['pennylane']) / min(times['torch'])
+        }
+        print(json.dumps(result))
+        results.append(result)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as file:
+        json.dump({'input_args' : vars(args), 'results' : results}, file,
+                  indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Epoch time of the dressed models with the circuit "
+        "simulated by a PennyLane QNode and by the torch statevector "
+        "simulation")
+    parser.add_argument("-m", "--models", nargs='+', help = "Models to benchmark", type = str, choices = list(models), default = list(models))
+    parser.add_argument("-nq", "--n_qubits", nargs='+', help = "Numbers of qubits", type = int, default = [3, 5, 8])
+    parser.add_argument("-ns", "--n_samples", help = "Number of training samples", type = int, default = 4096)
+    parser.add_argument("-nc", "--n_classes", help = "Number of classes", type = int, default = 4)
+    parser.add_argument("-b", "--batch_size", help = "Batch size", type = int, default = 2048)
+    parser.add_argument("-e", "--epochs", help = "Number of timed epochs, the fastest is reported", type = int, default = 2)
+    parser.add_argument("-s", "--seed", help = "Seed of the random data", type = int, default = 0)
+    parser.add_argument("-o", "--output", help = "Path of the JSON file with the results", type = str, default = current_path + "/../results/raw/benchmark_quantum_net_simulator_" + time.strftime("%Y%m%d-%H%M%S") + ".json")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../../models/quantum/beta_1/")
+from quantum_distance import QuantumDistance as qd
+
+
+def random_normalised_vectors(rng, n_vectors, dimension):
+    X = rng.normal(size=(n_vectors, dimension))
+    return X / np.linalg.norm(X, axis=1, keepdims=True)
+
+
+def benchmark_dimension(rng, dimension, n_train, n_queries):
+    """
+    Times the build-and-transpile path and the template-bind path for
+    one vector dimension, checking that both give the same result
+    """
+    X_train = random_normalised_vectors(rng, n_train, dimension)
+    X_test = random_normalised_vectors(rng, n_queries, dimension)
+    t1 = time.time()
+    transpiled = np.array([qd.compute_many(x, X_train) for x in X_test])
+    t2 = time.time()
+    qd.templates.clear()
+    qd.get_template(int(np.ceil(np.log2(dimension))))
+    t3 = time.time()
+    bound = np.array(
+        [qd.compute_many_from_template(x, X_train) for x in X_test])
+    t4 = time.time()
+    n_pairs = n_train * n_queries
+    return {
+        'dimension' : dimension,
+        'n_pairs' : n_pairs,
+        'transpile_time_per_pair' : (t2 - t1) / n_pairs,
+        'template_build_time' : t3 - t2,
+        'template_time_per_pair' : (t4 - t3) / n_pairs,
+        'speedup' : (t2 - t1) / (t4 - t3),
+        'max_abs_difference' : float(np.abs(transpiled - bound).max())
+    }
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for dimension in args.dimensions:
+        result = benchmark_dimension(
+            rng, dimension, args.train_size, args.queries)
+        print(result)
+        results.append(result)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as file:
+        json.dump({'results' : results}, file, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark of the parametrised SWAP test template "
+        "against building and transpiling a circuit per pair")
+    parser.add_argument("-d", "--dimensions", nargs='+', help = "Dimensions of the vectors", type = int, default = [2, 4, 8, 16, 32])
+    parser.add_argument("-n", "--train_size", help = "Number of training vectors compared with each query", type = int, default = 32)
+    parser.add_argument("-q", "--queries", help = "Number of queries", type = int, default = 4)
+    parser.add_argument("-s", "--seed", help = "Seed of the random vectors", type = int, default = 0)
+    parser.add_argument("-o", "--output", help = "Path of the JSON file with the results", type = str, default = current_path + "/../results/raw/benchmark_template.json")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,46 @@
+import sys
+import os
+
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../../models/quantum/common/")
+import argparse
+import time
+
+from feature_store import write_feature_store, feature_store_path
+
+
+parser = argparse.ArgumentParser(
+    description="Converts CSV datasets with embedding columns into feature "
+    "stores of memory-mapped float32 arrays. The alpha_3 and beta_2/beta_3 "
+    "loaders read the store next to a CSV instead of parsing it."
+)
+
+parser.add_argument(
+    "-i",
+    "--input",
+    nargs="+",
+    help="CSV files to convert",
+    type=str,
+)
+parser.add_argument(
+    "-cs",
+    "--chunk_size",
+    help="Number of rows parsed at once",
+    type=int,
+    default=10000,
+)
+
+
+def main(args):
+    for csv_file in args.input:
+        t_before = time.time()
+        store_path = write_feature_store(
+            csv_file, feature_store_path(csv_file), args.chunk_size
+        )
+        t_after = time.time()
+        print(f"Converted {csv_file} to {store_path} in {t_after - t_before} s")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    main(args)
@@ -19,13 +19,30 @@ def main():
     parser.add_argument("-pca", "--pca_dimension", type= int, help = "Principal component dimension")
     parser.add_argument("-k", "--k",  nargs='+', help = "Number of K neighbors", type = int, default = [1, 3, 5, 7, 9])
     parser.add_argument("-o", "--output", help = "Output directory with the predictions", type = str, default = "../../benchmarking/results/raw/")
+    parser.add_argument("-be", "--backend", help = "How to evaluate the quantum distances: simulating each circuit on Aer, computing them analytically, emulating a finite number of shots or adding shots adaptively until the closest training vectors are found. index_register simulates one circuit per test vector with the training set behind an index register. template binds the angles of each pair to a circuit transpiled once", type = str, choices = ['aer', 'analytic', 'emulated', 'adaptive', 'index_register', 'template'], default = 'aer')
+    parser.add_argument("-bs", "--batch_size", help = "Number of test vectors processed at once by the analytic and emulated backends", type = int, default = 256)
+    parser.add_argument("-sh", "--shots", help = "Number of shots of each circuit with the emulated backend, maximum number of shots with the adaptive one", type = int, default = 1024)
+    parser.add_argument("-spr", "--shots_per_round", help = "Number of shots added in each round of the adaptive backend", type = int, default = 64)
+    parser.add_argument("-cl", "--confidence", help = "Confidence level used by the adaptive backend to stop adding shots", type = float, default = 0.99)
+    parser.add_argument("-as", "--adaptive_sampler", help = "Whether the adaptive backend emulates its shots or runs them on Aer", type = str, choices = ['emulated', 'aer'], default = 'emulated')
+    parser.add_argument("-s", "--seed", help = "Seed of the shot emulation", type = int, default = 0)
+    parser.add_argument("-cd", "--checkpoint_dir", help = "Directory where the checkpoints of the predictions are stored", type = str, default = None)
+    parser.add_argument("-id", "--run_id", help = "Identifier of the run in the checkpoint directory. Rerunning with the same identifier resumes the run", type = str, default = None)
+    parser.add_argument("-ds", "--distance_store_dir", help = "Directory where the quantum distance matrices are stored and reused between runs on the same data", type = str, default = None)
+    parser.add_argument("-sf", "--shortlist_factor", help = "If given, quantum distances are only computed for shortlist_factor * max(k) candidates found with a classical ball tree", type = int, default = None)
+    parser.add_argument("-nw", "--n_workers", help = "Number of processes among which the test vectors are split", type = int, default = 1)
+    parser.add_argument("-fc", "--feature_cache_dir", help = "Directory where the preprocessed vectors, labels and PCA are stored and reused between runs on the same data", type = str, default = None)
+    parser.add_argument("-cv", "--cross_validation", help = "Evaluate every k on the training set from a single matrix of training distances instead of predicting the test set", action = "store_true")
+    parser.add_argument("-nf", "--n_folds", help = "Number of folds of the cross validation (leave-one-out if not given)", type = int, default = None)
+    parser.add_argument("-mpe", "--max_parallel_experiments", help = "Maximum number of circuits simulated in parallel by Aer (0 for all available threads)", type = int, default = 0)
 
     args = parser.parse_args()
 
     print(args)
 
     X_train, X_test, y_train, y_test = qkn.load_labels(
-        args.train, args.test, args.pca_dimension)
+        args.train, args.test, args.pca_dimension,
+        cache_dir = args.feature_cache_dir)
     
 
     X_test = qkn.normalise_vector(X_test)
@@ -52,10 +69,28 @@ def main():
     t1 = time.time()
     
     beta_model = qkn(
-        X_train, X_test, y_train, y_test, k_values
+        X_train, X_test, y_train, y_test, k_values,
+        backend = args.backend, batch_size = args.batch_size,
+        max_parallel_experiments = args.max_parallel_experiments,
+        shortlist_factor = args.shortlist_factor,
+        shots = args.shots, seed = args.seed,
+        shots_per_round = args.shots_per_round, confidence = args.confidence,
+        adaptive_sampler = args.adaptive_sampler
     )
+    if args.cross_validation:
+        predictions_list, accuracies = beta_model.cross_validate(
+            n_folds = args.n_folds, seed = args.seed)
+        time_taken = time.time() - t1
+        print("Cross validation accuracies: ", accuracies)
+        for i, k in enumerate(k_values):
+            json_outputer = JsonOutputer(f"beta_1_{k}", timestr, args.output)
+            json_outputer.save_json_output(args, predictions_list[:, i].tolist(), time_taken, final_val_acc = [accuracies[k]], best_final_val_acc = accuracies[k], k = k, cross_validation = True)
+        return
+
     beta_model.compute_predictions(
-        compute_checkpoints = True
+        compute_checkpoints = True, n_workers = args.n_workers,
+        checkpoint_dir = args.checkpoint_dir, run_id = args.run_id,
+        distance_store_dir = args.distance_store_dir
     )
     predictions_list = beta_model.get_predictions()
 
@@ -76,6 +111,17 @@ def main():
     t2 = time.time()
     time_taken = t2 - t1 # /!\ Time taken for the whole algorithm, so for all k values
 
+    shortlist_recall = {}
+    if args.shortlist_factor is not None:
+        shortlist_recall = beta_model.compute_shortlist_recall()
+        if shortlist_recall:
+            print("Shortlist recall against exhaustive search: ", shortlist_recall)
+        else:
+            backend = args.backend
+            if args.backend == 'adaptive':
+                backend += f" ({args.adaptive_sampler} sampler)"
+            print(f"Shortlist recall is not available with the {backend} backend, as the exhaustive search would run every circuit again on Aer")
+
     for i in range(len(k_values)):
         k = k_values[i]
         predictions = predictions_list[i]
@@ -86,7 +132,13 @@ def main():
         # Create the JsonOutputer object
         json_outputer = JsonOutputer(model_name, timestr, args.output)
 
-        json_outputer.save_json_output(args, predictions.tolist(), time_taken, final_val_acc = [accuracy_test], best_final_val_acc=accuracy_test, k = k)
+        extra_outputs = {}
+        if k in shortlist_recall:
+            extra_outputs['shortlist_recall'] = shortlist_recall[k]
+        if args.backend == 'adaptive':
+            extra_outputs['shot_statistics'] = beta_model.get_shot_statistics()
+
+        json_outputer.save_json_output(args, predictions.tolist(), time_taken, final_val_acc = [accuracy_test], best_final_val_acc=accuracy_test, k = k, **extra_outputs)
 
     # We save the json output 
 
@@ -0,0 +1,180 @@
+import sys
+import os
+import argparse
+import contextlib
+import json
+import time
+from itertools import islice
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../../models/quantum/beta_1/")
+from beta_1 import QuantumKNearestNeighbours as qkn
+import numpy as np
+
+
+def read_queries(lines):
+    """
+    Parses the lines of the query stream. Each line holds either a
+    JSON list with an embedding, or a JSON object with the embedding in
+    'sentence_embedding' and optionally an 'id'. Queries without id
+    are identified by their position in the stream. Blank lines are
+    skipped.
+
+    Parameters
+    ----------
+    lines : iterable
+        Lines of the stream
+
+    Yields
+    ------
+    query_id :
+        Identifier of the query
+    embedding : list or str, or None
+        The embedding, None if the line could not be parsed
+    error : str or None
+        Why the line could not be parsed
+    """
+    position = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        query_id = position
+        position += 1
+        try:
+            query = json.loads(line)
+            if isinstance(query, dict):
+                query_id = query.get('id', query_id)
+                query = query['sentence_embedding']
+            yield query_id, query, None
+        except (json.JSONDecodeError, KeyError) as error:
+            yield query_id, None, repr(error)
+
+
+def parse_query(embedding, pca):
+    """
+    Parses the embedding of one query, checking that it is a vector
+    with the dimension the PCA was fitted on
+    """
+    x = qkn.parse_embeddings([embedding])
+    if x.shape != (1, pca.n_features_in_):
+        raise ValueError(
+            f'Expected an embedding of dimension {pca.n_features_in_}, '
+            f'got an array of shape {x.shape[1:]}'
+        )
+    return x[0]
+
+
+def preprocess_queries(X, pca):
+    """
+    Applies to the queries the preprocessing of the training vectors:
+    PCA, normalisation and zero padding up to a power of 2
+    """
+    X = pca.transform(X)
+    return qkn.pad_zeros_vector(qkn.normalise_vector(X))
+
+
+def classify_micro_batch(beta_model, pca, classes, micro_batch):
+    """
+    Classifies the queries of a micro-batch, returning one output
+    record per query. A query that cannot be classified gets an error
+    record instead of stopping the stream, and the valid queries of
+    the micro-batch are classified together.
+    """
+    records = [
+        {'id' : query_id, 'error' : error}
+        for query_id, _, error in micro_batch
+    ]
+    valid = []
+    vectors = []
+    for position, (_, embedding, error) in enumerate(micro_batch):
+        if error is not None:
+            continue
+        try:
+            vectors.append(parse_query(embedding, pca))
+            valid.append(position)
+        except (ValueError, TypeError) as error:
+            records[position]['error'] = repr(error)
+    if valid:
+        X = preprocess_queries(np.array(vectors), pca)
+        pred_batch = beta_model.predict_batch(X)
+        for position, pred_list in zip(valid, pred_batch):
+            records[position] = {
+                'id' : micro_batch[position][0],
+                'predictions' : {
+                    str(k) : classes[label].item()
+                    for k, label in zip(beta_model.k_values, pred_list)
+                }
+            }
+    return records
+
+
+def main():
+
+    # The progress messages of the model go to stderr, so that stdout
+    # only carries the predictions
+    stdout = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        run(stdout)
+
+
+def run(stdout):
+
+    parser = argparse.ArgumentParser(
+        description="Classifies a stream of sentence embeddings with the "
+        "quantum KNN. The training set is loaded once, and the predictions "
+        "for every k are written as a JSON line per query as soon as its "
+        "micro-batch is classified.")
+    parser.add_argument("-tr", "--train", help = "Directory of the train dataset", type = str, default = '../toy_dataset/toy_dataset_bert_sentence_embedding_train.csv')
+    parser.add_argument("-pca", "--pca_dimension", type= int, help = "Principal component dimension")
+    parser.add_argument("-k", "--k",  nargs='+', help = "Number of K neighbors", type = int, default = [1, 3, 5, 7, 9])
+    parser.add_argument("-i", "--input", help = "JSONL file with the queries, - for stdin", type = str, default = '-')
+    parser.add_argument("-o", "--output", help = "JSONL file where the predictions are written, - for stdout", type = str, default = '-')
+    parser.add_argument("-mb", "--micro_batch_size", help = "Number of queries classified at once", type = int, default = 32)
+    parser.add_argument("-be", "--backend", help = "How to evaluate the quantum distances", type = str, choices = qkn.backends, default = 'analytic')
+    parser.add_argument("-sh", "--shots", help = "Number of shots of each circuit with the emulated backend, maximum number of shots with the adaptive one", type = int, default = 1024)
+    parser.add_argument("-s", "--seed", help = "Seed of the shot emulation", type = int, default = 0)
+    parser.add_argument("-sf", "--shortlist_factor", help = "If given, quantum distances are only computed for shortlist_factor * max(k) candidates found with a classical ball tree", type = int, default = None)
+    parser.add_argument("-fc", "--feature_cache_dir", help = "Directory where the preprocessed training vectors, labels and PCA are stored and reused between runs on the same data", type = str, default = None)
+
+    args = parser.parse_args()
+
+    print(args)
+
+    X_train, y_train, classes, pca = qkn.load_training_set(
+        args.train, args.pca_dimension, cache_dir = args.feature_cache_dir)
+    X_train = qkn.pad_zeros_vector(qkn.normalise_vector(X_train))
+
+    beta_model = qkn(
+        X_train, np.empty((0, X_train.shape[1])), y_train, [], args.k,
+        backend = args.backend, batch_size = args.micro_batch_size,
+        shortlist_factor = args.shortlist_factor,
+        shots = args.shots, seed = args.seed
+    )
+
+    input_file = sys.stdin if args.input == '-' else open(args.input, 'r')
+    output_file = stdout if args.output == '-' else open(args.output, 'a')
+    queries = read_queries(input_file)
+    n_queries = 0
+    t1 = time.time()
+    try:
+        # Only one micro-batch is held in memory at a time
+        while True:
+            micro_batch = list(islice(queries, args.micro_batch_size))
+            if not micro_batch:
+                break
+            for record in classify_micro_batch(
+                beta_model, pca, classes, micro_batch
+            ):
+                output_file.write(json.dumps(record) + '\n')
+            output_file.flush()
+            n_queries += len(micro_batch)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not stdout:
+            output_file.close()
+    t2 = time.time()
+    print(f'Classified {n_queries} queries in {t2 - t1} s')
+
+
+if __name__ == "__main__":
+    main()
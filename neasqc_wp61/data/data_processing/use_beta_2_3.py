@@ -3,6 +3,7 @@ import os
 
 current_path = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_path + "/../../models/quantum/beta_2_3/")
+sys.path.append(current_path + "/../../models/quantum/common/")
 import argparse
 
 import json
@@ -13,9 +14,18 @@ import numpy as np
 import torch
 import time
 import git
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 from beta_2_3_trainer import Beta_2_3_trainer
 from save_json_output import JsonOutputer
+from vectorised_training import train_vectorised
+from distributed import init_distributed, is_main_process
+from fold_cache import FoldCache
+from utils import (
+    preprocess_train_test_dataset_for_beta_2,
+    preprocess_train_test_dataset_for_beta_3,
+)
 
 
 parser = argparse.ArgumentParser()
@@ -99,11 +109,221 @@ parser.add_argument(
     type=float,
     default=0.5,
 )
+parser.add_argument(
+    "-sim",
+    "--simulator",
+    help="Simulator of the circuit: a PennyLane QNode or the batched torch statevector simulation",
+    type=str,
+    choices=["pennylane", "torch"],
+    default="pennylane",
+)
+parser.add_argument(
+    "-qdev",
+    "--qml_device",
+    help="PennyLane device of the QNode",
+    type=str,
+    choices=["default.qubit", "lightning.qubit"],
+    default="default.qubit",
+)
+parser.add_argument(
+    "-dm",
+    "--diff_method",
+    help="Differentiation method of the QNode",
+    type=str,
+    choices=["best", "backprop", "adjoint", "parameter-shift"],
+    default="best",
+)
+parser.add_argument(
+    "-sh",
+    "--shots",
+    help="Number of shots of the QNode, exact expectation values if not given",
+    type=int,
+    default=None,
+)
+parser.add_argument(
+    "-fi",
+    "--frozen_inference",
+    help="Evaluate the validation and test sets with the circuit compiled for the trained weights",
+    action="store_true",
+)
+parser.add_argument(
+    "-pr",
+    "--parallel_runs",
+    help="Number of runs trained at once in separate processes, each on its own set of cores",
+    type=int,
+    default=1,
+)
+parser.add_argument(
+    "-vr",
+    "--vectorised_runs",
+    help="Train all the runs together in one process, vectorising the torch simulation over the runs",
+    action="store_true",
+)
+parser.add_argument(
+    "-ddp",
+    "--distributed",
+    help="Train each run with distributed data parallelism over the processes launched by torchrun or srun, with the gloo backend",
+    action="store_true",
+)
 
 args = parser.parse_args()
 
 
+def make_trainer(args, run_number, seed, fold_cache):
+    """
+    Creates the trainer of one run
+    """
+    return Beta_2_3_trainer(
+        args.model,
+        args.optimiser,
+        run_number,
+        args.iterations,
+        args.dataset,
+        args.test,
+        seed,
+        args.n_qubits,
+        args.q_delta,
+        args.batch_size,
+        args.lr,
+        args.weight_decay,
+        args.step_lr,
+        args.gamma,
+        simulator=args.simulator,
+        qml_device=args.qml_device,
+        diff_method=args.diff_method,
+        shots=args.shots,
+        frozen_inference=args.frozen_inference,
+        fold_cache=fold_cache,
+        distributed=args.distributed,
+    )
+
+
+def run(args, run_number, seed, fold_cache):
+    """
+    Trains and evaluates the model of one run
+    """
+    t_before = time.time()
+    print("\n")
+    print("-----------------------------------")
+    print("run = ", run_number + 1)
+    print("-----------------------------------")
+    print("\n")
+
+    trainer = make_trainer(args, run_number, seed, fold_cache)
+
+    (
+        training_loss_list,
+        training_acc_list,
+        validation_loss_list,
+        validation_acc_list,
+        best_val_acc,
+        best_model,
+    ) = trainer.train()
+
+    t_after = time.time()
+    print("Time taken for this run = ", t_after - t_before, "\n")
+    time_taken = t_after - t_before
+
+    prediction_list = trainer.predict().tolist()
+
+    test_loss, test_acc = trainer.compute_test_logs(best_model)
+
+    return (
+        training_loss_list,
+        training_acc_list,
+        validation_loss_list,
+        validation_acc_list,
+        best_val_acc,
+        best_model,
+        time_taken,
+        prediction_list,
+        test_loss,
+        test_acc,
+    )
+
+
+def init_worker(core_sets):
+    """
+    Restricts a worker of the pool to one of the core sets, with as many
+    torch threads as cores
+    """
+    cores = core_sets.get()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+
+
+def run_in_parallel(args, seed_list, fold_cache):
+    """
+    Dispatches the runs to a pool of args.parallel_runs processes, each
+    pinned to a disjoint set of cores, and yields their results in run
+    order
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count()))
+    n_workers = min(args.parallel_runs, args.runs, len(cores))
+    context = multiprocessing.get_context("spawn")
+    core_sets = context.Queue()
+    for core_set in np.array_split(cores, n_workers):
+        core_sets.put(core_set.tolist())
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=context,
+        initializer=init_worker,
+        initargs=(core_sets,),
+    ) as executor:
+        futures = [
+            executor.submit(run, args, i, seed_list[i], fold_cache)
+            for i in range(args.runs)
+        ]
+        for future in futures:
+            yield future.result()
+
+
+def run_vectorised(args, seed_list, fold_cache):
+    """
+    Trains all the runs together with vectorised training and yields
+    their results in run order. Each run draws its batches from the
+    random state it would have if it was trained alone, so that the
+    results match those of sequential runs.
+    """
+    t_before = time.time()
+    trainers = []
+    rng_states = []
+    for i in range(args.runs):
+        trainers.append(make_trainer(args, i, seed_list[i], fold_cache))
+        rng_states.append(torch.get_rng_state())
+
+    train_results = train_vectorised(trainers, rng_states)
+
+    # The runs share the training time
+    time_taken = (time.time() - t_before) / args.runs
+    print("Time taken per run = ", time_taken, "\n")
+
+    for trainer, train_result in zip(trainers, train_results):
+        best_model = train_result[-1]
+        prediction_list = trainer.predict().tolist()
+        test_loss, test_acc = trainer.compute_test_logs(best_model)
+        yield train_result + (
+            time_taken,
+            prediction_list,
+            test_loss,
+            test_acc,
+        )
+
+
 def main(args):
+    if args.distributed:
+        if args.parallel_runs > 1 or args.vectorised_runs:
+            parser.error(
+                "--distributed cannot be combined with --parallel_runs or --vectorised_runs"
+            )
+        # Every process runs the same runs in the same order, on its
+        # shard of the data, and the process of rank 0 saves the outputs
+        init_distributed()
+
     random.seed(args.seed)
     seed_list = random.sample(range(1, int(2**32 - 1)), int(args.runs))
 
@@ -127,47 +347,46 @@ def main(args):
     # Create the JsonOutputer object
     json_outputer = JsonOutputer(model_name, timestr, args.output)
 
-    for i in range(args.runs):
-        t_before = time.time()
-        print("\n")
-        print("-----------------------------------")
-        print("run = ", i + 1)
-        print("-----------------------------------")
-        print("\n")
-
-        trainer = Beta_2_3_trainer(
-            args.model,
-            args.optimiser,
-            i,
-            args.iterations,
-            args.dataset,
-            args.test,
-            seed_list[i],
-            args.n_qubits,
-            args.q_delta,
-            args.batch_size,
-            args.lr,
-            args.weight_decay,
-            args.step_lr,
-            args.gamma,
-        )
-
-        (
-            training_loss_list,
-            training_acc_list,
-            validation_loss_list,
-            validation_acc_list,
-            best_val_acc,
-            best_model,
-        ) = trainer.train()
+    # The datasets of each fold are built once and shared by its runs.
+    # With parallel runs they are all built before dispatching the runs
+    # and sent to the workers through shared memory, otherwise only the
+    # fold of the current run is held.
+    fold_cache = FoldCache(
+        args.dataset,
+        args.test,
+        share_memory=args.parallel_runs > 1,
+        keep_all_folds=args.parallel_runs > 1,
+    )
 
-        t_after = time.time()
-        print("Time taken for this run = ", t_after - t_before, "\n")
-        time_taken = t_after - t_before
-
-        prediction_list = trainer.predict().tolist()
+    if args.parallel_runs > 1:
+        if args.model == "beta_2":
+            preprocess = preprocess_train_test_dataset_for_beta_2
+        else:
+            preprocess = preprocess_train_test_dataset_for_beta_3
+        for i in range(args.runs):
+            fold_cache.get(preprocess, i)
+        results = run_in_parallel(args, seed_list, fold_cache)
+    elif args.vectorised_runs:
+        results = run_vectorised(args, seed_list, fold_cache)
+    else:
+        results = (
+            run(args, i, seed_list[i], fold_cache) for i in range(args.runs)
+        )
 
-        test_loss, test_acc = trainer.compute_test_logs(best_model)
+    for i, (
+        training_loss_list,
+        training_acc_list,
+        validation_loss_list,
+        validation_acc_list,
+        best_val_acc,
+        best_model,
+        time_taken,
+        prediction_list,
+        test_loss,
+        test_acc,
+    ) in enumerate(results):
+        if not is_main_process():
+            continue
 
         if best_val_acc > best_val_acc_all_runs:
             best_val_acc_all_runs = best_val_acc
@@ -194,6 +413,9 @@ def main(args):
         )
         torch.save(best_model, model_path)
 
+    if args.distributed:
+        torch.distributed.destroy_process_group()
+
 
 if __name__ == "__main__":
     args = parser.parse_args()
@@ -0,0 +1,130 @@
+import sys
+import os
+
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../../models/quantum/alpha/module/")
+sys.path.append(current_path + "/../../models/quantum/beta_2_3/")
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+from alpha_3_multiclass_model import Alpha_3_multiclass_model
+from beta_2_3_model import Beta_2_3_model
+
+
+parser = argparse.ArgumentParser(
+    description="Scores a corpus of embeddings with a trained dressed "
+    "model, evaluating the circuit compiled for the trained weights."
+)
+
+parser.add_argument(
+    "-m",
+    "--model",
+    help="Model the weights belong to",
+    type=str,
+    choices=["alpha_3_multiclass", "beta_2", "beta_3"],
+)
+parser.add_argument(
+    "-mp", "--model_path", help="Path of the .pt with the weights", type=str
+)
+parser.add_argument(
+    "-i",
+    "--input",
+    help="CSV file with the embeddings to score",
+    type=str,
+)
+parser.add_argument(
+    "-col",
+    "--embedding_column",
+    help="Column with the embeddings, sentence_embedding for alpha_3_multiclass and reduced_embedding for beta_2 and beta_3 if not given",
+    type=str,
+    default=None,
+)
+parser.add_argument(
+    "-o",
+    "--output",
+    help="CSV file where the predicted class index and the probability of each class are written",
+    type=str,
+)
+parser.add_argument(
+    "-cs",
+    "--chunk_size",
+    help="Number of rows read and scored at once",
+    type=int,
+    default=65536,
+)
+
+
+def load_frozen_model(model_name, model_path):
+    """
+    Builds the model from the saved weights, inferring the number of
+    qubits and classes from their shapes, and compiles its circuit
+    """
+    state_dict = torch.load(model_path, map_location="cpu")
+    n_classes, n_qubits = state_dict["post_net.weight"].shape
+    model_class = (
+        Alpha_3_multiclass_model
+        if model_name == "alpha_3_multiclass"
+        else Beta_2_3_model
+    )
+    model = model_class(n_qubits, 0.01, n_classes, "cpu")
+    model.load_state_dict(state_dict)
+    model.eval()
+    model.freeze()
+    return model
+
+
+def score(model, embeddings):
+    """
+    Returns the probability of each class for a batch of embeddings
+    """
+    with torch.no_grad():
+        return model(torch.tensor(embeddings, dtype=torch.float32)).numpy()
+
+
+def main(args):
+    embedding_column = args.embedding_column or (
+        "sentence_embedding"
+        if args.model == "alpha_3_multiclass"
+        else "reduced_embedding"
+    )
+    model = load_frozen_model(args.model, args.model_path)
+
+    n_rows = 0
+    t_before = time.time()
+    # The corpus is read in chunks, so that it does not need to fit in
+    # memory
+    for i, df_chunk in enumerate(
+        pd.read_csv(args.input, chunksize=args.chunk_size)
+    ):
+        embeddings = np.array(
+            [
+                np.fromstring(embedding.strip(" []"), sep=",")
+                for embedding in df_chunk[embedding_column]
+            ]
+        )
+        probabilities = score(model, embeddings)
+        df_scores = pd.DataFrame(
+            probabilities,
+            columns=[
+                f"probability_{j}" for j in range(probabilities.shape[1])
+            ],
+        )
+        df_scores.insert(0, "prediction", probabilities.argmax(1))
+        df_scores.to_csv(
+            args.output,
+            mode="w" if i == 0 else "a",
+            header=i == 0,
+            index=False,
+        )
+        n_rows += len(df_scores)
+    t_after = time.time()
+    print(f"Scored {n_rows} rows in {t_after - t_before} s")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    main(args)
@@ -1,15 +1,36 @@
+import os
+import sys
 from torch import nn
 from lambeq import PennyLaneModel
 import torch
 import pennylane as qml
 from pennylane import numpy as np
 
+# Shared with the other dressed models
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../../common/")
+from torch_quantum_net import TorchQuantumNet
+
 
 # inherit from PennyLaneModel to use the PennyLane circuit evaluation
 class Alpha_3_multiclass_model(PennyLaneModel):
-    def __init__(self, n_qubits, q_delta, n_classes, device):
+    def __init__(
+        self,
+        n_qubits,
+        q_delta,
+        n_classes,
+        device,
+        simulator="pennylane",
+        qml_device="default.qubit",
+        diff_method="best",
+        shots=None,
+    ):
         """
-        Definition of the *dressed* layout.
+        Definition of the *dressed* layout. The circuit is evaluated with
+        a PennyLane QNode on qml_device, differentiated with diff_method
+        and sampled with shots (exact expectation values if None), or
+        with the batched torch statevector simulation of TorchQuantumNet
+        if simulator is "torch".
         """
 
         super().__init__()
@@ -18,6 +39,12 @@ class Alpha_3_multiclass_model(PennyLaneModel):
         self.q_delta = q_delta
         self.device = device
         self.n_classes = n_classes
+        if simulator not in ("pennylane", "torch"):
+            raise ValueError(
+                "Unrecognised simulator specified. Please choose between pennylane or torch."
+            )
+        self.simulator = simulator
+        self.shots = shots
 
         self.pre_net = nn.Linear(768, self.n_qubits)
         self.q_params = nn.Parameter(
@@ -27,11 +54,23 @@ class Alpha_3_multiclass_model(PennyLaneModel):
         self.post_net = nn.Linear(self.n_qubits, self.n_classes)
         self.softmax = nn.Softmax()
 
-        dev = qml.device("default.qubit", wires=self.n_qubits)
+        dev = qml.device(qml_device, wires=self.n_qubits, shots=shots)
 
         self.quantum_net = qml.QNode(
-            self.quantum_net_from_paper, dev, interface="torch"
+            self.quantum_net_from_paper,
+            dev,
+            interface="torch",
+            diff_method=diff_method,
         )
+        if diff_method == "adjoint":
+            # The adjoint method does not support parameter broadcasting,
+            # so the batch is split into one tape per input
+            self.quantum_net = qml.transforms.broadcast_expand(
+                self.quantum_net
+            )
+        self.torch_quantum_net = TorchQuantumNet(self.n_qubits)
+        # Observables compiled by freeze for inference with fixed weights
+        self.frozen_observables = None
 
     def forward(self, input_features):
         """
@@ -48,19 +87,52 @@ class Alpha_3_multiclass_model(PennyLaneModel):
             torch.tanh(pre_out) * np.pi / 2.0
         )  # Here q_in.shape=(batch_size, self.n_qubits) and have values between -pi/2 and pi/2
 
-        q_out = self.quantum_net(
-            q_in, self.q_params
-        )  # Output q_out a list with the shape (self.n_qubits, batch_size)
-        q_out = torch.stack(
-            q_out
-        )  # Stack outputs into one tensor of shape (self.n_qubits, batch_size)
-        q_out = q_out.transpose(
-            0, 1
-        ).float()  # Transpose dimensions 0 and 1 to get a tensor of shape (batch_size, self.n_qubits)
+        if self.frozen_observables is not None:
+            q_out = self.torch_quantum_net.frozen_forward(
+                q_in, self.frozen_observables
+            ).float()  # Here q_out.shape=(batch_size, self.n_qubits)
+        elif self.simulator == "torch":
+            q_out = self.torch_quantum_net(
+                q_in, self.q_params
+            ).float()  # Here q_out.shape=(batch_size, self.n_qubits)
+        else:
+            if self.shots is not None:
+                # Sampling needs probabilities that sum to 1 in double
+                # precision
+                q_in = q_in.double()
+            q_out = self.quantum_net(
+                q_in, self.q_params
+            )  # Output q_out a list with the shape (self.n_qubits, batch_size)
+            q_out = torch.stack(
+                q_out
+            )  # Stack outputs into one tensor of shape (self.n_qubits, batch_size)
+            q_out = q_out.transpose(
+                0, 1
+            ).float()  # Transpose dimensions 0 and 1 to get a tensor of shape (batch_size, self.n_qubits)
 
         # return the two-dimensional prediction from the postprocessing layer
         return self.softmax(self.post_net(q_out))
 
+    def freeze(self):
+        """
+        Compiles the circuit for the current q_params, so that the
+        following forward passes evaluate it as quadratic forms of the
+        embedded states instead of simulating it. The compiled circuit
+        is exact, it does not sample shots, and it is not
+        differentiable: call unfreeze before training again or changing
+        the weights.
+        """
+        with torch.no_grad():
+            self.frozen_observables = (
+                self.torch_quantum_net.compile_observables(self.q_params)
+            )
+
+    def unfreeze(self):
+        """
+        Goes back to simulating the circuit in the forward pass
+        """
+        self.frozen_observables = None
+
     def quantum_net_from_paper(self, inputs, q_weights):
         # https://onlinelibrary.wiley.com/doi/epdf/10.1002/qute.201900070
         # Circuit [6] but adapted for n_qubits
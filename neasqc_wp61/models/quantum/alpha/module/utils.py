@@ -1,4 +1,5 @@
 import os
+import sys
 import random
 import numpy as np
 import torch
@@ -8,6 +9,11 @@ from sklearn.decomposition import PCA
 import ast
 from torch.utils.data import Dataset
 
+# The modules shared by the dressed models
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../../common/")
+from feature_store import open_feature_store, load_fold_from_feature_stores
+
 
 def seed_everything(seed: int):
     random.seed(seed)
@@ -146,9 +152,6 @@ def preprocess_train_test_dataset_for_alpha_3(
     Preprocess function for the dataset for the alpha 3 model
     """
 
-    df_dataset = pd.read_csv(dataset_csv_file)
-    df_test = pd.read_csv(test_csv_file)
-
     # Set up for 5-fold with 10 runs
     run_number += 1
     if 1 <= run_number <= 2:
@@ -162,6 +165,22 @@ def preprocess_train_test_dataset_for_alpha_3(
     elif 9 <= run_number <= 10:
         split_idx = 8
 
+    # The feature stores converted from the CSV files are read if they
+    # exist, instead of parsing the embeddings
+    dataset_store = open_feature_store(dataset_csv_file)
+    test_store = open_feature_store(test_csv_file)
+    if dataset_store is not None and test_store is not None:
+        return load_fold_from_feature_stores(
+            dataset_store,
+            test_store,
+            [split_idx, split_idx + 1],
+            "sentence_embedding",
+            "sentence_embedding",
+        )
+
+    df_dataset = pd.read_csv(dataset_csv_file)
+    df_test = pd.read_csv(test_csv_file)
+
     df_train = df_dataset[
         ~df_dataset["split"].isin([split_idx, split_idx + 1])
     ]
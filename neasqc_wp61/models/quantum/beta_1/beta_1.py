@@ -1,24 +1,46 @@
 from quantum_distance import QuantumDistance as qd
+from prediction_checkpoint import PredictionCheckpoint
+from distance_store import DistanceStore
+from feature_cache import FeatureCache
+from index_register_distance import IndexRegisterDistance
 import pandas as pd 
-import pickle
 import json
+import hashlib
+import zlib
 from collections import Counter
 import numpy as np
 from sklearn import preprocessing
 from sklearn.decomposition import PCA
+from sklearn.neighbors import BallTree
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import time
 import os
 current_path = os.path.dirname(os.path.abspath(__file__))
 
+worker_model = None
+worker_checkpoint = None
+# Model and checkpoint used by each process of the pool in parallel
+# predictions
+
 
 class QuantumKNearestNeighbours:
     """
     Class for implementing the K Nearest Neighbors algorithm 
     using the quantum distance
     """
+    backends = (
+        'aer', 'analytic', 'emulated', 'adaptive', 'index_register',
+        'template'
+    )
     
     def __init__(
-            self, X_train, X_test, y_train, y_test, k_values : list[int]
+            self, X_train, X_test, y_train, y_test, k_values : list[int],
+            backend : str = 'aer', batch_size : int = 256,
+            max_parallel_experiments : int = 0,
+            shortlist_factor : int = None, shots : int = 1024,
+            seed : int = 0, shots_per_round : int = 64,
+            confidence : float = 0.99, adaptive_sampler : str = 'emulated'
         )-> None:
         """
         Initialises the class. 
@@ -36,19 +58,91 @@ class QuantumKNearestNeighbours:
             Number of neighbors of the algorithm
         checkpoint_output : str
             Path where to store the checkpoints with predictions
+        backend : str, default : aer
+            How the quantum distances are evaluated. 'aer' simulates
+            one SWAP test circuit per pair of vectors on Qiskit Aer,
+            'analytic' computes the exact outcome of the same circuit
+            for a whole batch of test vectors with NumPy and
+            'emulated' samples the outcome of running each circuit
+            with a finite number of shots from the exact one.
+            'adaptive' adds shots in rounds and stops each pair once it
+            is confidently not among the max(k) closest ones.
+            'index_register' loads the training set behind an index
+            register and simulates a single circuit per test vector.
+            'template' runs the same circuits as 'aer', binding the
+            state preparation angles to a circuit transpiled once
+        batch_size : int, default : 256
+            Number of test vectors whose distances are computed at once
+            when using the analytic or emulated backends
+        max_parallel_experiments : int, default : 0
+            Maximum number of circuits that Aer simulates in parallel
+            for each test vector. 0 lets Aer use all available threads
+        shortlist_factor : int, default : None
+            If given, the quantum distances of each test vector are
+            only computed for a shortlist of shortlist_factor * max(k)
+            candidates, found with a classical ball tree over the
+            training vectors. By default all the training vectors are
+            evaluated
+        shots : int, default : 1024
+            Number of shots of each circuit with the emulated backend,
+            and maximum number of shots per circuit with the adaptive
+            one
+        seed : int, default : 0
+            Seed of the shot emulation. The random generator of each
+            test vector is derived from the seed and the vector itself,
+            so the results do not depend on how the test vectors are
+            batched or split between workers
+        shots_per_round : int, default : 64
+            Number of shots added to each remaining circuit in each
+            round of the adaptive backend
+        confidence : float, default : 0.99
+            Confidence level of the bounds used by the adaptive backend
+            to stop the circuits of a test vector
+        adaptive_sampler : str, default : emulated
+            How the adaptive backend gets its shots: 'emulated' draws
+            them from the exact probabilities and 'aer' runs the
+            circuits with measurements on Qiskit Aer
         """
+        if backend not in self.backends:
+            raise ValueError(
+                f'Unrecognised backend {backend}. '
+                f'Please choose between {self.backends}'
+            )
         self.y_test = y_test
 
         self.labels = y_train
-        self.train_vectors = X_train
-        self.test_vectors = X_test
+        self.classes, self.label_indexes = np.unique(
+            np.asarray(y_train), return_inverse=True)
+        self.train_vectors = np.asarray(X_train)
+        self.test_vectors = np.asarray(X_test)
         self.k_values = k_values
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_parallel_experiments = max_parallel_experiments
+        self.distance_store = None
+        self.shortlist_factor = shortlist_factor
+        self.shots = shots
+        self.seed = seed
+        self.shots_per_round = shots_per_round
+        self.confidence = confidence
+        self.adaptive_sampler = adaptive_sampler
+        self.shots_used = 0
+        self.shots_baseline = 0
+        self.index = None
+        if self.shortlist_factor is not None:
+            self.index = BallTree(self.train_vectors)
+        if self.uses_aer():
+            self.warm_gate_cache()
+        self.index_engine = None
+        if self.backend == 'index_register':
+            self.index_engine = IndexRegisterDistance(self.train_vectors)
     
     @staticmethod
     def load_labels(
             train_dataset_path : str,
             test_dataset_path : str, 
-            pca_dimension :int
+            pca_dimension :int,
+            cache_dir : str = None
     ):
         """
         Loads the chosen dataset as pandas dataframe.
@@ -57,6 +151,11 @@ class QuantumKNearestNeighbours:
         ----------
         dataset : str
             Directory where the dataset is stored
+        cache_dir : str, default : None
+            If given, directory where the reduced vectors, the labels
+            and the PCA are stored, so that later runs on the same
+            files and PCA dimension load them instead of parsing the
+            dataset again. The cached vectors are float32
 
         Returns
         -------
@@ -64,6 +163,18 @@ class QuantumKNearestNeighbours:
             List with the labels of the dataset.
             0 False, and 1 True
         """
+        names = ['X_train', 'X_test', 'y_train', 'y_test']
+        if cache_dir is not None:
+            feature_cache = FeatureCache(
+                cache_dir, [train_dataset_path, test_dataset_path],
+                pca_dimension
+            )
+            if feature_cache.exists():
+                X_train, X_test, y_train, y_test, pca = feature_cache.load(
+                    names)
+                print('PCA explained variance:',
+                      pca.explained_variance_ratio_.sum())
+                return X_train, X_test, y_train, y_test
 
         df_train = pd.read_csv(train_dataset_path)
         df_test = pd.read_csv(test_dataset_path)
@@ -102,8 +213,92 @@ class QuantumKNearestNeighbours:
         df_test['class'] = label_encoder.transform(df_test['class'])
 
         X_train, y_train, X_test, y_test = reduced_embeddings_train, df_train['class'], reduced_embeddings_test, df_test['class']
+
+        if cache_dir is not None:
+            feature_cache.save(
+                dict(zip(names, [X_train, X_test, y_train, y_test])), pca)
+            # Returned from the cache so that every run sees the same
+            # float32 vectors
+            return feature_cache.load(names)[:4]
         
         return X_train, X_test, y_train.values, y_test.values
+
+    @staticmethod
+    def load_training_set(
+        train_dataset_path : str, pca_dimension : int,
+        cache_dir : str = None
+    ):
+        """
+        Loads the training dataset and fits the PCA on it, for
+        classifying vectors that are not known in advance
+
+        Parameters
+        ----------
+        train_dataset_path : str
+            Path of the CSV file with the training dataset
+        pca_dimension : int
+            Number of components of the PCA
+        cache_dir : str, default : None
+            If given, directory where the reduced vectors, the labels
+            and the PCA are stored for later runs, as in load_labels
+
+        Returns
+        -------
+        X_train : np.array
+            Reduced training vectors
+        y_train : np.array
+            Encoded training labels
+        classes : np.array
+            Original label of each encoded label
+        pca : PCA
+            The PCA fitted on the training vectors, to be applied to
+            the vectors to classify
+        """
+        names = ['X_train', 'y_train', 'classes']
+        if cache_dir is not None:
+            feature_cache = FeatureCache(
+                cache_dir, [train_dataset_path], pca_dimension)
+            if feature_cache.exists():
+                return feature_cache.load(names)
+        df_train = pd.read_csv(train_dataset_path)
+        X_train = QuantumKNearestNeighbours.parse_embeddings(
+            df_train['sentence_embedding'])
+        pca = PCA(n_components=pca_dimension)
+        X_train = pca.fit_transform(X_train)
+        print('PCA explained variance:', pca.explained_variance_ratio_.sum())
+        label_encoder = preprocessing.LabelEncoder()
+        y_train = label_encoder.fit_transform(df_train['class'])
+        classes = np.array(label_encoder.classes_.tolist())
+        if cache_dir is not None:
+            feature_cache.save(
+                dict(zip(names, [X_train, y_train, classes])), pca)
+            return feature_cache.load(names)
+        return X_train, y_train, classes, pca
+
+    @staticmethod
+    def parse_embeddings(embeddings : list) -> np.array:
+        """
+        Converts sentence embeddings to a matrix. Each embedding can
+        be a list of numbers or a string with the format used in the
+        dataset CSV files, '[x1, x2, ...]'.
+
+        Parameters
+        ----------
+        embeddings : list
+            The embeddings
+
+        Returns
+        -------
+        X : np.array
+            Matrix with one embedding per row
+        """
+        X = np.array([
+            np.fromstring(embedding.strip(' []'), sep=',')
+            if isinstance(embedding, str) else
+            np.asarray(embedding, dtype=float)
+            for embedding in embeddings
+        ])
+        return X
     
     @staticmethod
     def normalise_vector(X : list[np.array]) -> list[np.array]:
@@ -121,10 +316,11 @@ class QuantumKNearestNeighbours:
         X_normalised : np.array
             List of normalised vectors
         """
-        X_normalised = []
-        for sample in X:
-            X_normalised.append(sample/np.linalg.norm(sample))
-        return np.array(X_normalised)
+        # Computed in double precision, as the state preparation
+        # checks the norm to 1e-10
+        X = np.asarray(X, dtype=np.float64)
+        X_normalised = X / np.linalg.norm(X, axis=1, keepdims=True)
+        return X_normalised
     
     @staticmethod
     def pad_zeros_vector(X : list[np.array]) -> list[np.array]:
@@ -141,17 +337,17 @@ class QuantumKNearestNeighbours:
         X_padded : np.array
             List of padded vectors
         """
-        n = len(X[0])
-        X_padded = []
+        X = np.asarray(X)
+        n = X.shape[1]
         next_power_2 = 2 ** int(np.ceil(np.log2(n)))
-        zero_padding = np.zeros(next_power_2 - n)
-
-        for sample in X:
-            X_padded.append(np.concatenate((sample, zero_padding)))
+        X_padded = np.zeros((len(X), next_power_2), dtype=X.dtype)
+        X_padded[:, :n] = X
         return X_padded
     
     def compute_predictions(
-        self, compute_checkpoints : bool = False,
+        self, compute_checkpoints : bool = False, n_workers : int = 1,
+        checkpoint_dir : str = None, run_id : str = None,
+        distance_store_dir : str = None
         ) -> None:
         """
         Makes the predictions of the model
@@ -159,25 +355,351 @@ class QuantumKNearestNeighbours:
         Parameters
         ----------
         compute_checkpoints : bool
-            Decides whether to store checkpoints or not 
-        checkpoint_directory : str
-            Directory where to store the temporary checkpoints
-        """
-        self.predictions = []
-        for index,i in enumerate(self.test_vectors):
-            t1 = time.time()
-            distances = self.compute_distances(i)
-            closest_indexes_list = self.compute_minimum_distances(distances, self.k_values)
-            pred_list = self.labels_majority_vote(closest_indexes_list)
-            self.predictions.append(pred_list)
-            
-            if index % 25 == 0 and compute_checkpoints == True:
-                with open(
-                   current_path +  '/../../../benchmarking/results/raw/temporary_predictions_beta.pickle', 'wb'
-                ) as file:
-                    pickle.dump(self.predictions, file)
-            t2 = time.time()
-            print('Time to do the iteration : ', t2 - t1)
+            Decides whether to store checkpoints or not. When
+            checkpoints of the same run already exist, the test
+            vectors already predicted are skipped
+        n_workers : int, default : 1
+            Number of processes among which the test vectors are
+            split. With 1 the predictions are made in the current
+            process
+        checkpoint_dir : str, default : None
+            Directory where to store the checkpoints. Defaults to
+            benchmarking/results/raw/beta_1_checkpoints
+        run_id : str, default : None
+            Identifier of the run in the checkpoint directory. Defaults
+            to a fingerprint of the data and parameters of the model,
+            so that rerunning the same job resumes it
+        distance_store_dir : str, default : None
+            If given, directory of a DistanceStore where the distances
+            are saved as they are computed and read from when they
+            were computed by a previous run on the same data
+        """
+        self.predictions = [None] * len(self.test_vectors)
+        self.shots_used = 0
+        self.shots_baseline = 0
+        self.distance_store = None
+        if distance_store_dir is not None:
+            self.distance_store = DistanceStore(
+                distance_store_dir, self.distance_key(),
+                (len(self.test_vectors), len(self.train_vectors))
+            )
+        checkpoint = None
+        if compute_checkpoints == True:
+            if checkpoint_dir is None:
+                checkpoint_dir = (
+                    current_path + '/../../../benchmarking/results/raw/'
+                    'beta_1_checkpoints'
+                )
+            if run_id is None:
+                run_id = self.run_fingerprint()
+            checkpoint = PredictionCheckpoint(
+                checkpoint_dir, run_id, self.checkpoint_config())
+            for index, pred_list in checkpoint.load_predictions().items():
+                self.predictions[index] = pred_list
+        pending = [
+            index for index, pred_list in enumerate(self.predictions)
+            if pred_list is None
+        ]
+        if len(pending) < len(self.predictions):
+            print(
+                'Resuming from checkpoint : ',
+                len(self.predictions) - len(pending), 'predictions loaded'
+            )
+        if len(pending) == 0:
+            return
+        shards = self.split_shards(pending, n_workers)
+        if checkpoint is not None:
+            checkpoint.register_shards(shards)
+        if n_workers > 1:
+            # Aer threads do not survive a fork, so workers are spawned
+            with ProcessPoolExecutor(
+                max_workers=n_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_prediction_worker,
+                initargs=(self, checkpoint)
+            ) as executor:
+                for shard, (shard_predictions, shot_statistics) in zip(
+                    shards, executor.map(predict_shard, shards)
+                ):
+                    for index, pred_list in zip(shard, shard_predictions):
+                        self.predictions[index] = pred_list
+                    self.shots_used += shot_statistics['shots_used']
+                    self.shots_baseline += shot_statistics['shots_baseline']
+        else:
+            for shard in shards:
+                for index, pred_list in self.iterate_predictions(
+                    shard, checkpoint
+                ):
+                    self.predictions[index] = pred_list
+            if self.uses_aer():
+                print('Gate cache : ', qd.gate_cache_info())
+        if self.backend == 'adaptive':
+            print('Shots : ', self.get_shot_statistics())
+
+    def predict_batch(self, samples : np.array) -> np.array:
+        """
+        Predicts the labels of vectors that are not in the test set,
+        without storing anything about them
+
+        Parameters
+        ----------
+        samples : np.array
+            The vectors to classify, preprocessed as the training ones
+
+        Returns
+        -------
+        pred_batch : np.array
+            Matrix of shape (len(samples), len(k_values)) with the
+            predicted label for each vector and k value
+        """
+        distances_batch = self.compute_distances_batch(samples)
+        closest_indexes = self.compute_minimum_distances_batch(
+            distances_batch, max(self.k_values))
+        pred_batch = self.labels_majority_vote_batch(closest_indexes)
+        return pred_batch
+
+    def iterate_predictions(
+        self, indexes : list[int], checkpoint : PredictionCheckpoint = None
+    ):
+        """
+        Generator making the predictions for the given test vectors,
+        in order
+
+        Parameters
+        ----------
+        indexes : list[int]
+            Indexes of the test vectors
+        checkpoint : PredictionCheckpoint, default : None
+            If given, each prediction is appended to the checkpoint
+            file of the shard starting at indexes[0]
+
+        Yields
+        ------
+        index : int
+            Index of the test vector
+        pred_list : list[int]
+            Predicted label for each k value
+        """
+        batch_size = self.batch_size if self.backend != 'aer' else 1
+        file = None
+        if checkpoint is not None:
+            file = checkpoint.open_shard(indexes[0])
+        try:
+            for batch_start in range(0, len(indexes), batch_size):
+                t1 = time.time()
+                batch_indexes = indexes[batch_start:batch_start + batch_size]
+                distances_batch = self.get_distances_batch(batch_indexes)
+                closest_indexes = self.compute_minimum_distances_batch(
+                    distances_batch, max(self.k_values))
+                pred_batch = self.labels_majority_vote_batch(closest_indexes)
+                for index, pred_list in zip(batch_indexes, pred_batch):
+                    pred_list = pred_list.tolist()
+                    if file is not None:
+                        checkpoint.append_prediction(file, index, pred_list)
+                    yield index, pred_list
+                t2 = time.time()
+                print('Time to do the iteration : ', t2 - t1)
+        finally:
+            if file is not None:
+                file.close()
+
+    @staticmethod
+    def split_shards(
+        indexes : list[int], n_workers : int
+    ) -> list[list[int]]:
+        """
+        Splits the indexes of the test vectors in contiguous shards,
+        a few per worker so that the load stays balanced
+
+        Parameters
+        ----------
+        indexes : list[int]
+            Indexes of the test vectors to predict
+        n_workers : int
+            Number of processes in the pool
+
+        Returns
+        -------
+        shards : list[list[int]]
+            Indexes of the test vectors of each shard
+        """
+        n_shards = min(len(indexes), 4 * n_workers if n_workers > 1 else 1)
+        shards = [
+            shard.tolist() for shard in np.array_split(indexes, n_shards)
+        ]
+        return shards
+
+    def checkpoint_config(self) -> dict:
+        """
+        Parameters of the model that must match to resume a run
+        from its checkpoints
+
+        Returns
+        -------
+        config : dict
+            Dictionary with the parameters of the model
+        """
+        config = {
+            'n_train' : len(self.train_vectors),
+            'n_test' : len(self.test_vectors),
+            'k_values' : list(self.k_values),
+            'backend' : self.backend,
+            'fingerprint' : self.run_fingerprint()
+        }
+        return config
+
+    def run_fingerprint(self) -> str:
+        """
+        Computes a hash identifying the data and parameters of the
+        model
+
+        Returns
+        -------
+        fingerprint : str
+            Hexadecimal hash
+        """
+        fingerprint = self.compute_fingerprint(
+            [self.train_vectors, self.test_vectors, self.labels],
+            [
+                list(map(int, self.k_values)), self.backend,
+                self.shortlist_factor, self.shots, self.seed
+            ] + self.adaptive_parameters()
+        )
+        return fingerprint
+
+    def distance_key(self) -> str:
+        """
+        Computes a hash identifying the distance matrix between the
+        test and training vectors, which depends on the vectors, their
+        (PCA-reduced) dimension, the backend and its shots but not on k.
+        With a shortlist, only the distances to the candidates are
+        computed, so the number of candidates is part of the key
+
+        Returns
+        -------
+        key : str
+            Hexadecimal hash
+        """
+        key = self.compute_fingerprint(
+            [self.train_vectors, self.test_vectors],
+            [
+                len(self.train_vectors[0]), self.backend,
+                self.shortlist_size(), self.shots, self.seed
+            ] + self.adaptive_parameters()
+        )
+        return key
+
+    def shortlist_size(self) -> int:
+        """
+        Number of candidates whose quantum distances are computed for
+        each test vector
+
+        Returns
+        -------
+        n_candidates : int
+            min(len(train_vectors), shortlist_factor * max(k)), or
+            None without a shortlist
+        """
+        if self.shortlist_factor is None:
+            return None
+        n_candidates = min(
+            len(self.train_vectors),
+            self.shortlist_factor * max(self.k_values)
+        )
+        return n_candidates
+
+    def adaptive_parameters(self) -> list:
+        """
+        Parameters of the adaptive backend that change its distances.
+        The k values take part in them, as they decide which circuits
+        stop early
+
+        Returns
+        -------
+        parameters : list
+            The parameters, empty for the other backends
+        """
+        if self.backend != 'adaptive':
+            return []
+        parameters = [
+            max(map(int, self.k_values)), self.shots_per_round,
+            self.confidence, self.adaptive_sampler
+        ]
+        return parameters
+
+    @staticmethod
+    def compute_fingerprint(arrays : list, parameters : list) -> str:
+        """
+        Hashes a list of arrays together with a list of parameters
+
+        Parameters
+        ----------
+        arrays : list
+            Arrays to hash
+        parameters : list
+            JSON serialisable parameters to hash
+
+        Returns
+        -------
+        fingerprint : str
+            Hexadecimal hash
+        """
+        hasher = hashlib.sha256()
+        for array in arrays:
+            hasher.update(np.ascontiguousarray(array).tobytes())
+        hasher.update(json.dumps(parameters).encode())
+        fingerprint = hasher.hexdigest()[:16]
+        return fingerprint
+
+    def uses_aer(self) -> bool:
+        """
+        Tells whether the distances are computed by running circuits
+        on Aer
+
+        Returns
+        -------
+        uses_aer : bool
+            True for the aer backend and for the adaptive one with
+            the aer sampler
+        """
+        return self.backend == 'aer' or (
+            self.backend == 'adaptive' and self.adaptive_sampler == 'aer')
+
+    def get_shot_statistics(self) -> dict:
+        """
+        Getter for the number of shots used by the adaptive backend in
+        the last predictions, together with the number of shots needed
+        to run every circuit with the maximum number of shots
+
+        Returns
+        -------
+        shot_statistics : dict
+            Dictionary with the shots used, the fixed-shot baseline and
+            the fraction of the baseline that was used
+        """
+        shot_statistics = {
+            'shots_used' : self.shots_used,
+            'shots_baseline' : self.shots_baseline,
+            'fraction' : self.shots_used / max(self.shots_baseline, 1)
+        }
+        return shot_statistics
+
+    def warm_gate_cache(self) -> None:
+        """
+        Synthesises and transpiles once the controlled state
+        preparations of all the training vectors, so that they are
+        reused for every test sample instead of being built again for
+        each of them
+        """
+        if len(self.train_vectors) == 0:
+            return
+        # Room for the current and previous test vectors, so that a new
+        # test vector evicts the previous one and not a training vector
+        qd.set_gate_cache_maxsize(
+            max(qd.gate_cache_maxsize, len(self.train_vectors) + 2))
+        for vector in self.train_vectors:
+            qd(vector, vector).build_transpiled_x2_preparation()
+
     def get_predictions(self):
         """
         Getter for the predictions
@@ -202,11 +724,355 @@ class QuantumKNearestNeighbours:
             The distance of the sample vector to all other vectors in
             training dataset
         """
-        distances = []
-        for vector in(self.train_vectors):
-            distances.append(qd(sample, vector).compute_quantum_distance())
+        return self.compute_distances_to(sample, self.train_vectors).tolist()
+
+    def compute_distances_to(
+        self, sample : np.array, vectors : np.array
+    ) -> np.array:
+        """
+        Computes the distances of a vector to the rows of a matrix
+        with the chosen backend
+
+        Parameters
+        ----------
+        sample : np.array
+            The vector to which we are computing the distances
+        vectors : np.array
+            Matrix whose rows are the vectors to compare with
+
+        Returns
+        -------
+        distances : np.array
+            The distance of the sample vector to each row of vectors
+        """
+        if self.backend == 'analytic':
+            prob0 = qd.compute_ancilla_probabilities(sample, vectors)[0]
+        elif self.backend == 'emulated':
+            prob0 = qd.sample_ancilla_probabilities(
+                qd.compute_ancilla_probabilities(sample, vectors)[0],
+                self.shots, self.sample_rng(sample)
+            )
+        elif self.backend == 'adaptive':
+            prob0 = self.estimate_adaptive_prob0(sample, vectors)
+        elif self.backend == 'index_register':
+            if vectors is not self.train_vectors:
+                # A shortlist needs its own training register
+                engine = IndexRegisterDistance(vectors)
+            else:
+                engine = self.index_engine
+            prob0 = engine.compute_ancilla_probabilities(sample)
+        elif self.backend == 'template':
+            prob0 = qd.compute_many_from_template(sample, vectors)
+        else:
+            prob0 = qd.compute_many(
+                sample, vectors,
+                max_parallel_experiments=self.max_parallel_experiments
+            )
+        distances = qd.distance_prob0_relation(prob0)
+        return distances
+
+    def get_distances_batch(self, indexes : list[int]) -> np.array:
+        """
+        Gets the distances of a batch of test vectors to all the
+        vectors in the training dataset, reading the rows already in
+        the distance store and computing (and storing) the others
+
+        Parameters
+        ----------
+        indexes : list[int]
+            Indexes of the test vectors
+
+        Returns
+        -------
+        distances : np.array
+            Matrix of shape (len(indexes), len(train_vectors)) with the
+            distance of each test vector to each training vector
+        """
+        if self.distance_store is None:
+            return self.compute_distances_batch(
+                [self.test_vectors[index] for index in indexes])
+        indexes = np.asarray(indexes, dtype=int)
+        computed = self.distance_store.computed_rows(indexes)
+        distances = np.empty((len(indexes), len(self.train_vectors)))
+        if computed.any():
+            distances[computed] = self.distance_store.read_rows(
+                indexes[computed])
+        if not computed.all():
+            missing = indexes[~computed]
+            missing_distances = self.compute_distances_batch(
+                [self.test_vectors[index] for index in missing])
+            self.distance_store.write_rows(missing, missing_distances)
+            distances[~computed] = missing_distances
+        return distances
+
+    def compute_distances_batch(
+        self, samples : np.array, shortlist : bool = True
+    ) -> np.array:
+        """
+        For a batch of vectors, computes their distances to all the
+        vectors in the training dataset with the chosen backend
+
+        Parameters
+        ----------
+        samples : np.array
+            The vectors to which we are computing the distances
+        shortlist : bool, default : True
+            Whether to only evaluate the shortlisted candidates, when
+            the model has a shortlist
+
+        Returns
+        -------
+        distances : np.array
+            Matrix of shape (len(samples), len(train_vectors)) with the
+            distance of each sample to each training vector. With a
+            shortlist, the distances to the training vectors outside of
+            it are set to infinity
+        """
+        samples = np.asarray(samples)
+        if self.index is not None and shortlist:
+            candidates = self.compute_shortlists(samples)
+            distances = np.full((len(samples), len(self.train_vectors)), np.inf)
+            for i, (sample, sample_candidates) in enumerate(
+                zip(samples, candidates)
+            ):
+                distances[i, sample_candidates] = self.compute_distances_to(
+                    sample, self.train_vectors[sample_candidates])
+            return distances
+        if self.backend == 'analytic':
+            prob0 = qd.compute_ancilla_probabilities(
+                samples, self.train_vectors)
+            return qd.distance_prob0_relation(prob0)
+        if self.backend == 'emulated':
+            prob0 = qd.compute_ancilla_probabilities(
+                samples, self.train_vectors)
+            for i, sample in enumerate(samples):
+                prob0[i] = qd.sample_ancilla_probabilities(
+                    prob0[i], self.shots, self.sample_rng(sample))
+            return qd.distance_prob0_relation(prob0)
+        return np.array(
+            [self.compute_distances(sample) for sample in samples])
+
+    def estimate_adaptive_prob0(
+        self, sample : np.array, vectors : np.array
+    ) -> np.array:
+        """
+        Estimates with the adaptive shot procedure the probabilities
+        of measuring 0 in the ancilla qubit of the SWAP tests between
+        a vector and the rows of a matrix, and keeps count of the shots
+
+        Parameters
+        ----------
+        sample : np.array
+            The vector to which we are computing the distances
+        vectors : np.array
+            Matrix whose rows are the vectors to compare with
+
+        Returns
+        -------
+        prob0 : np.array
+            Estimated probability for each row of vectors
+        """
+        rng = self.sample_rng(sample)
+        if self.adaptive_sampler == 'aer':
+            sampler = qd.aer_sampler(
+                sample, vectors, seed=int(rng.integers(2 ** 31)))
+        else:
+            sampler = qd.binomial_sampler(
+                qd.compute_ancilla_probabilities(sample, vectors)[0], rng)
+        prob0, shots = qd.estimate_adaptive(
+            sampler, len(vectors), max(self.k_values), self.shots,
+            self.shots_per_round, self.confidence
+        )
+        self.shots_used += int(shots.sum())
+        self.shots_baseline += len(vectors) * self.shots
+        return prob0
+
+    def sample_rng(self, sample : np.array) -> np.random.Generator:
+        """
+        Random generator used to emulate the shots of the circuits
+        involving a test vector
+
+        Parameters
+        ----------
+        sample : np.array
+            The test vector
+
+        Returns
+        -------
+        rng : np.random.Generator
+            Generator seeded with the seed of the model and a checksum
+            of the vector
+        """
+        checksum = zlib.crc32(np.ascontiguousarray(sample).tobytes())
+        return np.random.default_rng([self.seed, checksum])
+
+    def compute_shortlists(self, samples : np.array) -> np.array:
+        """
+        Finds with the classical ball tree the candidates of each
+        vector of a batch for which the quantum distances are computed
+
+        Parameters
+        ----------
+        samples : np.array
+            The vectors whose candidates we are finding
+
+        Returns
+        -------
+        candidates : np.array
+            Matrix with the indexes of the shortlisted training vectors
+            for each sample, in increasing order
+        """
+        _, candidates = self.index.query(samples, k=self.shortlist_size())
+        return np.sort(candidates, axis=1)
+
+    def compute_shortlist_recall(self) -> dict:
+        """
+        Compares the k nearest neighbours found through the shortlist
+        with those found by evaluating all the training vectors. With
+        the emulated and adaptive backends, both searches use the
+        distances estimated from the shots, so the recall includes the
+        neighbours missed because of the sampling noise. With the
+        analytic, template and index_register backends, the exhaustive
+        ranking is computed from the exact probabilities, which is
+        cheap. The recall is not measured for the backends running the
+        circuits on Aer, as the exhaustive search would run all of them
+        again.
+
+        Returns
+        -------
+        recall : dict
+            Average fraction of the exhaustive k nearest neighbours
+            that are also found with the shortlist, for each k value.
+            Empty if the backend runs the circuits on Aer
+        """
+        if self.uses_aer():
+            return {}
+        max_k = max(self.k_values)
+        hits = np.zeros(len(self.k_values))
+        # The shots of the comparison are not those of the predictions
+        shot_counts = self.shots_used, self.shots_baseline
+        for start in range(0, len(self.test_vectors), self.batch_size):
+            samples = self.test_vectors[start:start + self.batch_size]
+            shortlist_distances = self.compute_distances_batch(samples)
+            if self.backend in ['emulated', 'adaptive']:
+                exhaustive_distances = self.compute_distances_batch(
+                    samples, shortlist=False)
+            else:
+                exhaustive_distances = qd.distance_prob0_relation(
+                    qd.compute_ancilla_probabilities(
+                        samples, self.train_vectors)
+                )
+            exhaustive = self.compute_minimum_distances_batch(
+                exhaustive_distances, max_k)
+            shortlisted = self.compute_minimum_distances_batch(
+                shortlist_distances, max_k)
+            for i, k in enumerate(self.k_values):
+                for row_exhaustive, row_shortlisted in zip(
+                    exhaustive[:, :k], shortlisted[:, :k]
+                ):
+                    hits[i] += len(
+                        np.intersect1d(row_exhaustive, row_shortlisted)
+                    ) / len(row_exhaustive)
+        self.shots_used, self.shots_baseline = shot_counts
+        recall = {
+            int(k) : hits[i] / len(self.test_vectors)
+            for i, k in enumerate(self.k_values)
+        }
+        return recall
+
+    def compute_train_distance_matrix(self) -> np.array:
+        """
+        Computes the quantum distances between all the pairs of
+        training vectors. The distance given by the SWAP test is
+        symmetric, so only the pairs above the diagonal are evaluated
+        and mirrored, which halves the number of circuits.
+
+        Returns
+        -------
+        distances : np.array
+            Symmetric matrix of shape (len(train_vectors),
+            len(train_vectors)) with zeros on the diagonal
+        """
+        if self.backend == 'adaptive':
+            raise ValueError(
+                'The adaptive backend only estimates the distances to '
+                'the closest vectors, which cannot be mirrored'
+            )
+        n_train = len(self.train_vectors)
+        distances = np.zeros((n_train, n_train))
+        for i in range(n_train - 1):
+            if self.backend == 'index_register':
+                # A single circuit gives the whole row
+                row = self.compute_distances_to(
+                    self.train_vectors[i], self.train_vectors)[i + 1:]
+            else:
+                row = self.compute_distances_to(
+                    self.train_vectors[i], self.train_vectors[i + 1:])
+            distances[i, i + 1:] = row
+            distances[i + 1:, i] = row
         return distances
 
+    def cross_validate(
+        self, n_folds : int = None, seed : int = 0,
+        distances : np.array = None
+    ) -> tuple[np.array, dict]:
+        """
+        Evaluates the quantum KNN on the training set for every k
+        value, from a single matrix of distances between training
+        vectors
+
+        Parameters
+        ----------
+        n_folds : int, default : None
+            Number of folds. If None, each training vector is
+            classified with all the others (leave-one-out)
+        seed : int, default : 0
+            Seed of the random split into folds
+        distances : np.array, default : None
+            Distances between the training vectors, as returned by
+            compute_train_distance_matrix. Computed if not given
+
+        Returns
+        -------
+        predictions : np.array
+            Matrix of shape (len(train_vectors), len(k_values)) with the
+            label predicted for each training vector when it is
+            held out, for each k value
+        accuracies : dict
+            Fraction of training vectors correctly predicted, for each
+            k value
+        """
+        if distances is None:
+            distances = self.compute_train_distance_matrix()
+        n_train = len(self.train_vectors)
+        if n_folds is None:
+            folds = [np.array([i]) for i in range(n_train)]
+        else:
+            rng = np.random.default_rng(seed)
+            folds = np.array_split(rng.permutation(n_train), n_folds)
+        predictions = np.empty(
+            (n_train, len(self.k_values)), dtype=self.classes.dtype)
+        if n_folds is None:
+            # With single vector folds all of them are done at once,
+            # excluding each vector from its own neighbours
+            held_out = distances + np.diag(np.full(n_train, np.inf))
+            closest_indexes = self.compute_minimum_distances_batch(
+                held_out, min(max(self.k_values), n_train - 1))
+            predictions[:] = self.labels_majority_vote_batch(closest_indexes)
+        else:
+            for fold in folds:
+                kept = np.setdiff1d(np.arange(n_train), fold)
+                closest_indexes = self.compute_minimum_distances_batch(
+                    distances[np.ix_(fold, kept)], max(self.k_values))
+                predictions[fold] = self.labels_majority_vote_batch(
+                    kept[closest_indexes])
+        y_train = np.asarray(self.labels)
+        accuracies = {
+            int(k) : float(np.mean(predictions[:, i] == y_train))
+            for i, k in enumerate(self.k_values)
+        }
+        return predictions, accuracies
+
     @staticmethod
     def compute_minimum_distances(distances, k_values):
         """
@@ -235,6 +1101,89 @@ class QuantumKNearestNeighbours:
 
         return closest_indexes_list
     
+    @staticmethod
+    def compute_minimum_distances_batch(
+        distances : np.array, k : int
+    ) -> np.array:
+        """
+        Computes the indexes of the k closest elements of the training
+        dataset for a batch of test vectors. The result is the same as
+        with compute_minimum_distances: the neighbours are sorted by
+        distance and ties are broken by the lowest index.
+
+        Parameters
+        ----------
+        distances : np.array
+            Matrix with the distances of each test vector to all
+            elements of the training dataset
+        k : int
+            Number of selected k neighbors
+
+        Returns
+        -------
+        closest_indexes : np.array
+            Matrix with the indexes of the k closest vectors to each
+            test vector, from the closest to the furthest
+        """
+        distances = np.asarray(distances)
+        n_samples, n_train = distances.shape
+        k = min(k, n_train)
+        if k == 0:
+            return np.zeros((n_samples, 0), dtype=int)
+        kth_distances = np.partition(distances, k - 1, axis=1)[:, k - 1:k]
+        closer = distances < kth_distances
+        tied = distances == kth_distances
+        # Among the vectors at the k-th distance, keep the lowest indexes
+        n_tied_needed = k - closer.sum(axis=1, keepdims=True)
+        selected = closer | (tied & (np.cumsum(tied, axis=1) <= n_tied_needed))
+        closest_indexes = np.nonzero(selected)[1].reshape(n_samples, k)
+        order = np.argsort(
+            np.take_along_axis(distances, closest_indexes, axis=1),
+            axis=1, kind='stable'
+        )
+        closest_indexes = np.take_along_axis(closest_indexes, order, axis=1)
+        return closest_indexes
+
+    def labels_majority_vote_batch(
+        self, closest_indexes : np.array
+    ) -> np.array:
+        """
+        Gets the most frequent label among the closest vectors of a
+        batch of test vectors, for every k value at once. Ties are
+        broken as in labels_majority_vote, in favour of the label
+        appearing first among the closest vectors.
+
+        Parameters
+        ----------
+        closest_indexes : np.array
+            Matrix with the indexes of the closest vectors to each test
+            vector, from the closest to the furthest, as returned by
+            compute_minimum_distances_batch
+
+        Returns
+        -------
+        labels : np.array
+            Matrix of shape (len(closest_indexes), len(k_values)) with
+            the most frequent label for each test vector and k value
+        """
+        n_samples, max_k = closest_indexes.shape
+        neighbour_classes = self.label_indexes[closest_indexes]
+        one_hot = (
+            neighbour_classes[:, :, None] ==
+            np.arange(len(self.classes))[None, None, :]
+        )
+        counts = np.cumsum(one_hot, axis=1)
+        first_position = np.where(
+            one_hot, np.arange(max_k)[None, :, None], max_k).min(axis=1)
+        labels = np.empty((n_samples, len(self.k_values)), dtype=self.classes.dtype)
+        for i, k in enumerate(self.k_values):
+            counts_k = counts[:, min(k, max_k) - 1, :]
+            is_majority = counts_k == counts_k.max(axis=1, keepdims=True)
+            winners = np.argmin(
+                np.where(is_majority, first_position, max_k + 1), axis=1)
+            labels[:, i] = self.classes[winners]
+        return labels
+
     def labels_majority_vote(self, closest_indexes_list):
         """
         Gets the labels of the closest vectors and returns the most 
@@ -263,3 +1212,59 @@ class QuantumKNearestNeighbours:
 
         return label_list
 
+
+def init_prediction_worker(
+    model : QuantumKNearestNeighbours,
+    checkpoint : PredictionCheckpoint = None
+) -> None:
+    """
+    Initialises a process of the pool used in parallel predictions.
+    The gate cache and the Aer simulator are built once here and
+    reused for all the shards handled by the process. Parallelism
+    comes from the pool, so each worker transpiles and simulates its
+    circuits serially.
+
+    Parameters
+    ----------
+    model : QuantumKNearestNeighbours
+        The model making the predictions
+    checkpoint : PredictionCheckpoint, default : None
+        Checkpoint where each worker appends the predictions of its
+        shards
+    """
+    global worker_model, worker_checkpoint
+    os.environ['QISKIT_IN_PARALLEL'] = 'TRUE'
+    model.max_parallel_experiments = 1
+    if model.uses_aer():
+        model.warm_gate_cache()
+        qd.get_simulator()
+    worker_model = model
+    worker_checkpoint = checkpoint
+
+
+def predict_shard(shard : list[int]) -> tuple[list[list[int]], dict]:
+    """
+    Makes the predictions for a shard of the test vectors in a process
+    of the pool
+
+    Parameters
+    ----------
+    shard : list[int]
+        Indexes of the test vectors
+
+    Returns
+    -------
+    predictions : list[list[int]]
+        Predicted labels for each test vector of the shard and each
+        k value
+    shot_statistics : dict
+        Shots used by the adaptive backend for the shard
+    """
+    worker_model.shots_used = 0
+    worker_model.shots_baseline = 0
+    predictions = [
+        pred_list
+        for _, pred_list in worker_model.iterate_predictions(
+            shard, worker_checkpoint)
+    ]
+    return predictions, worker_model.get_shot_statistics()
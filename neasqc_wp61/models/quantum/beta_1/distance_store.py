@@ -0,0 +1,123 @@
+import os
+import numpy as np
+
+
+class DistanceStore:
+    """
+    Class for storing on disk the matrix of distances between the test
+    and training vectors of the quantum KNN, so that it can be reused
+    by later runs on the same data. The matrix is kept in a .npy file
+    that is memory-mapped and filled row by row, together with a mask
+    of the rows already computed.
+    """
+    def __init__(
+        self, store_dir : str, key : str, shape : tuple[int, int]
+    ) -> None:
+        """
+        Initialiser of the class. Creates the files of the store if
+        they do not exist yet.
+
+        Parameters
+        ----------
+        store_dir : str
+            Directory where the distance matrices are stored
+        key : str
+            Hash identifying the data and parameters the distances
+            were computed with
+        shape : tuple[int, int]
+            Number of test vectors and number of training vectors
+        """
+        self.key = key
+        self.shape = tuple(shape)
+        self.distances_path = os.path.join(store_dir, f'{key}_distances.npy')
+        self.computed_path = os.path.join(store_dir, f'{key}_computed.npy')
+        os.makedirs(store_dir, exist_ok=True)
+        if not os.path.exists(self.computed_path):
+            np.lib.format.open_memmap(
+                self.distances_path, mode='w+', dtype=np.float64,
+                shape=self.shape
+            ).flush()
+            np.lib.format.open_memmap(
+                self.computed_path, mode='w+', dtype=bool,
+                shape=(self.shape[0],)
+            ).flush()
+        self.distances = None
+        self.computed = None
+        self.open()
+        if self.distances.shape != self.shape:
+            raise ValueError(
+                f'The distance matrix {self.distances_path} has shape '
+                f'{self.distances.shape} instead of {self.shape}'
+            )
+
+    def open(self) -> None:
+        """
+        Memory-maps the files of the store if they are not mapped yet
+        """
+        if self.distances is None:
+            self.distances = np.load(self.distances_path, mmap_mode='r+')
+            self.computed = np.load(self.computed_path, mmap_mode='r+')
+
+    def __getstate__(self) -> dict:
+        """
+        Drops the memory maps when the store is sent to another
+        process, which maps the files again on first use
+        """
+        state = self.__dict__.copy()
+        state['distances'] = None
+        state['computed'] = None
+        return state
+
+    def computed_rows(self, indexes : list[int]) -> np.array:
+        """
+        Tells which rows of the matrix are already computed
+
+        Parameters
+        ----------
+        indexes : list[int]
+            Indexes of the test vectors
+
+        Returns
+        -------
+        computed : np.array
+            Boolean mask, True for the rows already stored
+        """
+        self.open()
+        return np.array(self.computed[np.asarray(indexes, dtype=int)])
+
+    def read_rows(self, indexes : list[int]) -> np.array:
+        """
+        Reads rows of the distance matrix
+
+        Parameters
+        ----------
+        indexes : list[int]
+            Indexes of the test vectors
+
+        Returns
+        -------
+        distances : np.array
+            Distances of each test vector to all the training vectors
+        """
+        self.open()
+        return np.array(self.distances[np.asarray(indexes, dtype=int)])
+
+    def write_rows(self, indexes : list[int], distances : np.array) -> None:
+        """
+        Writes rows of the distance matrix. The rows are flushed to
+        disk before being marked as computed, so that an interrupted
+        write is never read back.
+
+        Parameters
+        ----------
+        indexes : list[int]
+            Indexes of the test vectors
+        distances : np.array
+            Distances of each test vector to all the training vectors
+        """
+        self.open()
+        indexes = np.asarray(indexes, dtype=int)
+        self.distances[indexes] = distances
+        self.distances.flush()
+        self.computed[indexes] = True
+        self.computed.flush()
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import pickle
+import numpy as np
+
+
+class FeatureCache:
+    """
+    Class for storing on disk the preprocessed features of the quantum
+    KNN, so that the sentence embeddings are only parsed and reduced
+    with PCA once. The reduced vectors are stored as float32 .npy files
+    that are memory-mapped on load, next to the encoded labels and the
+    fitted PCA. The entries are identified by the content of the CSV
+    files and the PCA dimension.
+    """
+    def __init__(
+        self, cache_dir : str, dataset_paths : list[str],
+        pca_dimension : int
+    ) -> None:
+        """
+        Initialiser of the class
+
+        Parameters
+        ----------
+        cache_dir : str
+            Directory where the preprocessed features are stored
+        dataset_paths : list[str]
+            Paths of the CSV files the features are computed from
+        pca_dimension : int
+            Number of components of the PCA
+        """
+        self.cache_dir = cache_dir
+        self.key = self.compute_key(dataset_paths, pca_dimension)
+        self.pca_path = self.path('pca', 'pkl')
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def compute_key(paths : list[str], pca_dimension : int) -> str:
+        """
+        Hashes the content of some files together with the PCA
+        dimension
+
+        Parameters
+        ----------
+        paths : list[str]
+            Paths of the files
+        pca_dimension : int
+            Number of components of the PCA
+
+        Returns
+        -------
+        key : str
+            Hexadecimal hash identifying the entry of the cache
+        """
+        hasher = hashlib.sha256()
+        for path in paths:
+            with open(path, 'rb') as file:
+                for chunk in iter(lambda: file.read(1 << 20), b''):
+                    hasher.update(chunk)
+            hasher.update(b'\0')
+        hasher.update(str(pca_dimension).encode())
+        return hasher.hexdigest()[:16]
+
+    def path(self, name : str, extension : str = 'npy') -> str:
+        """
+        Path of a file of the entry
+
+        Parameters
+        ----------
+        name : str
+            Name of the stored object
+        extension : str, default : npy
+            Extension of the file
+
+        Returns
+        -------
+        path : str
+            Path of the file
+        """
+        return os.path.join(self.cache_dir, f'{self.key}_{name}.{extension}')
+
+    def exists(self) -> bool:
+        """
+        Tells whether the entry is complete. The PCA is written last,
+        so an interrupted write is never read back.
+
+        Returns
+        -------
+        exists : bool
+            True if the features can be loaded
+        """
+        return os.path.exists(self.pca_path)
+
+    def load(self, names : list[str]) -> tuple:
+        """
+        Loads the stored features, memory-mapping the arrays
+
+        Parameters
+        ----------
+        names : list[str]
+            Names of the arrays to load
+
+        Returns
+        -------
+        arrays : tuple
+            The arrays in the order of names, followed by the PCA
+            fitted on the training vectors
+        """
+        arrays = [np.load(self.path(name), mmap_mode='r') for name in names]
+        with open(self.pca_path, 'rb') as file:
+            pca = pickle.load(file)
+        return (*arrays, pca)
+
+    def save(self, arrays : dict, pca) -> None:
+        """
+        Stores the preprocessed features. Floating point arrays are
+        stored as float32.
+
+        Parameters
+        ----------
+        arrays : dict
+            Arrays to store, indexed by name
+        pca : PCA
+            The PCA fitted on the training vectors
+        """
+        for name, value in arrays.items():
+            value = np.asarray(value)
+            if value.dtype.kind == 'f':
+                value = value.astype(np.float32)
+            tmp_path = self.path(name + '.tmp')
+            np.save(tmp_path, value)
+            os.replace(tmp_path, self.path(name))
+        tmp_path = self.pca_path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(pca, file)
+        os.replace(tmp_path, self.pca_path)
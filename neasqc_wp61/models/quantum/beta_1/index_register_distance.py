@@ -0,0 +1,176 @@
+from qiskit import QuantumCircuit, transpile
+from qiskit.circuit.controlledgate import ControlledGate
+import numpy as np
+from quantum_distance import QuantumDistance
+
+
+class IndexRegisterDistance:
+    """
+    Class for computing the SWAP test quantum distance between a vector
+    and all the vectors of a training set with a single circuit. The
+    training set is loaded in superposition behind an index register,
+    so that the \psi state of [1] becomes
+    (|0>|x>|U> + |1> sum_i |x_i>|i> / sqrt(N)) / sqrt(2),
+    with |U> the uniform superposition of the N indexes. Conditioned on
+    the index i, the circuit is the SWAP test between x and x_i, so the
+    joint probabilities of the swap ancilla and the index register give
+    the distances to every training vector at once.
+    **Reference**
+    [1] Sarma, Abhijat, et al. "Quantum unsupervised and supervised
+    learning on superconducting processors."
+    arXiv preprint arXiv:1909.04226 (2019).
+    """
+    def __init__(
+        self, train_matrix : np.array, method : str = 'statevector',
+        device : str = 'CPU'
+    ) -> None:
+        """
+        Initialiser of the class. Builds and transpiles the part of the
+        circuit loading the training set, which is shared by all the
+        vectors compared with it.
+
+        Parameters
+        ----------
+        train_matrix : np.array
+            Matrix whose rows are the training vectors. Each row must
+            be normalised so that the sum of the squares of its
+            components is equal to 1.
+        method : str, default : statevector
+            Simulator method to use. More info can be found in
+            https://github.com/Qiskit/qiskit-aer/blob/main/qiskit_aer/backends/aer_simulator.py
+        device : str, default : CPU
+            Decides whether to use CPU or GPU.
+        """
+        self.train_matrix = np.asarray(train_matrix)
+        self.n_train, dimension = self.train_matrix.shape
+        self.nq_encoding = int(np.ceil(np.log2(dimension)))
+        self.nq_index = max(int(np.ceil(np.log2(self.n_train))), 1)
+        self.nq = self.nq_encoding + 3 + self.nq_index
+        # Qubits 0 to nq_encoding + 2 follow the layout of
+        # QuantumDistance, the index register comes after them
+        self.swap_qubit = self.nq_encoding + 2
+        self.index_qubits = list(range(self.nq_encoding + 3, self.nq))
+        self.method = method
+        self.device = device
+        self.sim = QuantumDistance.get_simulator(method=method, device=device)
+        self.train_circuit = transpile(
+            self.build_train_circuit(), self.sim)
+
+    def __getstate__(self) -> dict:
+        """
+        Drops the simulator when the engine is sent to another
+        process, which gets its own one
+        """
+        state = self.__dict__.copy()
+        state['sim'] = None
+        return state
+
+    def __setstate__(self, state : dict) -> None:
+        self.__dict__.update(state)
+        self.sim = QuantumDistance.get_simulator(
+            method=self.method, device=self.device)
+
+    def build_register_gates(self) -> tuple[ControlledGate, ControlledGate]:
+        """
+        Builds the gates loading the training set and the uniform
+        superposition of indexes, both controlled on the \psi ancilla
+
+        Returns
+        -------
+        train_gate : ControlledGate
+            Gate preparing sum_i |x_i>|i> / sqrt(N) on the data and
+            index registers
+        uniform_gate : ControlledGate
+            Gate preparing |U> on the index register
+        """
+        padded = np.zeros(
+            (2 ** self.nq_index, 2 ** self.nq_encoding))
+        padded[:self.n_train, :self.train_matrix.shape[1]] = (
+            self.train_matrix / np.sqrt(self.n_train))
+        # Qiskit orders the amplitudes with the last qubit as the most
+        # significant one, so the index goes in the rows
+        qc_train = QuantumCircuit(self.nq_encoding + self.nq_index)
+        qc_train.prepare_state(
+            padded.ravel().tolist(), range(self.nq_encoding + self.nq_index))
+        uniform = np.zeros(2 ** self.nq_index)
+        uniform[:self.n_train] = 1 / np.sqrt(self.n_train)
+        qc_uniform = QuantumCircuit(self.nq_index)
+        qc_uniform.prepare_state(uniform.tolist(), range(self.nq_index))
+        train_gate = qc_train.to_gate().control(1)
+        uniform_gate = qc_uniform.to_gate().control(1)
+        return train_gate, uniform_gate
+
+    def build_train_circuit(self) -> QuantumCircuit:
+        """
+        Builds the branch of the \psi state where the ancilla is |1>,
+        which loads the training set behind the index register
+
+        Returns
+        -------
+        qc : QuantumCircuit
+            Circuit preparing the training branch of \psi
+        """
+        train_gate, self.uniform_gate = self.build_register_gates()
+        qc = QuantumCircuit(self.nq)
+        qc.h(0)
+        qc.append(
+            train_gate,
+            [0] + list(range(1, self.nq_encoding + 1)) + self.index_qubits
+        )
+        return qc
+
+    def build_sample_circuit(self, sample : np.array) -> QuantumCircuit:
+        """
+        Builds the rest of the circuit for a given vector: the branch
+        of \psi where the ancilla is |0>, the \phi state and the SWAP
+        test
+
+        Parameters
+        ----------
+        sample : np.array
+            Vector to compare with the training set
+
+        Returns
+        -------
+        qc : QuantumCircuit
+            Circuit to apply after the training branch
+        """
+        distance = QuantumDistance(sample, sample)
+        sample_gate = distance.build_gate_state_preparation(sample)
+        qc = QuantumCircuit(self.nq)
+        qc.x(0)
+        qc.append(sample_gate, range(self.nq_encoding + 1))
+        qc.append(self.uniform_gate, [0] + self.index_qubits)
+        qc.x(0)
+        distance.qc = qc
+        distance.build_phi_state()
+        distance.apply_swap_test()
+        qc.save_probabilities([self.swap_qubit] + self.index_qubits)
+        return qc
+
+    def compute_ancilla_probabilities(self, sample : np.array) -> np.array:
+        """
+        Computes the probability of measuring 0 in the ancilla qubit of
+        the SWAP test between a vector and each training vector, from a
+        single simulation
+
+        Parameters
+        ----------
+        sample : np.array
+            Vector to compare with the training set. Must be
+            normalised so that the sum of the squares of its
+            components is equal to 1.
+
+        Returns
+        -------
+        prob0 : np.array
+            Probability of measuring 0 in the ancilla qubit for each
+            training vector
+        """
+        qc = self.train_circuit.compose(
+            transpile(self.build_sample_circuit(sample), self.sim))
+        probabilities = self.sim.run(qc).result().data(0)['probabilities']
+        # The swap ancilla is the least significant bit of the outcome
+        joint = np.asarray(probabilities).reshape(-1, 2)
+        prob0 = joint[:self.n_train, 0] * self.n_train
+        return prob0
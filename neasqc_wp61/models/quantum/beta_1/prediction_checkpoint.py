@@ -0,0 +1,160 @@
+import json
+import os
+import numpy as np
+
+
+class PredictionCheckpoint:
+    """
+    Class for storing the predictions of a run of the quantum KNN as
+    they are made, so that an interrupted run can be resumed.
+    Each run has its own directory with a manifest describing the run,
+    and one append-only file per shard of test vectors where each line
+    holds the predictions of one test vector.
+    """
+    manifest_name = 'manifest.json'
+
+    def __init__(
+        self, checkpoint_dir : str, run_id : str, config : dict
+    ) -> None:
+        """
+        Initialiser of the class. Creates the directory and manifest
+        of the run, or loads them if they already exist.
+
+        Parameters
+        ----------
+        checkpoint_dir : str
+            Directory where the checkpoints of all runs are stored
+        run_id : str
+            Identifier of the run
+        config : dict
+            Parameters defining the run. A run can only be resumed
+            with the same parameters
+        """
+        self.run_id = run_id
+        self.config = config
+        self.run_dir = os.path.join(checkpoint_dir, run_id)
+        self.manifest_path = os.path.join(self.run_dir, self.manifest_name)
+        os.makedirs(self.run_dir, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r') as file:
+                self.manifest = json.load(file)
+            if self.manifest['config'] != json.loads(json.dumps(config)):
+                raise ValueError(
+                    f'The checkpoints in {self.run_dir} belong to a run '
+                    'with different parameters'
+                )
+        else:
+            self.manifest = {
+                'run_id' : run_id, 'config' : config, 'shards' : []
+            }
+            self.save_manifest()
+
+    def save_manifest(self) -> None:
+        """
+        Writes the manifest, replacing the previous one atomically
+        """
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(self.manifest, file, indent=4)
+        os.replace(tmp_path, self.manifest_path)
+
+    def shard_path(self, first_index : int) -> str:
+        """
+        Path of the file of a shard
+
+        Parameters
+        ----------
+        first_index : int
+            Index of the first test vector of the shard
+
+        Returns
+        -------
+        path : str
+            Path of the shard file
+        """
+        return os.path.join(self.run_dir, f'shard_{first_index:09d}.jsonl')
+
+    def register_shards(self, shards : list[list[int]]) -> None:
+        """
+        Adds the files of new shards to the manifest. Must be called
+        by the main process before the shards are computed.
+
+        Parameters
+        ----------
+        shards : list[list[int]]
+            Indexes of the test vectors of each shard
+        """
+        for shard in shards:
+            name = os.path.basename(self.shard_path(shard[0]))
+            if name not in self.manifest['shards']:
+                self.manifest['shards'].append(name)
+        self.save_manifest()
+
+    def load_predictions(self) -> dict:
+        """
+        Reads the predictions stored in all the shards of the run.
+        A line truncated by an interruption is ignored.
+
+        Returns
+        -------
+        predictions : dict
+            Predictions for each k value, indexed by test vector
+        """
+        predictions = {}
+        for name in self.manifest['shards']:
+            path = os.path.join(self.run_dir, name)
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r') as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    predictions[record['index']] = record['predictions']
+        return predictions
+
+    def open_shard(self, first_index : int):
+        """
+        Opens the file of a shard for appending predictions
+
+        Parameters
+        ----------
+        first_index : int
+            Index of the first test vector of the shard
+
+        Returns
+        -------
+        file : file object
+            The shard file, opened in append mode
+        """
+        path = self.shard_path(first_index)
+        file = open(path, 'a')
+        if file.tell() > 0:
+            with open(path, 'rb') as previous:
+                previous.seek(-1, os.SEEK_END)
+                if previous.read(1) != b'\n':
+                    # Terminates a line truncated by an interruption
+                    file.write('\n')
+        return file
+
+    @staticmethod
+    def append_prediction(file, index : int, pred_list : list) -> None:
+        """
+        Appends the predictions of a test vector to a shard file
+
+        Parameters
+        ----------
+        file : file object
+            Shard file opened with open_shard
+        index : int
+            Index of the test vector
+        pred_list : list
+            Predicted label for each k value
+        """
+        record = {
+            'index' : int(index),
+            'predictions' : np.asarray(pred_list).tolist()
+        }
+        file.write(json.dumps(record) + '\n')
+        file.flush()
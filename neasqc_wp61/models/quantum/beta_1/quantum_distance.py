@@ -1,8 +1,10 @@
-from qiskit import QuantumCircuit, execute
+from qiskit import QuantumCircuit, ClassicalRegister, execute, transpile
+from qiskit.circuit import ParameterVector
 from qiskit_aer import AerSimulator
 from qiskit.circuit.controlledgate import ControlledGate
 import numpy as np 
 import cmath
+from collections import OrderedDict
 from qiskit_aer import AerSimulator
 
 class QuantumDistance:
@@ -14,6 +16,22 @@ class QuantumDistance:
     learning on superconducting processors."
     arXiv preprint arXiv:1909.04226 (2019).
     """   
+    gate_cache = OrderedDict()
+    # Controlled state preparation gates shared by all instances,
+    # ordered from least to most recently used
+    gate_cache_maxsize = 1024
+    gate_cache_hits = 0
+    gate_cache_misses = 0
+    simulators = {}
+    # Simulators already initialised, indexed by (method, device)
+    templates = {}
+    # Transpiled parametrised SWAP test circuits, indexed by
+    # (nq_encoding, method, device)
+    transpiled_cache = OrderedDict()
+    # Transpiled preparations of the training vectors used by
+    # compute_many, ordered from least to most recently used. Their
+    # size is bounded by gate_cache_maxsize too
+
     def __init__(self, x1 : np.array, x2 : np.array) -> None:
         """
         Initialiser of the class
@@ -43,7 +61,9 @@ class QuantumDistance:
         """
         Builds a gate that embbeds the vector
         x using amplitude encoding. The gate will be controlled 
-        on an ancilla qubit. 
+        on an ancilla qubit. Gates are stored in a cache shared by
+        all the instances of the class, so that each vector is only
+        synthesised once.
 
         Parameters
         ----------
@@ -56,11 +76,151 @@ class QuantumDistance:
         xgate : ControlledGate
             A controlled gate that embbeds x using amplitude encoding
         """
+        x = np.asarray(x)
+        key = (x.tobytes(), x.dtype.str, self.nq_encoding)
+        if key in QuantumDistance.gate_cache:
+            QuantumDistance.gate_cache.move_to_end(key)
+            QuantumDistance.gate_cache_hits += 1
+            return QuantumDistance.gate_cache[key]
+        QuantumDistance.gate_cache_misses += 1
         qcx = QuantumCircuit(self.nq_encoding)
         qcx.prepare_state(x.tolist(), range(self.nq_encoding))
         xgate = qcx.to_gate().control(1)
+        if QuantumDistance.gate_cache_maxsize > 0:
+            QuantumDistance.gate_cache[key] = xgate
+            while (
+                len(QuantumDistance.gate_cache) >
+                QuantumDistance.gate_cache_maxsize
+            ):
+                QuantumDistance.gate_cache.popitem(last=False)
         return xgate
+
+    @classmethod
+    def set_gate_cache_maxsize(cls, maxsize : int) -> None:
+        """
+        Sets the maximum number of gates kept in the cache, evicting
+        the least recently used ones if needed.
+
+        Parameters
+        ----------
+        maxsize : int
+            Maximum number of gates in the cache. 0 disables the cache
+        """
+        cls.gate_cache_maxsize = maxsize
+        while len(cls.gate_cache) > maxsize:
+            cls.gate_cache.popitem(last=False)
+        while len(cls.transpiled_cache) > maxsize:
+            cls.transpiled_cache.popitem(last=False)
+
+    @classmethod
+    def clear_gate_cache(cls) -> None:
+        """
+        Empties the gate cache and the cache of transpiled training
+        vector preparations, and resets the hit and miss counters of
+        the gate cache
+        """
+        cls.gate_cache.clear()
+        cls.transpiled_cache.clear()
+        cls.gate_cache_hits = 0
+        cls.gate_cache_misses = 0
+
+    @classmethod
+    def gate_cache_info(cls) -> dict:
+        """
+        Returns the statistics of the gate cache
+
+        Returns
+        -------
+        info : dict
+            Dictionary with the number of hits, misses, the current
+            size and the maximum size of the cache
+        """
+        info = {
+            'hits' : cls.gate_cache_hits,
+            'misses' : cls.gate_cache_misses,
+            'size' : len(cls.gate_cache),
+            'maxsize' : cls.gate_cache_maxsize
+        }
+        return info
     
+    def build_transpiled_x2_preparation(
+        self, method : str = 'statevector', device : str = 'CPU'
+    ) -> QuantumCircuit:
+        """
+        Builds and transpiles the part of the \psi state that only
+        depends on x2: the Hadamard on the ancilla and the preparation
+        of x2 controlled by it. The transpiled circuits are stored in
+        a cache shared by all the instances of the class, so that each
+        training vector is only transpiled once.
+
+        Parameters
+        ----------
+        method : str, default : statevector
+            Simulator method the circuit is transpiled for
+        device : str, default : CPU
+            Decides whether to use CPU or GPU.
+
+        Returns
+        -------
+        qc : QuantumCircuit
+            The transpiled circuit, on the nq qubits of the SWAP test
+        """
+        x = np.asarray(self.x2)
+        key = (x.tobytes(), x.dtype.str, self.nq_encoding, method, device)
+        if key in QuantumDistance.transpiled_cache:
+            QuantumDistance.transpiled_cache.move_to_end(key)
+            return QuantumDistance.transpiled_cache[key]
+        qc = QuantumCircuit(self.nq)
+        qc.h(0)
+        qc.append(
+            self.build_gate_state_preparation(self.x2),
+            range(self.nq_encoding + 1)
+        )
+        qc.x(0)
+        qc = transpile(qc, self.get_simulator(method=method, device=device))
+        if QuantumDistance.gate_cache_maxsize > 0:
+            QuantumDistance.transpiled_cache[key] = qc
+            while (
+                len(QuantumDistance.transpiled_cache) >
+                QuantumDistance.gate_cache_maxsize
+            ):
+                QuantumDistance.transpiled_cache.popitem(last=False)
+        return qc
+
+    def build_transpiled_x1_swap_test(
+        self, method : str = 'statevector', device : str = 'CPU'
+    ) -> QuantumCircuit:
+        """
+        Builds and transpiles the rest of the SWAP test circuit, which
+        only depends on x1: the preparation of x1 controlled by the
+        ancilla, the \phi state and the SWAP test, saving the
+        probabilities of the measured qubit
+
+        Parameters
+        ----------
+        method : str, default : statevector
+            Simulator method the circuit is transpiled for
+        device : str, default : CPU
+            Decides whether to use CPU or GPU.
+
+        Returns
+        -------
+        qc : QuantumCircuit
+            The transpiled circuit, on the nq qubits of the SWAP test
+        """
+        self.qc = QuantumCircuit(self.nq)
+        self.qc.append(
+            self.build_gate_state_preparation(self.x1),
+            range(self.nq_encoding + 1)
+        )
+        self.qc.x(0)
+        self.build_phi_state()
+        self.apply_swap_test()
+        self.qc.save_probabilities([self.nq - 1])
+        qc = transpile(
+            self.qc, self.get_simulator(method=method, device=device))
+        return qc
+
     def build_psi_state(self) -> None:
         """
         Builds the \psi state defined in [1]
@@ -88,6 +248,48 @@ class QuantumDistance:
         self.qc.h(self.nq_encoding + 2)
         self.qc.cswap(self.nq_encoding + 2, 0, self.nq_encoding + 1)
         self.qc.h(self.nq_encoding + 2)
+
+    def build_swap_test_circuit(self) -> QuantumCircuit:
+        """
+        Builds the full circuit, preparing the states \psi and \phi
+        and applying the SWAP test between them
+
+        Returns
+        -------
+        qc : QuantumCircuit
+            The circuit implementing the SWAP test
+        """
+        self.build_psi_state()
+        self.build_phi_state()
+        self.apply_swap_test()
+        return self.qc
+
+    @staticmethod
+    def get_simulator(
+        method : str = 'statevector', device : str = 'CPU'
+    ) -> AerSimulator:
+        """
+        Returns an Aer simulator with the given configuration, creating
+        it only the first time it is requested.
+
+        Parameters
+        ----------
+        method : str, default : statevector
+            Simulator method to use. More info can be found in
+            https://github.com/Qiskit/qiskit-aer/blob/main/qiskit_aer/backends/aer_simulator.py
+        device : str, default : CPU
+            Decides whether to use CPU or GPU.
+
+        Returns
+        -------
+        sim : AerSimulator
+            The simulator
+        """
+        key = (method, device)
+        if key not in QuantumDistance.simulators:
+            QuantumDistance.simulators[key] = AerSimulator(
+                method=method, device=device)
+        return QuantumDistance.simulators[key]
     
     def execute_qc(
         self, method : str = 'statevector', device : str = 'CPU'
@@ -105,7 +307,7 @@ class QuantumDistance:
 
         """
         self.qc.save_statevector()
-        sim = AerSimulator(method=method, device=device)
+        sim = self.get_simulator(method=method, device=device)
         result = execute(self.qc, sim, shots=None).result()
         self.state_vector = result.get_statevector()  
         self.state_probabilities = self.state_vector.probabilities_dict() 
@@ -129,13 +331,310 @@ class QuantumDistance:
         quantum_distance : str
             Estimation of the quantum distance
         """
-        self.build_psi_state()
-        self.build_phi_state()
-        self.apply_swap_test()
+        self.build_swap_test_circuit()
         self.execute_qc(method=method, device=device)
         quantum_distance = self.distance_prob_relation(self.state_probabilities)
         return quantum_distance
 
+    @staticmethod
+    def compute_many(
+        sample : np.array, train_matrix : np.array,
+        method : str = 'statevector', device : str = 'CPU',
+        max_parallel_experiments : int = 0
+    ) -> np.array:
+        """
+        Computes the probability of measuring 0 in the ancilla qubit of
+        the SWAP test between a vector and each row of a matrix. All
+        the circuits are run as a single job with one experiment per
+        row. Each circuit is the transpiled preparation of its row,
+        cached after the first time, followed by the part depending on
+        the vector, transpiled once for all the rows.
+
+        Parameters
+        ----------
+        sample : np.array
+            Vector to compare with each row of train_matrix. Must be
+            normalised so that the sum of the squares of its components
+            is equal to 1.
+        train_matrix : np.array
+            Matrix whose rows are the vectors to compare with. Each row
+            must be normalised so that the sum of the squares of its
+            components is equal to 1.
+        method : str, default : statevector
+            Simulator method to use. More info can be found in
+            https://github.com/Qiskit/qiskit-aer/blob/main/qiskit_aer/backends/aer_simulator.py
+        device : str, default : CPU
+            Decides whether to use CPU or GPU.
+        max_parallel_experiments : int, default : 0
+            Maximum number of experiments that Aer runs in parallel.
+            0 lets Aer use as many as available threads and 1 runs
+            them serially.
+
+        Returns
+        -------
+        prob0 : np.array
+            Probability of measuring 0 in the ancilla qubit for each
+            row of train_matrix
+        """
+        if len(train_matrix) == 0:
+            return np.array([])
+        x1_circuit = QuantumDistance(
+            sample, sample).build_transpiled_x1_swap_test(
+                method=method, device=device)
+        circuits = [
+            QuantumDistance(sample, vector).build_transpiled_x2_preparation(
+                method=method, device=device).compose(x1_circuit)
+            for vector in train_matrix
+        ]
+        sim = QuantumDistance.get_simulator(method=method, device=device)
+        result = sim.run(
+            circuits,
+            max_parallel_experiments=max_parallel_experiments
+        ).result()
+        prob0 = np.array([
+            result.data(i)['probabilities'][0]
+            for i in range(len(circuits))
+        ])
+        return prob0
+
+    @staticmethod
+    def uniformly_controlled_ry(
+        qc : QuantumCircuit, alphas, controls : list[int], target : int
+    ) -> None:
+        """
+        Appends a uniformly controlled RY rotation, which applies a
+        different rotation to the target for each basis state of the
+        controls, decomposed into RY and CNOT gates following the Gray
+        code of the controls (see [2]). For the basis state j of the
+        controls, with bit m of j being the state of controls[m], the
+        rotation angle is sum_i (-1)^popcount(j & gray(i)) alphas[i].
+        **Reference**
+        [2] Mottonen, Mikko, et al. "Transformation of quantum states
+        using uniformly controlled rotations."
+        arXiv preprint quant-ph/0407010 (2004).
+
+        Parameters
+        ----------
+        qc : QuantumCircuit
+            Circuit to which the rotation is appended
+        alphas : list
+            2 ** len(controls) angles (or parameters) of the RY gates
+        controls : list[int]
+            Control qubits
+        target : int
+            Target qubit
+        """
+        n_angles = 2 ** len(controls)
+        for i in range(n_angles):
+            qc.ry(alphas[i], target)
+            changed_bit = (i ^ (i >> 1)) ^ (
+                ((i + 1) % n_angles) ^ (((i + 1) % n_angles) >> 1))
+            qc.cx(controls[changed_bit.bit_length() - 1], target)
+
+    @staticmethod
+    def uniformly_controlled_ry_matrix(n_controls : int) -> np.array:
+        """
+        Matrix giving the angles of the RY gates of a uniformly
+        controlled rotation from the rotation angle wanted for each
+        basis state of the controls
+
+        Parameters
+        ----------
+        n_controls : int
+            Number of control qubits
+
+        Returns
+        -------
+        matrix : np.array
+            Matrix M such that alphas = M @ thetas
+        """
+        n_angles = 2 ** n_controls
+        gray = np.arange(n_angles) ^ (np.arange(n_angles) >> 1)
+        parity = np.vectorize(lambda j: bin(j).count('1') % 2)(
+            np.arange(n_angles)[:, None] & gray[None, :])
+        signs = 1 - 2 * parity
+        # signs is orthogonal up to a factor n_angles
+        return signs.T / n_angles
+
+    @classmethod
+    def get_template(
+        cls, nq_encoding : int, method : str = 'statevector',
+        device : str = 'CPU'
+    ) -> dict:
+        """
+        Returns the SWAP test circuit for vectors of 2 ** nq_encoding
+        components, with the angles of the state preparation as
+        parameters. The circuit is built and transpiled only the first
+        time it is requested for each encoding width.
+
+        The \psi state is prepared with a binary tree of rotations
+        (see [2]): data qubit nq_encoding - l is rotated depending on
+        the ancilla and on the data qubits above it, so that both
+        vectors are prepared by the same uniformly controlled
+        rotations, x1 when the ancilla is 0 and x2 when it is 1.
+
+        Parameters
+        ----------
+        nq_encoding : int
+            Number of qubits encoding each vector
+        method : str, default : statevector
+            Simulator method to use
+        device : str, default : CPU
+            Decides whether to use CPU or GPU.
+
+        Returns
+        -------
+        template : dict
+            Dictionary with the transpiled circuit, its parameters and
+            the matrices giving their values from the rotation angles
+            of each level of the tree
+        """
+        key = (nq_encoding, method, device)
+        if key in cls.templates:
+            return cls.templates[key]
+        nq = nq_encoding + 3
+        n_parameters = 2 ** (nq_encoding + 1) - 2
+        parameters = ParameterVector('alpha', n_parameters)
+        qc = QuantumCircuit(nq)
+        qc.h(0)
+        start = 0
+        for level in range(nq_encoding):
+            controls = [0] + [nq_encoding - m for m in range(level)]
+            n_angles = 2 ** (level + 1)
+            cls.uniformly_controlled_ry(
+                qc, parameters[start:start + n_angles], controls,
+                nq_encoding - level
+            )
+            start += n_angles
+        qc.x(nq_encoding + 1)
+        qc.h(nq_encoding + 1)
+        # \phi = (|0> - |1>) / sqrt(2)
+        qc.h(nq_encoding + 2)
+        qc.cswap(nq_encoding + 2, 0, nq_encoding + 1)
+        qc.h(nq_encoding + 2)
+        qc.save_probabilities([nq - 1])
+        sim = cls.get_simulator(method=method, device=device)
+        matrices = []
+        for level in range(nq_encoding):
+            matrix = cls.uniformly_controlled_ry_matrix(level + 1)
+            # Bit 0 of the control state is the ancilla, bit m the data
+            # qubit m levels above, while the angles of each level are
+            # ordered by the value of the bits above, most significant
+            # first
+            order = []
+            for j in range(2 ** (level + 1)):
+                prefix = 0
+                for m in range(1, level + 1):
+                    prefix |= ((j >> m) & 1) << (level - m)
+                order.append((j & 1) * 2 ** level + prefix)
+            matrices.append(matrix[:, np.argsort(order)])
+        template = {
+            'circuit' : transpile(qc, sim),
+            'parameters' : list(parameters),
+            'matrices' : matrices
+        }
+        cls.templates[key] = template
+        return template
+
+    @staticmethod
+    def compute_tree_angles(X : np.array) -> list[np.array]:
+        """
+        Computes in closed form the angles of the binary tree of RY
+        rotations preparing the amplitude encoding of each row of a
+        matrix. At each level, a block of amplitudes is split in two
+        halves and rotated by 2 * atan2(|upper half|, |lower half|),
+        and the last level uses the signed amplitudes themselves.
+
+        Parameters
+        ----------
+        X : np.array
+            Matrix whose rows have 2 ** nq_encoding real components and
+            are normalised so that the sum of their squares is 1
+
+        Returns
+        -------
+        angles : list[np.array]
+            For each level l, matrix of shape (len(X), 2 ** l) with the
+            rotation angle of each block
+        """
+        X = np.atleast_2d(np.real(X))
+        nq_encoding = int(np.log2(X.shape[1]))
+        angles = []
+        for level in range(nq_encoding):
+            blocks = X.reshape(len(X), 2 ** level, 2, -1)
+            if level == nq_encoding - 1:
+                angles.append(2 * np.arctan2(
+                    blocks[:, :, 1, 0], blocks[:, :, 0, 0]))
+            else:
+                norms = np.linalg.norm(blocks, axis=3)
+                angles.append(2 * np.arctan2(norms[:, :, 1], norms[:, :, 0]))
+        return angles
+
+    @staticmethod
+    def compute_many_from_template(
+        sample : np.array, train_matrix : np.array,
+        method : str = 'statevector', device : str = 'CPU'
+    ) -> np.array:
+        """
+        Computes the probability of measuring 0 in the ancilla qubit of
+        the SWAP test between a vector and each row of a matrix, binding
+        the angles of each pair to the transpiled template of their
+        encoding width and running all of them as a single job.
+
+        Parameters
+        ----------
+        sample : np.array
+            Vector to compare with each row of train_matrix. Must be
+            real and normalised so that the sum of the squares of its
+            components is equal to 1.
+        train_matrix : np.array
+            Matrix whose rows are the vectors to compare with, real and
+            normalised
+        method : str, default : statevector
+            Simulator method to use
+        device : str, default : CPU
+            Decides whether to use CPU or GPU.
+
+        Returns
+        -------
+        prob0 : np.array
+            Probability of measuring 0 in the ancilla qubit for each
+            row of train_matrix
+        """
+        if len(train_matrix) == 0:
+            return np.array([])
+        sample = np.asarray(sample)
+        train_matrix = np.atleast_2d(train_matrix)
+        nq_encoding = max(int(np.ceil(np.log2(len(sample)))), 1)
+        padding = ((0, 0), (0, 2 ** nq_encoding - len(sample)))
+        template = QuantumDistance.get_template(
+            nq_encoding, method=method, device=device)
+        sample_angles = QuantumDistance.compute_tree_angles(
+            np.pad(sample[None, :], padding))
+        train_angles = QuantumDistance.compute_tree_angles(
+            np.pad(train_matrix, padding))
+        values = []
+        for matrix, x1_angles, x2_angles in zip(
+            template['matrices'], sample_angles, train_angles
+        ):
+            thetas = np.hstack([
+                np.repeat(x1_angles, len(train_matrix), axis=0), x2_angles])
+            values.append(thetas @ matrix.T)
+        values = np.hstack(values)
+        sim = QuantumDistance.get_simulator(method=method, device=device)
+        result = sim.run(
+            [template['circuit']],
+            parameter_binds=[{
+                parameter : values[:, i].tolist()
+                for i, parameter in enumerate(template['parameters'])
+            }]
+        ).result()
+        prob0 = np.array([
+            result.data(i)['probabilities'][0]
+            for i in range(len(train_matrix))
+        ])
+        return prob0
+
     @staticmethod
     def distance_prob_relation(probabilities_dict : dict) -> float:
         """
@@ -159,6 +658,248 @@ class QuantumDistance:
                 prob0 += v
         quantum_distance = abs(cmath.sqrt((8 * prob0 -4)))
         return quantum_distance
+
+    @staticmethod
+    def compute_ancilla_probabilities(
+        X1 : np.array, X2 : np.array
+    ) -> np.array:
+        """
+        Computes the exact probability of measuring 0 in the ancilla
+        qubit of the SWAP test for every pair of rows of X1 and X2,
+        without simulating the circuit. The reduced state of the first
+        qubit of \psi has off-diagonal terms <x1|x2>/2, so projecting it
+        onto \phi and applying the SWAP test gives
+        P(0) = (3 - <x1|x2>) / 4.
+
+        Parameters
+        ----------
+        X1 : np.array
+            Matrix whose rows are the first vectors. Each row must be
+            normalised so that the sum of the squares of its components
+            is equal to 1.
+        X2 : np.array
+            Matrix whose rows are the second vectors. Each row must be
+            normalised so that the sum of the squares of its components
+            is equal to 1.
+
+        Returns
+        -------
+        prob0 : np.array
+            Matrix of shape (len(X1), len(X2)) with the probability of
+            measuring 0 in the ancilla qubit for each pair
+        """
+        X1 = np.atleast_2d(X1)
+        X2 = np.atleast_2d(X2)
+        if X1.shape[1] != X2.shape[1]:
+            raise ValueError(
+                'x1 and x2 need to have the same length'
+            )
+        overlaps = np.real(X1 @ np.conj(X2).T)
+        prob0 = (3 - overlaps) / 4
+        return prob0
+
+    @staticmethod
+    def sample_ancilla_probabilities(
+        prob0 : np.array, shots : int, rng = None
+    ) -> np.array:
+        """
+        Emulates the estimation of the probabilities of measuring 0 in
+        the ancilla qubit from a finite number of shots, drawing the
+        number of 0 outcomes of each circuit from Binomial(shots, prob0).
+
+        Parameters
+        ----------
+        prob0 : np.array
+            Exact probabilities of measuring 0 in the ancilla qubit
+        shots : int
+            Number of shots of each circuit
+        rng : np.random.Generator or int, default : None
+            Random generator, or seed to create one
+
+        Returns
+        -------
+        estimated_prob0 : np.array
+            Estimated probabilities, with the same shape as prob0
+        """
+        rng = np.random.default_rng(rng)
+        prob0 = np.clip(np.asarray(prob0), 0, 1)
+        estimated_prob0 = rng.binomial(shots, prob0) / shots
+        return estimated_prob0
+
+    @staticmethod
+    def binomial_sampler(prob0 : np.array, rng = None):
+        """
+        Builds a function emulating the measurement of the ancilla
+        qubit of a set of circuits from their exact probabilities
+
+        Parameters
+        ----------
+        prob0 : np.array
+            Exact probability of measuring 0 in the ancilla qubit of
+            each circuit
+        rng : np.random.Generator or int, default : None
+            Random generator, or seed to create one
+
+        Returns
+        -------
+        sampler : callable
+            Function taking the indexes of some circuits and a number
+            of shots, and returning the number of 0 outcomes of each
+        """
+        rng = np.random.default_rng(rng)
+        prob0 = np.clip(np.asarray(prob0), 0, 1)
+
+        def sampler(indexes : np.array, shots : int) -> np.array:
+            return rng.binomial(shots, prob0[indexes])
+        return sampler
+
+    @staticmethod
+    def aer_sampler(
+        sample : np.array, train_matrix : np.array,
+        method : str = 'statevector', device : str = 'CPU',
+        seed : int = None
+    ):
+        """
+        Builds a function measuring the ancilla qubit of the SWAP test
+        between a vector and the rows of a matrix on Aer. The circuits
+        are transpiled once and then run as many times as needed.
+
+        Parameters
+        ----------
+        sample : np.array
+            Vector to compare with each row of train_matrix
+        train_matrix : np.array
+            Matrix whose rows are the vectors to compare with
+        method : str, default : statevector
+            Simulator method to use
+        device : str, default : CPU
+            Decides whether to use CPU or GPU.
+        seed : int, default : None
+            Seed of the simulator, increased by one at each call
+
+        Returns
+        -------
+        sampler : callable
+            Function taking the indexes of some circuits and a number
+            of shots, and returning the number of 0 outcomes of each
+        """
+        circuits = []
+        for vector in train_matrix:
+            distance = QuantumDistance(sample, vector)
+            distance.build_swap_test_circuit()
+            distance.qc.add_register(ClassicalRegister(1))
+            distance.qc.measure(distance.nq - 1, 0)
+            circuits.append(distance.qc)
+        sim = QuantumDistance.get_simulator(method=method, device=device)
+        compiled_circuits = transpile(circuits, sim)
+        n_calls = [0]
+
+        def sampler(indexes : np.array, shots : int) -> np.array:
+            run_seed = None if seed is None else seed + n_calls[0]
+            n_calls[0] += 1
+            result = sim.run(
+                [compiled_circuits[i] for i in indexes],
+                shots=shots, seed_simulator=run_seed
+            ).result()
+            return np.array([
+                result.get_counts(i).get('0', 0)
+                for i in range(len(indexes))
+            ])
+        return sampler
+
+    @staticmethod
+    def estimate_adaptive(
+        sampler, n_pairs : int, k : int, max_shots : int,
+        shots_per_round : int = 64, confidence : float = 0.99
+    ) -> tuple[np.array, np.array]:
+        """
+        Estimates the probability of measuring 0 in the ancilla qubit
+        of a set of SWAP tests, adding shots in rounds only to the pairs
+        that may still be among the k closest ones. The probability
+        grows with the distance, so a pair stops once the lower bound
+        of its Hoeffding confidence interval is above the k-th smallest
+        upper bound. The other pairs stop after max_shots shots.
+
+        Parameters
+        ----------
+        sampler : callable
+            Function taking the indexes of some pairs and a number of
+            shots, and returning the number of 0 outcomes of each, as
+            built by binomial_sampler or aer_sampler
+        n_pairs : int
+            Number of pairs
+        k : int
+            Number of closest pairs that must be told apart from the
+            others
+        max_shots : int
+            Maximum number of shots of each pair
+        shots_per_round : int, default : 64
+            Number of shots added to each remaining pair in each round
+        confidence : float, default : 0.99
+            Probability that all the confidence intervals of a round
+            hold simultaneously
+
+        Returns
+        -------
+        prob0 : np.array
+            Estimated probabilities. For pairs that were stopped early
+            it is raised above the k-th smallest estimate of the other
+            pairs, so that they stay ranked after the k closest pairs
+            even if these end up with larger estimates than them
+        shots : np.array
+            Number of shots used for each pair
+        """
+        if n_pairs == 0:
+            return np.array([]), np.array([], dtype=int)
+        zeros = np.zeros(n_pairs)
+        shots = np.zeros(n_pairs, dtype=int)
+        active = np.ones(n_pairs, dtype=bool)
+        discarded = np.zeros(n_pairs, dtype=bool)
+        log_term = np.log(2 * n_pairs / (1 - confidence))
+        k = min(k, n_pairs)
+        while active.any():
+            indexes = np.nonzero(active)[0]
+            round_shots = min(shots_per_round, max_shots - shots[indexes[0]])
+            zeros[indexes] += sampler(indexes, round_shots)
+            shots[indexes] += round_shots
+            prob0 = zeros / np.maximum(shots, 1)
+            epsilon = np.sqrt(log_term / (2 * np.maximum(shots, 1)))
+            lower = prob0 - epsilon
+            upper = prob0 + epsilon
+            kth_upper = np.partition(upper[~discarded], k - 1)[k - 1]
+            newly_discarded = active & (lower > kth_upper)
+            discarded |= newly_discarded
+            active &= ~newly_discarded & (shots < max_shots)
+        prob0 = zeros / np.maximum(shots, 1)
+        if discarded.any():
+            # The k pairs with the smallest upper bounds are never
+            # discarded, so there are always at least k other pairs
+            kth_prob0 = np.partition(prob0[~discarded], k - 1)[k - 1]
+            prob0[discarded] = np.maximum(
+                prob0[discarded], np.nextafter(kth_prob0, np.inf))
+        return prob0, shots
+
+    @staticmethod
+    def distance_prob0_relation(prob0 : np.array) -> np.array:
+        """
+        Vectorised version of distance_prob_relation, taking directly
+        the probabilities of measuring 0 in the ancilla qubit.
+
+        Parameters
+        ----------
+        prob0 : np.array
+            Array with the probabilities of measuring 0 in the ancilla
+            qubit
+
+        Returns
+        -------
+        quantum_distance : np.array
+            Estimation of the quantum distances, with the same shape
+            as prob0
+        """
+        quantum_distance = np.abs(np.sqrt(
+            (8 * np.asarray(prob0) - 4).astype(complex)))
+        return quantum_distance
         
 
     
@@ -1,8 +1,10 @@
 import numpy as np
 import torch
 import torch.nn as nn
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
 from torch.optim import lr_scheduler
-from torch.utils.data import DataLoader
+from torch.utils.data import BatchSampler, DataLoader, DistributedSampler
 
 # from torchinfo import summary
 from beta_2_3_model import Beta_2_3_model
@@ -10,9 +12,13 @@ from utils import (
     seed_everything,
     preprocess_train_test_dataset_for_beta_2,
     preprocess_train_test_dataset_for_beta_3,
-    BertEmbeddingDataset,
 )
 
+# Shared with the other dressed models, importable once utils is imported
+from distributed import all_reduce_sums, gather_shards
+from tensor_datasets import TensorBatchSampler
+from fold_cache import FoldCache
+
 
 class Beta_2_3_trainer:
     def __init__(
@@ -31,6 +37,13 @@ class Beta_2_3_trainer:
         weight_decay: float,
         step_lr: int,
         gamma: float,
+        simulator: str = "pennylane",
+        qml_device: str = "default.qubit",
+        diff_method: str = "best",
+        shots: int = None,
+        frozen_inference: bool = False,
+        fold_cache: FoldCache = None,
+        distributed: bool = False,
     ):
 
         self.model = model
@@ -50,56 +63,105 @@ class Beta_2_3_trainer:
         self.step_lr = step_lr
         self.gamma = gamma
 
+        # Whether the circuit is evaluated by PennyLane or by the torch
+        # statevector simulation
+        self.simulator = simulator
+        # PennyLane device, differentiation method and number of shots
+        # of the QNode
+        self.qml_device = qml_device
+        self.diff_method = diff_method
+        self.shots = shots
+        # Whether validation, predict and compute_test_logs evaluate the
+        # circuit compiled for the fixed weights instead of simulating it
+        self.frozen_inference = frozen_inference
+        # Whether the run is trained by the processes of a distributed
+        # process group, each on a shard of the data
+        self.distributed = distributed
+        if self.distributed:
+            self.rank = dist.get_rank()
+            self.world_size = dist.get_world_size()
+        else:
+            self.rank = 0
+            self.world_size = 1
+
         # seed everything
         seed_everything(self.seed)
 
         if self.model == "beta_2":
-            (
-                self.X_train,
-                self.X_val,
-                self.X_test,
-                self.Y_train,
-                self.Y_val,
-                self.Y_test,
-            ) = preprocess_train_test_dataset_for_beta_2(
-                self.run_number, self.dataset_path, self.test_path
-            )
+            preprocess = preprocess_train_test_dataset_for_beta_2
         elif self.model == "beta_3":
-            (
-                self.X_train,
-                self.X_val,
-                self.X_test,
-                self.Y_train,
-                self.Y_val,
-                self.Y_test,
-            ) = preprocess_train_test_dataset_for_beta_3(
-                self.run_number, self.dataset_path, self.test_path
-            )
+            preprocess = preprocess_train_test_dataset_for_beta_3
         else:
             raise ValueError(
                 "Unrecognised model specified. Please choose between beta_2 or beta_3."
             )
 
-        self.n_classes = self.Y_train.apply(tuple).nunique()
+        # The datasets of the fold are shared with the other runs using
+        # the cache
+        if fold_cache is None:
+            fold_cache = FoldCache(self.dataset_path, self.test_path)
+        (
+            self.train_dataset,
+            self.validation_dataset,
+            self.test_dataset,
+            self.n_classes,
+        ) = fold_cache.get(preprocess, self.run_number)
 
         print("In the dataset there is:", self.n_classes, "classes")
 
-        # initialise datasets and optimizers as in PyTorch
-
-        self.train_dataset = BertEmbeddingDataset(self.X_train, self.Y_train)
+        # initialise dataloaders and optimizers as in PyTorch. The
+        # datasets hold the tensors and each batch is fetched at once, in
+        # the order of DataLoader(dataset, batch_size, shuffle)
+
+        if self.distributed:
+            # Each process draws its batches from its shard of the
+            # shuffled training set, so that an optimiser step still
+            # averages the gradients of batch_size samples
+            self.training_sampler = DistributedSampler(
+                self.train_dataset,
+                num_replicas=self.world_size,
+                rank=self.rank,
+                shuffle=True,
+                seed=self.seed,
+            )
+            training_batch_sampler = BatchSampler(
+                self.training_sampler,
+                max(1, self.batch_size // self.world_size),
+                drop_last=False,
+            )
+        else:
+            training_batch_sampler = TensorBatchSampler(
+                self.train_dataset, self.batch_size, shuffle=True
+            )
         self.training_dataloader = DataLoader(
-            self.train_dataset, batch_size=self.batch_size, shuffle=True
+            self.train_dataset,
+            sampler=training_batch_sampler,
+            batch_size=None,
         )
 
         # Shuffle is set to False for the validation dataset because in the predict function we need to keep the order of the predictions
-        self.validation_dataset = BertEmbeddingDataset(self.X_val, self.Y_val)
         self.validation_dataloader = DataLoader(
-            self.validation_dataset, batch_size=self.batch_size, shuffle=False
+            self.validation_dataset,
+            sampler=TensorBatchSampler(
+                self.validation_dataset,
+                self.batch_size,
+                shuffle=False,
+                rank=self.rank,
+                world_size=self.world_size,
+            ),
+            batch_size=None,
         )
 
-        self.test_dataset = BertEmbeddingDataset(self.X_test, self.Y_test)
         self.test_dataloader = DataLoader(
-            self.test_dataset, batch_size=self.batch_size, shuffle=False
+            self.test_dataset,
+            sampler=TensorBatchSampler(
+                self.test_dataset,
+                self.batch_size,
+                shuffle=False,
+                rank=self.rank,
+                world_size=self.world_size,
+            ),
+            batch_size=None,
         )
 
         # initialise the device
@@ -109,7 +171,14 @@ class Beta_2_3_trainer:
 
         # initialise model
         self.model = Beta_2_3_model(
-            self.n_qubits, self.q_delta, self.n_classes, self.device
+            self.n_qubits,
+            self.q_delta,
+            self.n_classes,
+            self.device,
+            simulator=self.simulator,
+            qml_device=self.qml_device,
+            diff_method=self.diff_method,
+            shots=self.shots,
         )
 
         # summary(self.model)
@@ -194,10 +263,17 @@ class Beta_2_3_trainer:
             self.opt, step_size=self.step_lr, gamma=self.gamma
         )
 
-        # self.model = nn.DataParallel(self.model)
         self.model.to(self.device)
         self.criterion.to(self.device)
 
+        # The gradients of the processes of a distributed run are
+        # averaged by DistributedDataParallel, which also starts them all
+        # from the parameters of rank 0
+        if self.distributed:
+            self.training_model = DistributedDataParallel(self.model)
+        else:
+            self.training_model = self.model
+
     def train(self):
         training_loss_list = []
         training_acc_list = []
@@ -212,6 +288,9 @@ class Beta_2_3_trainer:
             running_loss = 0.0
             running_corrects = 0
 
+            if self.distributed:
+                self.training_sampler.set_epoch(epoch)
+
             self.model.train()
             # with torch.enable_grad():
             # for circuits, embeddings, labels in train_dataloader:
@@ -221,7 +300,7 @@ class Beta_2_3_trainer:
                 labels = labels.to(self.device)
 
                 self.opt.zero_grad()
-                outputs = self.model(inputs)
+                outputs = self.training_model(inputs)
 
                 _, preds = torch.max(outputs, 1)
                 loss = self.criterion(outputs, labels)
@@ -241,44 +320,22 @@ class Beta_2_3_trainer:
                 running_corrects += batch_corrects
 
             # Print epoch results
-            train_loss = running_loss / len(self.training_dataloader.dataset)
-            train_acc = running_corrects / len(
-                self.training_dataloader.dataset
-            )
+            n_samples = len(self.training_dataloader.dataset)
+            if self.distributed:
+                # DistributedSampler repeats a few samples so that all the
+                # processes take the same number of steps, and they are
+                # counted each time they are seen
+                running_loss, running_corrects = all_reduce_sums(
+                    [running_loss, running_corrects]
+                )
+                n_samples = len(self.training_sampler) * self.world_size
+            train_loss = running_loss / n_samples
+            train_acc = running_corrects / n_samples
 
             training_loss_list.append(train_loss)
             training_acc_list.append(train_acc)
 
-            running_loss = 0.0
-            running_corrects = 0
-
-            self.model.eval()
-
-            with torch.no_grad():
-                for inputs, labels in self.validation_dataloader:
-                    batch_size_ = len(inputs)
-                    inputs = inputs.to(self.device)
-                    labels = labels.to(self.device)
-
-                    self.opt.zero_grad()
-
-                    outputs = self.model(inputs)
-                    _, preds = torch.max(outputs, 1)
-                    loss = self.criterion(outputs, labels)
-
-                    # Print iteration results
-                    running_loss += loss.item() * batch_size_
-                    batch_corrects = torch.sum(
-                        preds == torch.max(labels, 1)[1]
-                    ).item()
-                    running_corrects += batch_corrects
-
-            validation_loss = running_loss / len(
-                self.validation_dataloader.dataset
-            )
-            validation_acc = running_corrects / len(
-                self.validation_dataloader.dataset
-            )
+            validation_loss, validation_acc = self.validate()
 
             validation_loss_list.append(validation_loss)
             validation_acc_list.append(validation_acc)
@@ -305,10 +362,60 @@ class Beta_2_3_trainer:
             best_model,
         )
 
+    def validate(self):
+        """
+        Computes the loss and accuracy of the model on the validation
+        set
+        """
+        running_loss = 0.0
+        running_corrects = 0
+
+        self.model.eval()
+        if self.frozen_inference:
+            self.model.freeze()
+
+        with torch.no_grad():
+            for inputs, labels in self.validation_dataloader:
+                batch_size_ = len(inputs)
+                inputs = inputs.to(self.device)
+                labels = labels.to(self.device)
+
+                self.opt.zero_grad()
+
+                outputs = self.model(inputs)
+                _, preds = torch.max(outputs, 1)
+                loss = self.criterion(outputs, labels)
+
+                # Print iteration results
+                running_loss += loss.item() * batch_size_
+                batch_corrects = torch.sum(
+                    preds == torch.max(labels, 1)[1]
+                ).item()
+                running_corrects += batch_corrects
+
+        self.model.unfreeze()
+
+        if self.distributed:
+            # The shards of the processes hold each sample once
+            running_loss, running_corrects = all_reduce_sums(
+                [running_loss, running_corrects]
+            )
+
+        validation_loss = running_loss / len(
+            self.validation_dataloader.dataset
+        )
+        validation_acc = running_corrects / len(
+            self.validation_dataloader.dataset
+        )
+
+        return validation_loss, validation_acc
+
     def predict(self):
         prediction_list = torch.tensor([]).to(self.device)
 
         self.model.eval()
+        if self.frozen_inference:
+            self.model.freeze()
 
         with torch.no_grad():
             for inputs, labels in self.validation_dataloader:
@@ -322,6 +429,11 @@ class Beta_2_3_trainer:
                     (prediction_list, torch.round(torch.flatten(preds)))
                 )
 
+        self.model.unfreeze()
+
+        if self.distributed:
+            prediction_list = gather_shards(prediction_list)
+
         return prediction_list.detach().cpu().numpy()
 
     def compute_test_logs(self, best_model):
@@ -331,6 +443,8 @@ class Beta_2_3_trainer:
         # Load the best model found during training
         self.model.load_state_dict(best_model)
         self.model.eval()
+        if self.frozen_inference:
+            self.model.freeze()
 
         with torch.no_grad():
             for inputs, labels in self.test_dataloader:
@@ -351,6 +465,14 @@ class Beta_2_3_trainer:
                 ).item()
                 running_corrects += batch_corrects
 
+        self.model.unfreeze()
+
+        if self.distributed:
+            # The shards of the processes hold each sample once
+            running_loss, running_corrects = all_reduce_sums(
+                [running_loss, running_corrects]
+            )
+
         test_loss = running_loss / len(self.test_dataloader.dataset)
         test_acc = running_corrects / len(self.test_dataloader.dataset)
 
@@ -1,4 +1,5 @@
 import os
+import sys
 import random
 import numpy as np
 import torch
@@ -8,6 +9,11 @@ from sklearn.decomposition import PCA
 import ast
 from torch.utils.data import Dataset
 
+# The modules shared by the dressed models
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../common/")
+from feature_store import open_feature_store, load_fold_from_feature_stores
+
 
 def seed_everything(seed: int):
     random.seed(seed)
@@ -146,9 +152,6 @@ def preprocess_train_test_dataset_for_beta_2(
     Preprocess function for the dataset for the alpha 3 model
     """
 
-    df_dataset = pd.read_csv(dataset_csv_file)
-    df_test = pd.read_csv(test_csv_file)
-
     # Set up for 5-fold with 10 runs
     run_number += 1
     if 1 <= run_number <= 2:
@@ -166,6 +169,22 @@ def preprocess_train_test_dataset_for_beta_2(
         f"---------------------------\nSplit = {split_idx}\n----------------------------"
     )
 
+    # The feature stores converted from the CSV files are read if they
+    # exist, instead of parsing the embeddings
+    dataset_store = open_feature_store(dataset_csv_file)
+    test_store = open_feature_store(test_csv_file)
+    if dataset_store is not None and test_store is not None:
+        return load_fold_from_feature_stores(
+            dataset_store,
+            test_store,
+            [split_idx],
+            f"reduced_embedding_{split_idx}",
+            "reduced_embedding",
+        )
+
+    df_dataset = pd.read_csv(dataset_csv_file)
+    df_test = pd.read_csv(test_csv_file)
+
     df_train = df_dataset[df_dataset["split"] != split_idx]
     df_val = df_dataset[df_dataset["split"] == split_idx]
 
@@ -215,9 +234,6 @@ def preprocess_train_test_dataset_for_beta_3(
     Preprocess function for the dataset for the alpha 3 model
     """
 
-    df_dataset = pd.read_csv(dataset_csv_file)
-    df_test = pd.read_csv(test_csv_file)
-
     # Set up for 5-fold with 10 runs
     run_number += 1
     if 1 <= run_number <= 2:
@@ -235,6 +251,22 @@ def preprocess_train_test_dataset_for_beta_3(
         f"---------------------------\nSplit = {split_idx}\n----------------------------"
     )
 
+    # The feature stores converted from the CSV files are read if they
+    # exist, instead of parsing the embeddings
+    dataset_store = open_feature_store(dataset_csv_file)
+    test_store = open_feature_store(test_csv_file)
+    if dataset_store is not None and test_store is not None:
+        return load_fold_from_feature_stores(
+            dataset_store,
+            test_store,
+            [split_idx],
+            "reduced_embedding",
+            "reduced_embedding",
+        )
+
+    df_dataset = pd.read_csv(dataset_csv_file)
+    df_test = pd.read_csv(test_csv_file)
+
     df_train = df_dataset[df_dataset["split"] != split_idx]
     df_val = df_dataset[df_dataset["split"] == split_idx]
 
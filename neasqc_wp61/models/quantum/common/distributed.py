@@ -0,0 +1,64 @@
+import os
+import subprocess
+import torch
+import torch.distributed as dist
+
+
+def init_distributed():
+    """
+    Joins the process group of a distributed run, with the gloo backend.
+    The run is launched either by torchrun, which sets RANK, WORLD_SIZE,
+    MASTER_ADDR and MASTER_PORT, or by srun, in which case they are
+    derived from the SLURM variables: the first node of the job hosts
+    the rendezvous.
+    """
+    if "RANK" not in os.environ and "SLURM_PROCID" in os.environ:
+        os.environ["RANK"] = os.environ["SLURM_PROCID"]
+        os.environ["WORLD_SIZE"] = os.environ["SLURM_NTASKS"]
+        if "MASTER_ADDR" not in os.environ:
+            hostnames = subprocess.run(
+                [
+                    "scontrol",
+                    "show",
+                    "hostnames",
+                    os.environ["SLURM_JOB_NODELIST"],
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.split()
+            os.environ["MASTER_ADDR"] = hostnames[0]
+        os.environ.setdefault("MASTER_PORT", "29500")
+        if "SLURM_CPUS_PER_TASK" in os.environ:
+            torch.set_num_threads(int(os.environ["SLURM_CPUS_PER_TASK"]))
+    dist.init_process_group("gloo")
+
+
+def is_main_process():
+    """
+    Tells whether the process writes the outputs of the run: the
+    process of rank 0, or the only process of a run that is not
+    distributed
+    """
+    return not dist.is_initialized() or dist.get_rank() == 0
+
+
+def all_reduce_sums(values):
+    """
+    Sums values, such as running losses and numbers of correct
+    predictions, over the processes. The sums are taken in float64 so
+    that the counts stay exact.
+    """
+    sums = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(sums, op=dist.ReduceOp.SUM)
+    return sums.tolist()
+
+
+def gather_shards(shard):
+    """
+    Concatenates the shards of a tensor evaluated by each process, in
+    rank order
+    """
+    shards = [None] * dist.get_world_size()
+    dist.all_gather_object(shards, shard)
+    return torch.cat(shards)
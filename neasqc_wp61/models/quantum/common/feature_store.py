@@ -0,0 +1,179 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from sklearn import preprocessing
+
+# Columns stored next to the embeddings
+label_columns = ["split", "class"]
+
+
+def feature_store_path(csv_file):
+    """
+    Directory of the feature store converted from a CSV file
+    """
+    return os.path.splitext(csv_file)[0] + ".features"
+
+
+def is_embedding(value):
+    """
+    Tells whether a cell of a CSV holds an embedding written as a list
+    """
+    return isinstance(value, str) and value.lstrip().startswith("[")
+
+
+def parse_embeddings(cells):
+    """
+    Parses embeddings written as lists into a float32 array
+    """
+    return np.array(
+        [np.fromstring(cell.strip(" []"), sep=",") for cell in cells],
+        dtype=np.float32,
+    )
+
+
+def write_feature_store(csv_file, store_path=None, chunk_size=10000):
+    """
+    Converts a CSV file with embedding columns into a feature store: a
+    directory with one .npy file per embedding column, holding a
+    float32 array of shape (n_rows, dimension), and one per label
+    column, along with a meta.json describing the columns and the CSV
+    the store was converted from. The CSV is read in chunks, and the
+    arrays are written in place, so that the whole dataset is never
+    held as Python objects.
+    """
+    store_path = store_path or feature_store_path(csv_file)
+    os.makedirs(store_path, exist_ok=True)
+    # The meta file of a previous conversion is removed before its
+    # arrays are overwritten, and written again last, so that an
+    # interrupted conversion is never read
+    meta_path = os.path.join(store_path, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    first_rows = pd.read_csv(csv_file, nrows=1)
+    embedding_columns = [
+        column
+        for column in first_rows
+        if is_embedding(first_rows[column][0])
+    ]
+    columns = embedding_columns + [
+        column for column in label_columns if column in first_rows
+    ]
+    n_rows = sum(
+        len(chunk)
+        for chunk in pd.read_csv(
+            csv_file, usecols=[columns[0]], chunksize=chunk_size
+        )
+    )
+
+    arrays = {}
+    labels = {column: [] for column in columns if column in label_columns}
+    start = 0
+    for chunk in pd.read_csv(
+        csv_file, usecols=columns, chunksize=chunk_size
+    ):
+        for column in embedding_columns:
+            values = parse_embeddings(chunk[column])
+            if column not in arrays:
+                arrays[column] = np.lib.format.open_memmap(
+                    os.path.join(store_path, f"{column}.npy"),
+                    mode="w+",
+                    dtype=np.float32,
+                    shape=(n_rows, values.shape[1]),
+                )
+            arrays[column][start : start + len(chunk)] = values
+        for column in labels:
+            labels[column].append(chunk[column].to_numpy())
+        start += len(chunk)
+    for array in arrays.values():
+        array.flush()
+    for column, values in labels.items():
+        values = np.concatenate(values)
+        if values.dtype == object:
+            # Fixed width strings, which can be memory-mapped
+            values = values.astype(str)
+        np.save(os.path.join(store_path, f"{column}.npy"), values)
+
+    source = os.stat(csv_file)
+    meta = {
+        "n_rows": n_rows,
+        "embedding_columns": embedding_columns,
+        "label_columns": list(labels),
+        "source_size": source.st_size,
+        "source_mtime_ns": source.st_mtime_ns,
+    }
+    with open(meta_path, "w") as file:
+        json.dump(meta, file, indent=4)
+    return store_path
+
+
+def open_feature_store(path):
+    """
+    Memory-maps the columns of the feature store of a dataset. The path
+    is either the directory of the store or the CSV file it was
+    converted from. Returns None if there is no complete store, or if
+    the CSV changed after the conversion, in which case the CSV should
+    be read instead.
+    """
+    if os.path.isdir(path):
+        store_path, csv_file = path, None
+    else:
+        store_path, csv_file = feature_store_path(path), path
+    meta_path = os.path.join(store_path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as file:
+        meta = json.load(file)
+    if csv_file is not None and os.path.exists(csv_file):
+        source = os.stat(csv_file)
+        if (source.st_size, source.st_mtime_ns) != (
+            meta["source_size"],
+            meta["source_mtime_ns"],
+        ):
+            print(
+                f"The feature store {store_path} is older than {csv_file}, reading the CSV instead"
+            )
+            return None
+    return {
+        column: np.load(
+            os.path.join(store_path, f"{column}.npy"), mmap_mode="r"
+        )
+        for column in meta["embedding_columns"] + meta["label_columns"]
+    }
+
+
+def load_fold_from_feature_stores(
+    dataset_store,
+    test_store,
+    val_splits,
+    embedding_column,
+    test_embedding_column,
+):
+    """
+    Builds the train, validation and test sets of a fold from feature
+    stores, in the format of the CSV loaders: the embeddings and the
+    one-hot encoded classes as Series with one row per sample
+    """
+    val_mask = np.isin(dataset_store["split"], val_splits)
+    embeddings = dataset_store[embedding_column]
+    classes = np.asarray(dataset_store["class"])
+
+    enc = preprocessing.OneHotEncoder(handle_unknown="ignore")
+    enc.fit(classes.reshape(-1, 1))
+
+    def one_hot(values):
+        return pd.Series(
+            enc.transform(np.asarray(values).reshape(-1, 1))
+            .toarray()
+            .tolist()
+        )
+
+    X_train = pd.Series(list(np.asarray(embeddings[~val_mask])))
+    X_val = pd.Series(list(np.asarray(embeddings[val_mask])))
+    X_test = pd.Series(list(np.asarray(test_store[test_embedding_column])))
+    y_train = one_hot(classes[~val_mask])
+    y_val = one_hot(classes[val_mask])
+    y_test = one_hot(test_store["class"])
+
+    return X_train, X_val, X_test, y_train, y_val, y_test
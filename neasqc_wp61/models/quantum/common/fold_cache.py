@@ -0,0 +1,53 @@
+from tensor_datasets import TensorEmbeddingDataset
+
+
+class FoldCache:
+    """
+    Datasets of the folds of the cross validation, built once per
+    process and reused by the runs on the same fold (runs 2k and
+    2k + 1), along with the test set, which is the same for every
+    fold. With share_memory, the tensors are moved to shared memory, so
+    that parallel workers receiving the datasets do not copy them.
+    Only the fold of the last run is kept, so that sequential runs hold
+    one fold at a time, unless keep_all_folds is set, for parallel runs
+    whose folds are all built before dispatching them.
+    """
+
+    def __init__(
+        self, dataset_path, test_path, share_memory=False, keep_all_folds=False
+    ):
+        self.dataset_path = dataset_path
+        self.test_path = test_path
+        self.share_memory = share_memory
+        self.keep_all_folds = keep_all_folds
+        self.folds = {}
+        self.test_datasets = {}
+
+    def get(self, preprocess, run_number):
+        """
+        Returns the train, validation and test datasets of the fold of
+        a run, and the number of classes in its training set
+        """
+        key = (preprocess.__name__, run_number // 2)
+        if key not in self.folds:
+            if not self.keep_all_folds:
+                # The runs are in fold order, so the previous fold is
+                # not needed anymore
+                self.folds.clear()
+            X_train, X_val, X_test, Y_train, Y_val, Y_test = preprocess(
+                run_number, self.dataset_path, self.test_path
+            )
+            test_dataset = self.test_datasets.get(preprocess.__name__)
+            if test_dataset is None:
+                test_dataset = TensorEmbeddingDataset(X_test, Y_test)
+            datasets = [
+                TensorEmbeddingDataset(X_train, Y_train),
+                TensorEmbeddingDataset(X_val, Y_val),
+                test_dataset,
+            ]
+            if self.share_memory:
+                datasets = [dataset.share_memory() for dataset in datasets]
+            self.test_datasets[preprocess.__name__] = datasets[2]
+            n_classes = Y_train.apply(tuple).nunique()
+            self.folds[key] = (*datasets, n_classes)
+        return self.folds[key]
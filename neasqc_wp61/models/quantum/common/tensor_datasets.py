@@ -0,0 +1,74 @@
+import numpy as np
+import torch
+from torch.utils.data import (
+    BatchSampler,
+    Dataset,
+    RandomSampler,
+    SequentialSampler,
+)
+
+
+class TensorEmbeddingDataset(Dataset):
+    """
+    Embedding dataset held as contiguous float32 tensors. The features
+    and the one-hot labels are converted once, and an index can be a
+    whole batch of indices or a slice.
+    """
+
+    def __init__(self, X, Y):
+        self.X = torch.tensor(np.array(X.tolist()), dtype=torch.float32)
+        self.Y = torch.tensor(np.array(Y.tolist()), dtype=torch.float32)
+
+    def __len__(self):
+        return len(self.X)
+
+    def __getitem__(self, idx):
+        return self.X[idx], self.Y[idx]
+
+    def share_memory(self):
+        """
+        Moves the tensors to shared memory, so that the processes the
+        dataset is sent to map them instead of receiving a copy
+        """
+        self.X.share_memory_()
+        self.Y.share_memory_()
+        return self
+
+
+class TensorBatchSampler(BatchSampler):
+    """
+    Batch sampler yielding the indices of each batch at once, in the
+    order of DataLoader(dataset, batch_size, shuffle): the shuffled
+    order is drawn by a RandomSampler, and without shuffling the
+    batches are contiguous slices. Without shuffling, the dataset can
+    also be split into world_size contiguous shards, of which the
+    sampler only yields the batches of shard rank, so that the
+    processes of a distributed run each evaluate a part of the dataset.
+    """
+
+    def __init__(self, dataset, batch_size, shuffle, rank=0, world_size=1):
+        if shuffle and world_size > 1:
+            raise ValueError(
+                "Only the batches of a sampler without shuffling can be sharded."
+            )
+        sampler = (
+            RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+        )
+        super().__init__(sampler, batch_size, drop_last=False)
+        self.shard_start = len(dataset) * rank // world_size
+        self.shard_stop = len(dataset) * (rank + 1) // world_size
+
+    def __iter__(self):
+        if isinstance(self.sampler, SequentialSampler):
+            for start in range(
+                self.shard_start, self.shard_stop, self.batch_size
+            ):
+                yield slice(
+                    start, min(start + self.batch_size, self.shard_stop)
+                )
+        else:
+            yield from super().__iter__()
+
+    def __len__(self):
+        shard_size = self.shard_stop - self.shard_start
+        return (shard_size + self.batch_size - 1) // self.batch_size
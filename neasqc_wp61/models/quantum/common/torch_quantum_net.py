@@ -0,0 +1,278 @@
+import torch
+from torch import nn
+
+
+class TorchQuantumNet(nn.Module):
+    """
+    Pure torch statevector simulation of quantum_net_from_paper, the
+    circuit of the dressed quantum models: X angle embedding of the
+    inputs, a layer of RZ, CRX between all ordered pairs of qubits, a
+    layer of RX, a layer of RZ and the expectation value of PauliY on
+    each qubit. The whole batch is simulated at once as a tensor of
+    shape (batch, 2, ..., 2), with wire 0 as the most significant qubit
+    as in PennyLane, and gradients are computed by autograd.
+    """
+
+    def __init__(self, n_qubits, dtype=torch.complex128):
+        """
+        Parameters
+        ----------
+        n_qubits : int
+            Number of qubits of the circuit
+        dtype : torch.dtype, default : torch.complex128
+            Complex type of the statevector
+        """
+        super().__init__()
+        self.n_qubits = n_qubits
+        self.dtype = dtype
+
+    @staticmethod
+    def rx_matrix(theta):
+        """
+        RX(theta) matrices, with shape theta.shape + (2, 2)
+        """
+        cos = torch.cos(theta / 2)
+        sin = -1j * torch.sin(theta / 2)
+        return torch.stack(
+            [torch.stack([cos, sin], -1), torch.stack([sin, cos], -1)], -2
+        )
+
+    @staticmethod
+    def rz_phases(theta):
+        """
+        Diagonal of RZ(theta), with shape theta.shape + (2,)
+        """
+        return torch.stack(
+            [torch.exp(-0.5j * theta), torch.exp(0.5j * theta)], -1
+        )
+
+    def apply_matrix(self, state, matrix, wire):
+        """
+        Applies the same single qubit matrix to a wire of every state
+        of the batch
+        """
+        axis = wire + 1
+        state = torch.movedim(state, axis, -1) @ matrix.transpose(-1, -2)
+        return torch.movedim(state, -1, axis)
+
+    def apply_phases(self, state, phases, wire):
+        """
+        Applies a diagonal single qubit gate to a wire
+        """
+        shape = [1] * (self.n_qubits + 1)
+        shape[wire + 1] = 2
+        return state * phases.reshape(shape)
+
+    def apply_controlled_matrix(self, state, matrix, control, target):
+        """
+        Applies a single qubit matrix to the target wire of the states
+        where the control wire is 1
+        """
+        control_axis = control + 1
+        inactive, active = torch.unbind(state, control_axis)
+        # The target axis moves down by one if it came after the control
+        target_wire = target if target < control else target - 1
+        active = self.apply_matrix(active, matrix, target_wire)
+        return torch.stack([inactive, active], control_axis)
+
+    def apply_circuit(self, state, q_weights):
+        """
+        Applies the gates that follow the embedding to a batch of
+        states of shape (batch, 2, ..., 2)
+        """
+        n = self.n_qubits
+        parameter_index = 0
+        # RZ_layer:
+        rz_phases = self.rz_phases(
+            q_weights[parameter_index : parameter_index + n]
+        )
+        for wire in range(n):
+            state = self.apply_phases(state, rz_phases[wire], wire)
+        parameter_index += n
+
+        rx_matrices = self.rx_matrix(
+            q_weights[parameter_index : parameter_index + n * (n - 1)]
+        )
+        for k in range(n):
+            for j in range(n):
+                if k != j:
+                    state = self.apply_controlled_matrix(
+                        state, rx_matrices[parameter_index - n], k, j
+                    )
+                    parameter_index += 1
+
+        # RX_layer:
+        rx_matrices = self.rx_matrix(
+            q_weights[parameter_index : parameter_index + n]
+        )
+        for wire in range(n):
+            state = self.apply_matrix(state, rx_matrices[wire], wire)
+        parameter_index += n
+
+        # RZ_layer:
+        rz_phases = self.rz_phases(
+            q_weights[parameter_index : parameter_index + n]
+        )
+        for wire in range(n):
+            state = self.apply_phases(state, rz_phases[wire], wire)
+        return state
+
+    def unitary_transpose(self, q_weights):
+        """
+        Transpose of the unitary of the gates that follow the
+        embedding, obtained by applying them to the computational basis
+        states, so that row c is U|c>
+        """
+        dim = 2**self.n_qubits
+        basis = torch.eye(dim, dtype=self.dtype).reshape(
+            [dim] + [2] * self.n_qubits
+        )
+        return self.apply_circuit(basis, q_weights).reshape(dim, dim)
+
+    def embed(self, inputs):
+        """
+        Product states of the X angle embedding, with shape
+        (batch, 2, ..., 2)
+        """
+        qubit_states = torch.stack(
+            [torch.cos(inputs / 2), -1j * torch.sin(inputs / 2)], -1
+        ).to(self.dtype)
+        state = qubit_states[:, 0]
+        for wire in range(1, self.n_qubits):
+            state = state.unsqueeze(-1) * qubit_states[:, wire].reshape(
+                [-1] + [1] * wire + [2]
+            )
+        return state
+
+    def compile_observables(self, q_weights):
+        """
+        Precomputes, for fixed weights, the observables U^dagger Y_i U
+        measured on the embedded states, with U the unitary of the
+        gates that follow the embedding. The embedded state of angles x
+        is P r, with r the real product state of the cos(x_i / 2) and
+        sin(x_i / 2) and P the diagonal of the phases (-i)^k, k being
+        the number of qubits set. Only the real part of
+        P^dagger U^dagger Y_i U P contributes to the quadratic form of a
+        real vector, so the compiled observables are real.
+
+        Parameters
+        ----------
+        q_weights : torch.Tensor
+            The (n_qubits + 2) * n_qubits weights of the circuit
+
+        Returns
+        -------
+        observables : torch.Tensor
+            Real tensor of shape (n_qubits, 2^n_qubits, 2^n_qubits)
+            with the compiled observable of each qubit
+        """
+        n = self.n_qubits
+        dim = 2**n
+        real_dtype = (
+            torch.float64 if self.dtype == torch.complex128 else torch.float32
+        )
+        unitary_transpose = self.unitary_transpose(q_weights.to(real_dtype))
+        pauli_y = torch.tensor([[0, -1j], [1j, 0]], dtype=self.dtype)
+        n_ones = torch.zeros(dim, dtype=torch.long)
+        for wire in range(n):
+            n_ones += (torch.arange(dim) >> (n - 1 - wire)) & 1
+        phases = (-1j) ** n_ones.to(self.dtype)
+        observables = []
+        for wire in range(n):
+            # Row d holds Y_i U|d>
+            y_unitary_transpose = self.apply_matrix(
+                unitary_transpose.reshape([dim] + [2] * n), pauli_y, wire
+            ).reshape(dim, dim)
+            observable = torch.conj(unitary_transpose) @ y_unitary_transpose.T
+            observables.append(
+                torch.real(
+                    torch.conj(phases)[:, None] * observable * phases[None, :]
+                )
+            )
+        return torch.stack(observables)
+
+    def frozen_forward(self, inputs, observables):
+        """
+        Evaluates the circuit with the observables compiled by
+        compile_observables, as a batch of quadratic forms of the real
+        product states
+
+        Parameters
+        ----------
+        inputs : torch.Tensor
+            Angles of the embedding, with shape (batch, n_qubits)
+        observables : torch.Tensor
+            Output of compile_observables
+
+        Returns
+        -------
+        exp_vals_Y : torch.Tensor
+            Expectation value of PauliY on each qubit, with shape
+            (batch, n_qubits)
+        """
+        n = self.n_qubits
+        dim = 2**n
+        inputs = inputs.to(observables.dtype)
+        cos = torch.cos(inputs / 2)
+        sin = torch.sin(inputs / 2)
+        state = torch.ones(len(inputs), 1, dtype=observables.dtype)
+        for wire in range(n):
+            state = torch.stack(
+                [state * cos[:, wire, None], state * sin[:, wire, None]], -1
+            ).reshape(len(inputs), -1)
+        # (batch, n_qubits, dim) products O_i r, then r^T O_i r
+        products = (
+            state @ observables.permute(1, 0, 2).reshape(dim, n * dim)
+        ).reshape(len(inputs), n, dim)
+        return (products * state[:, None, :]).sum(-1)
+
+    def forward(self, inputs, q_weights):
+        """
+        Simulates the circuit for a batch of inputs. When the batch
+        holds more states than the dimension of the Hilbert space, the
+        gates are applied to the basis states instead and the batch is
+        evolved with a single matrix product.
+
+        Parameters
+        ----------
+        inputs : torch.Tensor
+            Angles of the embedding, with shape (batch, n_qubits)
+        q_weights : torch.Tensor
+            The (n_qubits + 2) * n_qubits weights of the circuit, in
+            the order used by quantum_net_from_paper
+
+        Returns
+        -------
+        exp_vals_Y : torch.Tensor
+            Expectation value of PauliY on each qubit, with shape
+            (batch, n_qubits)
+        """
+        n = self.n_qubits
+        real_dtype = (
+            torch.float64 if self.dtype == torch.complex128 else torch.float32
+        )
+        inputs = inputs.to(real_dtype)
+        q_weights = q_weights.to(real_dtype)
+
+        # The embedding gives a product state, built directly
+        state = self.embed(inputs)
+        if len(state) > 2**n:
+            state = (
+                state.reshape(len(state), -1)
+                @ self.unitary_transpose(q_weights)
+            ).reshape(state.shape)
+        else:
+            state = self.apply_circuit(state, q_weights)
+
+        # <Y> = 2 Im(conj(a) b), with a and b the amplitudes where the
+        # wire is 0 and 1
+        exp_vals_Y = []
+        for wire in range(n):
+            zero, one = torch.unbind(state, wire + 1)
+            exp_vals_Y.append(
+                2
+                * torch.imag(torch.conj(zero) * one)
+                .reshape(len(state), -1)
+                .sum(-1)
+            )
+        return torch.stack(exp_vals_Y, -1)
@@ -0,0 +1,274 @@
+import contextlib
+import copy
+import torch
+import torch.nn as nn
+from torch.func import functional_call, stack_module_state, vmap
+from torch.optim import lr_scheduler
+
+# Optimisers that update each parameter element independently, so that
+# one optimiser over the stacked parameters of several runs behaves as
+# one optimiser per run
+elementwise_optimisers = (
+    "Adam",
+    "RMSprop",
+    "Adadelta",
+    "Adagrad",
+    "AdamW",
+    "Adamax",
+    "ASGD",
+    "NAdam",
+    "RAdam",
+    "Rprop",
+    "SGD",
+)
+
+
+@contextlib.contextmanager
+def run_rng_state(rng_states, run):
+    """
+    Makes the global torch random state the one of a run for the
+    duration of the block, and stores the state the run left it in
+    """
+    outer_state = torch.get_rng_state()
+    torch.set_rng_state(rng_states[run])
+    try:
+        yield
+    finally:
+        rng_states[run] = torch.get_rng_state()
+        torch.set_rng_state(outer_state)
+
+
+def check_trainers(trainers):
+    """
+    Checks that the runs can be trained together: same architecture,
+    same hyperparameters and a circuit simulated in torch
+    """
+    reference = trainers[0]
+    for trainer in trainers:
+        if trainer.model.simulator != "torch":
+            raise ValueError(
+                "Vectorised training needs the torch simulator of the circuit."
+            )
+        if trainer.optimiser not in elementwise_optimisers:
+            raise ValueError(
+                f"The {trainer.optimiser} optimiser cannot be vectorised "
+                "over runs."
+            )
+        for attribute in [
+            "optimiser",
+            "number_of_epochs",
+            "n_qubits",
+            "n_classes",
+            "batch_size",
+            "lr",
+            "weight_decay",
+            "step_lr",
+            "gamma",
+        ]:
+            if getattr(trainer, attribute) != getattr(reference, attribute):
+                raise ValueError(
+                    f"All the vectorised runs must have the same {attribute}."
+                )
+
+
+def group_by_number_of_batches(trainers):
+    """
+    Groups the runs whose training sets have the same number of batches,
+    which take their optimiser steps together
+    """
+    groups = {}
+    for run, trainer in enumerate(trainers):
+        groups.setdefault(len(trainer.training_dataloader), []).append(run)
+    return list(groups.values())
+
+
+def stack_batches(batches):
+    """
+    Pads the batches of the runs to the same size and stacks them,
+    along with a mask of the samples that are not padding
+    """
+    size = max(len(inputs) for inputs, _ in batches)
+    inputs = torch.zeros((len(batches), size) + batches[0][0].shape[1:])
+    labels = torch.zeros((len(batches), size) + batches[0][1].shape[1:])
+    mask = torch.zeros(len(batches), size)
+    for i, (run_inputs, run_labels) in enumerate(batches):
+        inputs[i, : len(run_inputs)] = run_inputs
+        labels[i, : len(run_labels)] = run_labels
+        mask[i, : len(run_inputs)] = 1
+    return inputs, labels, mask
+
+
+def train_group(trainers, rng_states):
+    """
+    Trains runs with the same number of batches per epoch together. The
+    parameters of their models are stacked, the forward and backward
+    passes are vectorised over the runs with vmap, and a single
+    optimiser updates the stacked parameters.
+    """
+    reference = trainers[0]
+    device = reference.device
+    params, buffers = stack_module_state(
+        [trainer.model for trainer in trainers]
+    )
+    base_model = copy.deepcopy(reference.model).to("meta")
+
+    def forward(run_params, run_buffers, inputs):
+        return functional_call(
+            base_model, (run_params, run_buffers), (inputs,)
+        )
+
+    batched_forward = vmap(forward)
+
+    opt = getattr(torch.optim, reference.optimiser)(
+        params.values(), lr=reference.lr, weight_decay=reference.weight_decay
+    )
+    scheduler = lr_scheduler.StepLR(
+        opt, step_size=reference.step_lr, gamma=reference.gamma
+    )
+
+    n_runs = len(trainers)
+    training_loss_lists = [[] for _ in range(n_runs)]
+    training_acc_lists = [[] for _ in range(n_runs)]
+    validation_loss_lists = [[] for _ in range(n_runs)]
+    validation_acc_lists = [[] for _ in range(n_runs)]
+    best_val_accs = [0.0] * n_runs
+    best_models = [None] * n_runs
+
+    for epoch in range(reference.number_of_epochs):
+        print("Epoch: {}".format(epoch))
+        running_losses = [0.0] * n_runs
+        running_corrects = [0] * n_runs
+
+        # Each run draws its batches from its own random state, as it
+        # would if it was trained alone
+        iterators = []
+        for run, trainer in enumerate(trainers):
+            with run_rng_state(rng_states, run):
+                iterators.append(iter(trainer.training_dataloader))
+
+        for _ in range(len(reference.training_dataloader)):
+            batches = []
+            for run, iterator in enumerate(iterators):
+                with run_rng_state(rng_states, run):
+                    batches.append(next(iterator))
+            inputs, labels, mask = stack_batches(batches)
+            inputs = inputs.to(device)
+            labels = labels.to(device)
+            mask = mask.to(device)
+
+            opt.zero_grad()
+            outputs = batched_forward(params, buffers, inputs)
+
+            _, preds = torch.max(outputs, 2)
+            # Loss of each run on its own batch, the mean cross entropy
+            # of the samples that are not padding
+            sample_losses = nn.functional.cross_entropy(
+                outputs.transpose(1, 2),
+                labels.transpose(1, 2),
+                reduction="none",
+            )
+            batch_sizes = mask.sum(1)
+            losses = (sample_losses * mask).sum(1) / batch_sizes
+            # The runs do not share parameters, so the gradient of the sum
+            # is the gradient of each loss
+            losses.sum().backward()
+
+            opt.step()
+
+            batch_corrects = (
+                (preds == torch.max(labels, 2)[1]) * mask.bool()
+            ).sum(1)
+            for run in range(n_runs):
+                running_losses[run] += (
+                    losses[run].item() * batch_sizes[run].item()
+                )
+                running_corrects[run] += batch_corrects[run].item()
+
+        for run, trainer in enumerate(trainers):
+            dataset_size = len(trainer.training_dataloader.dataset)
+            training_loss_lists[run].append(
+                running_losses[run] / dataset_size
+            )
+            training_acc_lists[run].append(
+                running_corrects[run] / dataset_size
+            )
+
+            # The weights of the run are copied to its own model to be
+            # validated
+            run_state = {name: params[name][run] for name in params}
+            with torch.no_grad():
+                trainer.model.load_state_dict(run_state)
+            with run_rng_state(rng_states, run):
+                validation_loss, validation_acc = trainer.validate()
+            validation_loss_lists[run].append(validation_loss)
+            validation_acc_lists[run].append(validation_acc)
+
+            if validation_acc > best_val_accs[run]:
+                best_val_accs[run] = validation_acc
+                # Like state_dict(), the views follow the parameters
+                # until the end of the training
+                best_models[run] = run_state
+
+            print("Run: {}".format(trainer.run_number))
+            print("Train loss: {}".format(training_loss_lists[run][-1]))
+            print("Valid loss: {}".format(validation_loss))
+            print("Train acc: {}".format(training_acc_lists[run][-1]))
+            print("Valid acc: {}".format(validation_acc))
+
+        scheduler.step()
+        print("-" * 20)
+
+    results = []
+    for run, trainer in enumerate(trainers):
+        with torch.no_grad():
+            trainer.model.load_state_dict(
+                {name: params[name][run] for name in params}
+            )
+        best_model = best_models[run]
+        if best_model is not None:
+            best_model = {
+                name: value.detach().clone()
+                for name, value in best_model.items()
+            }
+        results.append(
+            (
+                training_loss_lists[run],
+                training_acc_lists[run],
+                validation_loss_lists[run],
+                validation_acc_lists[run],
+                best_val_accs[run],
+                best_model,
+            )
+        )
+    return results
+
+
+def train_vectorised(trainers, rng_states):
+    """
+    Trains the models of several runs together, returning for each run
+    the output of its trainer's train(). The runs are grouped by number
+    of batches per epoch, since runs on folds of different sizes cannot
+    take their steps together, and each group is trained in one
+    vectorised pass. After training, each trainer's model holds the
+    final weights of its run, so that predict and compute_test_logs can
+    be called as after train().
+
+    Parameters
+    ----------
+    trainers : list
+        Trainers of the runs, using the torch simulator
+    rng_states : list
+        Global torch random state of each run after creating its
+        trainer, from which its batches are drawn
+    """
+    check_trainers(trainers)
+    rng_states = list(rng_states)
+    results = [None] * len(trainers)
+    for group in group_by_number_of_batches(trainers):
+        group_results = train_group(
+            [trainers[run] for run in group],
+            [rng_states[run] for run in group],
+        )
+        for run, result in zip(group, group_results):
+            results[run] = result
+    return results
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+
+def write_dataset(path, n_rows, seed, with_split=True, sentence_dim=6):
+    """
+    Writes a CSV in the format of the dressed model datasets, with
+    random embeddings: sentence embeddings of dimension sentence_dim,
+    3 dimensional reduced embeddings and, unless with_split is False,
+    the split of each row and the reduced embeddings of each fold.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "sentence": [f"sentence {i}" for i in range(n_rows)],
+        "class": rng.choice(["World", "Sports", "Business"], n_rows),
+        "sentence_embedding": [
+            str(list(v)) for v in rng.normal(size=(n_rows, sentence_dim))],
+        "reduced_embedding": [
+            str(list(v)) for v in rng.normal(size=(n_rows, 3))],
+    })
+    if with_split:
+        df["split"] = rng.integers(10, size=n_rows)
+        for i in range(5):
+            df[f"reduced_embedding_{i}"] = [
+                str(list(v)) for v in rng.normal(size=(n_rows, 3))]
+    df.to_csv(path, index=False)
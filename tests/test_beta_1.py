@@ -0,0 +1,573 @@
+import unittest
+import os
+import sys
+import json
+import tempfile
+import time
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../neasqc_wp61/models/quantum/beta_1/")
+from quantum_distance import QuantumDistance as qd
+from beta_1 import QuantumKNearestNeighbours as qkn
+from index_register_distance import IndexRegisterDistance
+sys.path.append(current_path + "/../neasqc_wp61/data/data_processing/")
+from use_beta_1_stream import classify_micro_batch
+import numpy as np
+from sklearn.decomposition import PCA
+
+
+def random_normalised_vectors(n_vectors, n, seed):
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(-1000, 1000, size=(n_vectors, n))
+    return qkn.normalise_vector(X)
+
+
+class TestAnalyticQuantumDistance(unittest.TestCase):
+
+    def test_ancilla_probabilities_match_circuit(self):
+        for n in [2, 4, 8]:
+            X1 = random_normalised_vectors(3, n, 18051967)
+            X2 = random_normalised_vectors(4, n, 19671805)
+            prob0 = qd.compute_ancilla_probabilities(X1, X2)
+            self.assertEqual(prob0.shape, (3, 4))
+            for i, x1 in enumerate(X1):
+                for j, x2 in enumerate(X2):
+                    model = qd(x1, x2)
+                    circuit_distance = model.compute_quantum_distance()
+                    circuit_prob0 = sum(
+                        v for k, v in model.state_probabilities.items()
+                        if k[0] == '0'
+                    )
+                    self.assertAlmostEqual(prob0[i, j], circuit_prob0)
+                    self.assertAlmostEqual(
+                        qd.distance_prob0_relation(prob0[i, j]),
+                        circuit_distance
+                    )
+
+    def test_compute_many_matches_single_circuits(self):
+        X = random_normalised_vectors(6, 8, 5)
+        prob0 = qd.compute_many(X[0], X)
+        self.assertIsInstance(prob0, np.ndarray)
+        self.assertEqual(prob0.shape, (6,))
+        for j, x in enumerate(X):
+            self.assertAlmostEqual(
+                qd.distance_prob0_relation(prob0[j]),
+                qd(X[0], x).compute_quantum_distance()
+            )
+
+    def test_analytic_predictions_match_aer(self):
+        X_train = random_normalised_vectors(12, 4, 0)
+        X_test = random_normalised_vectors(5, 4, 1)
+        y_train = np.array([0, 1, 2] * 4)
+        y_test = np.zeros(5, dtype=int)
+        predictions = {}
+        for backend in ['aer', 'analytic']:
+            model = qkn(
+                X_train, X_test, y_train, y_test, [1, 3, 5],
+                backend=backend, batch_size=2
+            )
+            model.compute_predictions()
+            predictions[backend] = model.get_predictions()
+        self.assertEqual(predictions['aer'], predictions['analytic'])
+
+    def test_parallel_predictions_match_serial(self):
+        X_train = random_normalised_vectors(10, 4, 6)
+        X_test = random_normalised_vectors(7, 4, 7)
+        y_train = np.array([0, 1] * 5)
+        for backend in ['aer', 'analytic']:
+            model = qkn(
+                X_train, X_test, y_train, np.zeros(7), [1, 3],
+                backend=backend
+            )
+            model.compute_predictions()
+            serial_predictions = model.get_predictions()
+            model.compute_predictions(n_workers=2)
+            self.assertEqual(model.get_predictions(), serial_predictions)
+
+    def test_resume_from_checkpoint(self):
+        X_train = random_normalised_vectors(10, 4, 8)
+        X_test = random_normalised_vectors(9, 4, 9)
+        y_train = np.array([0, 1] * 5)
+        model = qkn(
+            X_train, X_test, y_train, np.zeros(9), [1, 3],
+            backend='analytic', batch_size=4
+        )
+        model.compute_predictions()
+        expected_predictions = model.get_predictions()
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            model.compute_predictions(
+                compute_checkpoints=True, checkpoint_dir=checkpoint_dir,
+                run_id='run'
+            )
+            run_dir = os.path.join(checkpoint_dir, 'run')
+            with open(os.path.join(run_dir, 'manifest.json')) as file:
+                manifest = json.load(file)
+            shard_path = os.path.join(run_dir, manifest['shards'][0])
+            # Simulate an interruption while writing the 5th prediction
+            with open(shard_path) as file:
+                lines = file.readlines()
+            self.assertEqual(len(lines), 9)
+            with open(shard_path, 'w') as file:
+                file.writelines(lines[:4])
+                file.write(lines[4][:5])
+            model.compute_predictions(
+                compute_checkpoints=True, checkpoint_dir=checkpoint_dir,
+                run_id='run', n_workers=2
+            )
+            self.assertEqual(model.get_predictions(), expected_predictions)
+            # Only the missing predictions were computed again
+            with open(os.path.join(run_dir, 'manifest.json')) as file:
+                manifest = json.load(file)
+            n_lines = 0
+            for name in manifest['shards']:
+                with open(os.path.join(run_dir, name)) as file:
+                    n_lines += len(
+                        [line for line in file if line.endswith('}\n')])
+            self.assertEqual(n_lines, 9)
+            other_model = qkn(
+                X_train, X_test, y_train, np.zeros(9), [1],
+                backend='analytic'
+            )
+            with self.assertRaises(ValueError):
+                other_model.compute_predictions(
+                    compute_checkpoints=True,
+                    checkpoint_dir=checkpoint_dir, run_id='run'
+                )
+
+    def test_distance_store_reused_across_k_values(self):
+        X_train = random_normalised_vectors(10, 4, 10)
+        X_test = random_normalised_vectors(6, 4, 11)
+        y_train = np.array([0, 1] * 5)
+        with tempfile.TemporaryDirectory() as store_dir:
+            model = qkn(
+                X_train, X_test, y_train, np.zeros(6), [1, 3],
+                backend='analytic', batch_size=4
+            )
+            model.compute_predictions(
+                n_workers=2, distance_store_dir=store_dir)
+            self.assertTrue(model.distance_store.computed_rows(
+                range(6)).all())
+            new_model = qkn(
+                X_train, X_test, y_train, np.zeros(6), [1, 3, 5],
+                backend='analytic', batch_size=4
+            )
+            new_model.compute_predictions()
+            expected_predictions = new_model.get_predictions()
+
+            def fail(samples):
+                raise AssertionError('distances were computed again')
+            new_model.compute_distances_batch = fail
+            new_model.compute_predictions(distance_store_dir=store_dir)
+            self.assertEqual(
+                new_model.get_predictions(), expected_predictions)
+
+    def test_batch_vote_matches_per_sample_vote(self):
+        rng = np.random.default_rng(12)
+        k_values = [1, 2, 3, 4, 5, 8, 9, 40]
+        for n_classes in [2, 3, 5]:
+            X = random_normalised_vectors(30, 2, n_classes)
+            y_train = rng.integers(0, n_classes, size=30)
+            model = qkn(X, X, y_train, y_train, k_values, backend='analytic')
+            # Integer distances give many ties to break
+            distances = rng.integers(0, 6, size=(50, 30)).astype(float)
+            closest_indexes = model.compute_minimum_distances_batch(
+                distances, max(k_values))
+            labels = model.labels_majority_vote_batch(closest_indexes)
+            for i, row in enumerate(distances):
+                closest_indexes_list = model.compute_minimum_distances(
+                    row.tolist(), k_values)
+                self.assertEqual(
+                    closest_indexes[i].tolist(), closest_indexes_list[-1])
+                self.assertEqual(
+                    labels[i].tolist(),
+                    model.labels_majority_vote(closest_indexes_list)
+                )
+
+    def test_shortlist_predictions_match_exhaustive(self):
+        X_train = random_normalised_vectors(40, 4, 13)
+        X_test = random_normalised_vectors(8, 4, 14)
+        y_train = np.array([0, 1, 2, 3] * 10)
+        predictions = []
+        for shortlist_factor in [None, 2]:
+            model = qkn(
+                X_train, X_test, y_train, np.zeros(8), [1, 3],
+                backend='analytic', shortlist_factor=shortlist_factor
+            )
+            model.compute_predictions()
+            predictions.append(model.get_predictions())
+        self.assertEqual(predictions[0], predictions[1])
+        # The exact distances rank the vectors like the ball tree
+        self.assertEqual(model.compute_shortlist_recall(), {1: 1.0, 3: 1.0})
+        distances = model.compute_distances_batch(X_test)
+        self.assertTrue((np.isfinite(distances).sum(axis=1) == 6).all())
+
+    def test_shortlist_recall_of_sampled_distances(self):
+        X_train = random_normalised_vectors(40, 4, 13)
+        X_test = random_normalised_vectors(8, 4, 14)
+        y_train = np.array([0, 1, 2, 3] * 10)
+        recall = {}
+        for shots in [16, 10 ** 9]:
+            model = qkn(
+                X_train, X_test, y_train, np.zeros(8), [1, 3],
+                backend='emulated', shortlist_factor=2, shots=shots
+            )
+            recall[shots] = model.compute_shortlist_recall()
+        self.assertEqual(recall[10 ** 9], {1: 1.0, 3: 1.0})
+        self.assertLess(recall[16][3], 1.0)
+
+    def test_shortlist_recall_of_circuit_backends(self):
+        X_train = random_normalised_vectors(12, 4, 13)
+        X_test = random_normalised_vectors(2, 4, 14)
+        y_train = np.array([0, 1, 2, 3] * 3)
+        for backend in ['template', 'index_register']:
+            model = qkn(
+                X_train, X_test, y_train, np.zeros(2), [1, 3],
+                backend=backend, shortlist_factor=2
+            )
+            self.assertEqual(
+                model.compute_shortlist_recall(), {1: 1.0, 3: 1.0})
+        model = qkn(
+            X_train, X_test, y_train, np.zeros(2), [1, 3],
+            backend='aer', shortlist_factor=2
+        )
+        self.assertEqual(model.compute_shortlist_recall(), {})
+
+    def test_distance_store_reused_with_larger_shortlist(self):
+        X_train = random_normalised_vectors(20, 4, 19)
+        X_test = random_normalised_vectors(6, 4, 20)
+        y_train = np.array([0, 1] * 10)
+        with tempfile.TemporaryDirectory() as store_dir:
+            model = qkn(
+                X_train, X_test, y_train, np.zeros(6), [1],
+                backend='analytic', shortlist_factor=2
+            )
+            model.compute_predictions(distance_store_dir=store_dir)
+            # The shortlist of a larger k has more candidates, whose
+            # distances are not in the rows of the first store
+            new_model = qkn(
+                X_train, X_test, y_train, np.zeros(6), [1, 5],
+                backend='analytic', shortlist_factor=2
+            )
+            self.assertNotEqual(new_model.distance_key(), model.distance_key())
+            new_model.compute_predictions(distance_store_dir=store_dir)
+            exhaustive_model = qkn(
+                X_train, X_test, y_train, np.zeros(6), [1, 5],
+                backend='analytic'
+            )
+            exhaustive_model.compute_predictions()
+            self.assertEqual(
+                new_model.get_predictions(),
+                exhaustive_model.get_predictions())
+
+    def test_emulated_shots_are_reproducible(self):
+        X_train = random_normalised_vectors(20, 4, 15)
+        X_test = random_normalised_vectors(7, 4, 16)
+        y_train = np.array([0, 1] * 10)
+        distances = []
+        for batch_size in [2, 7]:
+            model = qkn(
+                X_train, X_test, y_train, np.zeros(7), [1, 3],
+                backend='emulated', batch_size=batch_size, shots=512, seed=3
+            )
+            distances.append(np.concatenate([
+                model.compute_distances_batch(X_test[:batch_size]),
+                model.compute_distances_batch(X_test[batch_size:])
+            ]))
+        np.testing.assert_array_equal(distances[0], distances[1])
+        model.compute_predictions()
+        serial_predictions = model.get_predictions()
+        model.compute_predictions(n_workers=2)
+        self.assertEqual(model.get_predictions(), serial_predictions)
+        exact_distances = qd.distance_prob0_relation(
+            qd.compute_ancilla_probabilities(X_test, X_train))
+        self.assertFalse(np.allclose(distances[0], exact_distances))
+        model.shots = 10 ** 9
+        np.testing.assert_allclose(
+            model.compute_distances_batch(X_test), exact_distances,
+            atol=1e-2
+        )
+
+    def test_adaptive_shots_match_analytic(self):
+        rng = np.random.default_rng(17)
+        centres = random_normalised_vectors(2, 4, 18)
+        y_train = np.array([0, 1] * 15)
+        X_train = qkn.normalise_vector(
+            centres[y_train] + 0.05 * rng.normal(size=(30, 4)))
+        X_test = qkn.normalise_vector(
+            centres[[0, 1, 0, 1]] + 0.05 * rng.normal(size=(4, 4)))
+        predictions = {}
+        for backend in ['analytic', 'adaptive']:
+            model = qkn(
+                X_train, X_test, y_train, np.zeros(4), [1, 3],
+                backend=backend, shots=4096, shots_per_round=128, seed=5
+            )
+            model.compute_predictions()
+            predictions[backend] = model.get_predictions()
+        self.assertEqual(predictions['adaptive'], predictions['analytic'])
+        shot_statistics = model.get_shot_statistics()
+        self.assertEqual(shot_statistics['shots_baseline'], 4 * 30 * 4096)
+        self.assertLess(
+            shot_statistics['shots_used'], shot_statistics['shots_baseline'])
+        model.compute_predictions(n_workers=2)
+        self.assertEqual(model.get_predictions(), predictions['adaptive'])
+        self.assertEqual(model.get_shot_statistics(), shot_statistics)
+
+    def test_adaptive_estimate_stops_far_pairs(self):
+        prob0 = np.array([0.5, 0.52, 0.9, 0.95, 1.0])
+        estimate, shots = qd.estimate_adaptive(
+            qd.binomial_sampler(prob0, np.random.default_rng(0)),
+            len(prob0), 2, 10000, shots_per_round=100
+        )
+        self.assertEqual(np.argsort(estimate, kind='stable')[:2].tolist(),
+                         [0, 1])
+        self.assertTrue((shots[2:] < 10000).all())
+        self.assertTrue((shots[:2] == 10000).all())
+
+    def test_adaptive_estimate_keeps_discarded_pairs_last(self):
+        # Pair 2 looks far in the first round and is discarded, while
+        # the next rounds of pairs 0 and 1 end with larger estimates
+        # than its own
+        first_round = np.array([0.4, 0.4, 0.85])
+        rounds = np.zeros(3, dtype=int)
+
+        def sampler(indexes, shots):
+            rates = np.where(rounds[indexes] == 0, first_round[indexes], 0.95)
+            rounds[indexes] += 1
+            return np.round(rates * shots)
+
+        estimate, shots = qd.estimate_adaptive(
+            sampler, 3, 2, 1000, shots_per_round=100)
+        self.assertEqual(shots.tolist(), [1000, 1000, 100])
+        self.assertGreater(estimate[:2].max(), 0.85)
+        self.assertEqual(np.argsort(estimate, kind='stable')[:2].tolist(),
+                         [0, 1])
+
+    def test_index_register_matches_analytic(self):
+        for n, n_train in [(4, 5), (8, 8), (2, 1)]:
+            X_train = random_normalised_vectors(n_train, n, 19)
+            X_test = random_normalised_vectors(2, n, 20)
+            engine = IndexRegisterDistance(X_train)
+            for x in X_test:
+                np.testing.assert_allclose(
+                    engine.compute_ancilla_probabilities(x),
+                    qd.compute_ancilla_probabilities(x, X_train)[0],
+                    atol=1e-10
+                )
+        X_train = random_normalised_vectors(6, 4, 21)
+        X_test = random_normalised_vectors(4, 4, 22)
+        predictions = {}
+        for backend in ['analytic', 'index_register']:
+            model = qkn(
+                X_train, X_test, [0, 1, 2] * 2, np.zeros(4), [1, 3],
+                backend=backend
+            )
+            model.compute_predictions(n_workers=2)
+            predictions[backend] = model.get_predictions()
+        self.assertEqual(
+            predictions['index_register'], predictions['analytic'])
+
+    def test_feature_cache_matches_csv(self):
+        dataset_path = current_path + (
+            '/../neasqc_wp61/data/toy_dataset/'
+            'toy_dataset_bert_sentence_embedding_{}.csv')
+        train_path = dataset_path.format('train')
+        test_path = dataset_path.format('test')
+        expected = qkn.load_labels(train_path, test_path, 8)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cached = []
+            for _ in range(2):
+                cached.append(qkn.load_labels(
+                    train_path, test_path, 8, cache_dir=cache_dir))
+                X_train, X_test, y_train, y_test = cached[-1]
+                self.assertIsInstance(X_train, np.memmap)
+                self.assertEqual(X_train.dtype, np.float32)
+                # The PCA solver is randomised, so refitting it is
+                # only reproducible up to a small error
+                np.testing.assert_allclose(X_train, expected[0], atol=1e-2)
+                np.testing.assert_allclose(X_test, expected[1], atol=1e-2)
+                np.testing.assert_array_equal(y_train, expected[2])
+                np.testing.assert_array_equal(y_test, expected[3])
+            for first, second in zip(*cached):
+                np.testing.assert_array_equal(first, second)
+            self.assertEqual(len(os.listdir(cache_dir)), 5)
+            qkn.load_labels(train_path, test_path, 4, cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 10)
+
+    def test_predict_batch_matches_predictions(self):
+        X_train = random_normalised_vectors(12, 4, 23)
+        X_test = random_normalised_vectors(5, 4, 24)
+        y_train = np.array(['a', 'b', 'c'] * 4)
+        model = qkn(
+            X_train, X_test, y_train, np.zeros(5), [1, 3],
+            backend='analytic'
+        )
+        model.compute_predictions()
+        stream_model = qkn(
+            X_train, np.empty((0, 4)), y_train, [], [1, 3],
+            backend='analytic'
+        )
+        self.assertEqual(
+            stream_model.predict_batch(X_test).tolist(),
+            model.get_predictions()
+        )
+
+    def test_micro_batch_isolates_malformed_queries(self):
+        rng = np.random.default_rng(25)
+        pca = PCA(n_components=3).fit(rng.normal(size=(20, 6)))
+        X_train = random_normalised_vectors(12, 4, 26)
+        y_train = np.array([0, 1, 2] * 4)
+        model = qkn(
+            X_train, np.empty((0, 4)), y_train, [], [1, 3],
+            backend='analytic'
+        )
+        queries = rng.normal(size=(3, 6)).tolist()
+        micro_batch = [
+            ('a', queries[0], None),
+            ('b', [1.0, 2.0], None),
+            ('c', str(queries[1]), None),
+            ('d', [[1.0, 2.0], [3.0]], None),
+            ('e', None, 'KeyError()'),
+            ('f', queries[2], None),
+        ]
+        records = classify_micro_batch(model, pca, model.classes, micro_batch)
+        self.assertEqual([record['id'] for record in records], list('abcdef'))
+        self.assertEqual(
+            [position for position, record in enumerate(records)
+             if 'error' in record],
+            [1, 3, 4]
+        )
+        expected = classify_micro_batch(
+            model, pca, model.classes, [micro_batch[i] for i in [0, 2, 5]])
+        self.assertEqual([records[i] for i in [0, 2, 5]], expected)
+
+    def test_normalise_and_pad_vectors(self):
+        X = np.arange(1, 13, dtype=np.float32).reshape(4, 3)
+        X_normalised = qkn.normalise_vector(X)
+        self.assertEqual(X_normalised.dtype, np.float64)
+        np.testing.assert_allclose(np.linalg.norm(X_normalised, axis=1), 1)
+        X_padded = qkn.pad_zeros_vector(X_normalised)
+        self.assertEqual(X_padded.shape, (4, 4))
+        np.testing.assert_array_equal(X_padded[:, :3], X_normalised)
+        np.testing.assert_array_equal(X_padded[:, 3], 0)
+
+    def test_template_matches_analytic(self):
+        for n in [2, 3, 8, 16]:
+            X = random_normalised_vectors(5, n, 25)
+            X[1] *= -1
+            prob0 = qd.compute_many_from_template(X[0], X)
+            np.testing.assert_allclose(
+                prob0, qd.compute_ancilla_probabilities(X[0], X)[0],
+                atol=1e-10
+            )
+        n_templates = len(qd.templates)
+        qd.compute_many_from_template(X[1], X)
+        self.assertEqual(len(qd.templates), n_templates)
+        X_train = random_normalised_vectors(12, 4, 26)
+        X_test = random_normalised_vectors(5, 4, 27)
+        predictions = {}
+        for backend in ['analytic', 'template']:
+            model = qkn(
+                X_train, X_test, [0, 1, 2] * 4, np.zeros(5), [1, 3],
+                backend=backend
+            )
+            model.compute_predictions()
+            predictions[backend] = model.get_predictions()
+        self.assertEqual(predictions['template'], predictions['analytic'])
+
+    def test_cross_validation_matches_held_out_models(self):
+        X_train = random_normalised_vectors(9, 4, 28)
+        y_train = np.array([0, 1, 2] * 3)
+        model = qkn(
+            X_train, X_train, y_train, y_train, [1, 3, 9],
+            backend='emulated', shots=256
+        )
+        distances = model.compute_train_distance_matrix()
+        np.testing.assert_array_equal(distances, distances.T)
+        np.testing.assert_array_equal(np.diag(distances), 0)
+        exact_distances = qd.distance_prob0_relation(
+            qd.compute_ancilla_probabilities(X_train, X_train))
+        analytic_model = qkn(
+            X_train, X_train, y_train, y_train, [1, 3, 9],
+            backend='analytic'
+        )
+        np.testing.assert_allclose(
+            analytic_model.compute_train_distance_matrix(),
+            exact_distances - np.diag(np.diag(exact_distances)), atol=1e-12
+        )
+        for n_folds in [None, 3]:
+            predictions, accuracies = model.cross_validate(
+                n_folds=n_folds, seed=1, distances=distances)
+            if n_folds is None:
+                folds = [[i] for i in range(9)]
+            else:
+                folds = np.array_split(
+                    np.random.default_rng(1).permutation(9), 3)
+            for fold in folds:
+                kept = np.setdiff1d(np.arange(9), fold)
+                held_out_model = qkn(
+                    X_train[kept], X_train[fold], y_train[kept],
+                    y_train[fold], [1, 3, 9], backend='analytic'
+                )
+                pred_batch = held_out_model.labels_majority_vote_batch(
+                    held_out_model.compute_minimum_distances_batch(
+                        distances[np.ix_(fold, kept)], 9))
+                np.testing.assert_array_equal(predictions[fold], pred_batch)
+            self.assertEqual(
+                accuracies[3], np.mean(predictions[:, 1] == y_train))
+
+    def test_gate_cache_reuses_training_gates(self):
+        qd.clear_gate_cache()
+        X_train = random_normalised_vectors(6, 4, 2)
+        X_test = random_normalised_vectors(3, 4, 3)
+        model = qkn(X_train, X_test, [0, 1] * 3, [0] * 3, [1])
+        self.assertEqual(qd.gate_cache_info()['misses'], 6)
+        self.assertEqual(len(qd.transpiled_cache), 6)
+        model.compute_predictions()
+        info = qd.gate_cache_info()
+        # Only the test vectors are synthesised after warming the cache,
+        # the training vectors are taken already transpiled
+        self.assertEqual(info['misses'], 6 + 3)
+        self.assertEqual(info['hits'], 0)
+        self.assertEqual(len(qd.transpiled_cache), 6)
+        self.assertLessEqual(info['size'], info['maxsize'])
+
+    def test_compute_many_faster_than_single_circuits(self):
+        qd.clear_gate_cache()
+        X = random_normalised_vectors(32, 4, 5)
+        # Warms the caches shared by both paths
+        qd.compute_many(X[0], X)
+        start = time.perf_counter()
+        for sample in X[1:4]:
+            qd.compute_many(sample, X)
+        batched_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for sample in X[1:4]:
+            for vector in X:
+                qd(sample, vector).compute_quantum_distance()
+        per_pair_time = time.perf_counter() - start
+        self.assertLess(batched_time, per_pair_time / 2)
+
+    def test_gate_cache_lru_eviction(self):
+        qd.clear_gate_cache()
+        maxsize = qd.gate_cache_maxsize
+        qd.set_gate_cache_maxsize(2)
+        X = random_normalised_vectors(3, 2, 4)
+        model = qd(X[0], X[1])
+        gate_0 = model.build_gate_state_preparation(X[0])
+        model.build_gate_state_preparation(X[1])
+        self.assertIs(model.build_gate_state_preparation(X[0]), gate_0)
+        model.build_gate_state_preparation(X[2])
+        # X[1] was the least recently used gate, so it was evicted
+        self.assertEqual(qd.gate_cache_info()['size'], 2)
+        model.build_gate_state_preparation(X[1])
+        self.assertEqual(qd.gate_cache_info()['misses'], 4)
+        qd.set_gate_cache_maxsize(maxsize)
+
+    def test_unknown_backend(self):
+        X = random_normalised_vectors(2, 2, 0)
+        with self.assertRaises(ValueError):
+            qkn(X, X, [0, 1], [0, 1], [1], backend='gpu')
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import os
+import socket
+import sys
+import tempfile
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../neasqc_wp61/models/quantum/alpha/module/")
+sys.path.append(current_path + "/../neasqc_wp61/models/quantum/common/")
+sys.path.append(current_path)
+from alpha_3_multiclass_trainer import Alpha_3_multiclass_trainer
+from distributed import init_distributed
+from synthetic_datasets import write_dataset
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+
+def make_trainer(directory, distributed):
+    return Alpha_3_multiclass_trainer(
+        "Adam", 0, 3, os.path.join(directory, "dataset.csv"),
+        os.path.join(directory, "test.csv"), 7, 3, 0.01, 8, 0.05, 0.0, 2,
+        0.5, simulator="torch", distributed=distributed)
+
+
+def train_process(rank, world_size, port, directory):
+    os.environ["MASTER_ADDR"] = "127.0.0.1"
+    os.environ["MASTER_PORT"] = str(port)
+    os.environ["RANK"] = str(rank)
+    os.environ["WORLD_SIZE"] = str(world_size)
+    torch.set_num_threads(1)
+    init_distributed()
+    trainer = make_trainer(directory, distributed=True)
+    result = trainer.train()
+    predictions = trainer.predict().tolist()
+    final_model = {
+        name: value.clone()
+        for name, value in trainer.model.state_dict().items()
+    }
+    test_logs = trainer.compute_test_logs(result[-1])
+    torch.save(
+        (result, predictions, test_logs, final_model),
+        os.path.join(directory, f"rank_{rank}.pt"))
+    dist.destroy_process_group()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TestDistributedTraining(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        write_dataset(
+            os.path.join(self.directory.name, "dataset.csv"), 90, 0,
+            sentence_dim=768)
+        write_dataset(
+            os.path.join(self.directory.name, "test.csv"), 21, 1,
+            with_split=False, sentence_dim=768)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_two_processes(self):
+        world_size = 2
+        mp.spawn(
+            train_process,
+            args=(world_size, free_port(), self.directory.name),
+            nprocs=world_size)
+        outputs = [
+            torch.load(os.path.join(self.directory.name, f"rank_{rank}.pt"))
+            for rank in range(world_size)
+        ]
+        result, predictions, test_logs, final_model = outputs[0]
+
+        # Every process holds the same reduced metrics and weights, and so
+        # selects the same best model
+        for other in outputs[1:]:
+            self.assertEqual(other[0][:5], result[:5])
+            for name, value in result[5].items():
+                torch.testing.assert_close(other[0][5][name], value)
+            np.testing.assert_array_equal(other[1], predictions)
+            self.assertEqual(other[2], test_logs)
+        self.assertEqual(result[4], max(result[3]))
+
+        # The metrics reduced over the shards are those of one process
+        # evaluating the whole sets with the same weights
+        trainer = make_trainer(self.directory.name, distributed=False)
+        trainer.model.load_state_dict(final_model)
+        validation_loss, validation_acc = trainer.validate()
+        self.assertAlmostEqual(result[2][-1], validation_loss, places=6)
+        self.assertEqual(result[3][-1], validation_acc)
+        np.testing.assert_array_equal(trainer.predict(), predictions)
+        self.assertEqual(len(predictions), len(trainer.validation_dataset))
+        np.testing.assert_allclose(
+            trainer.compute_test_logs(result[5]), test_logs, rtol=1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import importlib.util
+import os
+import sys
+import tempfile
+from unittest import mock
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../neasqc_wp61/models/quantum/common/")
+sys.path.append(current_path)
+import feature_store
+from feature_store import write_feature_store, open_feature_store
+from synthetic_datasets import write_dataset
+import numpy as np
+
+
+def load_utils(folder):
+    # The alpha and beta_2_3 folders both have a utils module
+    spec = importlib.util.spec_from_file_location(
+        f"{folder}_utils",
+        current_path + f"/../neasqc_wp61/models/quantum/{folder}/utils.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+alpha_utils = load_utils("alpha/module")
+beta_utils = load_utils("beta_2_3")
+
+
+class TestFeatureStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dataset = os.path.join(self.directory.name, "dataset.csv")
+        self.test = os.path.join(self.directory.name, "test.csv")
+        write_dataset(self.dataset, 60, 0)
+        write_dataset(self.test, 15, 1, with_split=False)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def assert_same_fold(self, fold, expected):
+        for values, expected_values in zip(fold, expected):
+            self.assertEqual(len(values), len(expected_values))
+            np.testing.assert_array_equal(
+                np.array(values.tolist(), dtype=np.float32),
+                np.array(expected_values.tolist(), dtype=np.float32))
+
+    def test_loaders_match_csv(self):
+        loaders = [
+            alpha_utils.preprocess_train_test_dataset_for_alpha_3,
+            beta_utils.preprocess_train_test_dataset_for_beta_2,
+            beta_utils.preprocess_train_test_dataset_for_beta_3,
+        ]
+        expected = [
+            [loader(run, self.dataset, self.test) for run in [0, 5]]
+            for loader in loaders
+        ]
+        write_feature_store(self.dataset, chunk_size=7)
+        write_feature_store(self.test, chunk_size=7)
+        for loader, loader_expected in zip(loaders, expected):
+            for run, fold_expected in zip([0, 5], loader_expected):
+                self.assert_same_fold(
+                    loader(run, self.dataset, self.test), fold_expected)
+
+    def test_store_columns(self):
+        store_path = write_feature_store(self.dataset, chunk_size=7)
+        store = open_feature_store(store_path)
+        self.assertEqual(store["sentence_embedding"].shape, (60, 6))
+        self.assertEqual(store["sentence_embedding"].dtype, np.float32)
+        self.assertIsInstance(store["sentence_embedding"], np.memmap)
+        self.assertEqual(store["reduced_embedding_4"].shape, (60, 3))
+        self.assertEqual(len(store["split"]), 60)
+        self.assertEqual(len(store["class"]), 60)
+        self.assertNotIn("sentence", store)
+
+    def test_interrupted_rerun_falls_back(self):
+        write_feature_store(self.dataset)
+        with mock.patch.object(
+                feature_store, "parse_embeddings",
+                side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                write_feature_store(self.dataset)
+        self.assertIsNone(open_feature_store(self.dataset))
+
+    def test_modified_csv_falls_back(self):
+        write_feature_store(self.dataset)
+        self.assertIsNotNone(open_feature_store(self.dataset))
+        write_dataset(self.dataset, 61, 0)
+        self.assertIsNone(open_feature_store(self.dataset))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import os
+import sys
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../neasqc_wp61/models/quantum/beta_2_3/")
+from beta_2_3_model import Beta_2_3_model
+import torch
+import pennylane as qml
+
+
+class TestQMLDevice(unittest.TestCase):
+
+    def outputs_and_gradients(self, **kwargs):
+        torch.manual_seed(0)
+        model = Beta_2_3_model(3, 1.0, 4, "cpu", **kwargs)
+        inputs = torch.randn(4, 3)
+        outputs = model(inputs)
+        outputs[:, 0].sum().backward()
+        return outputs.detach(), model.q_params.grad
+
+    def test_devices_and_diff_methods_agree(self):
+        reference = self.outputs_and_gradients(diff_method="backprop")
+        for qml_device, diff_method in [
+            ("default.qubit", "adjoint"),
+            ("default.qubit", "parameter-shift"),
+            ("lightning.qubit", "adjoint"),
+            ("lightning.qubit", "parameter-shift"),
+        ]:
+            with self.subTest(qml_device=qml_device, diff_method=diff_method):
+                outputs, grad = self.outputs_and_gradients(
+                    qml_device=qml_device, diff_method=diff_method)
+                torch.testing.assert_close(
+                    outputs, reference[0], atol=1e-5, rtol=0)
+                torch.testing.assert_close(
+                    grad, reference[1], atol=1e-5, rtol=0)
+
+    def test_shots(self):
+        model = Beta_2_3_model(3, 1.0, 4, "cpu", shots=100)
+        self.assertEqual(model.quantum_net.device.shots, 100)
+        outputs = model(torch.randn(4, 3))
+        self.assertEqual(outputs.shape, (4, 4))
+
+    def test_invalid_combination(self):
+        with self.assertRaises(qml.QuantumFunctionError):
+            Beta_2_3_model(
+                3, 1.0, 4, "cpu", qml_device="lightning.qubit",
+                diff_method="backprop")
+
+
+if __name__ == "__main__":
+    unittest.main()
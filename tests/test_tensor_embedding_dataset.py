@@ -0,0 +1,102 @@
+import unittest
+import os
+import sys
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../neasqc_wp61/models/quantum/alpha/module/")
+sys.path.append(current_path + "/../neasqc_wp61/models/quantum/common/")
+from utils import BertEmbeddingDataset
+from fold_cache import FoldCache
+from tensor_datasets import TensorEmbeddingDataset, TensorBatchSampler
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import DataLoader
+
+
+class TestTensorEmbeddingDataset(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.X = pd.Series(rng.normal(size=(37, 5)).tolist())
+        self.Y = pd.Series(np.eye(3)[rng.integers(3, size=37)].tolist())
+
+    def batches(self, dataset, tensor_batches, shuffle, seed):
+        torch.manual_seed(seed)
+        if tensor_batches:
+            dataloader = DataLoader(
+                dataset, batch_size=None,
+                sampler=TensorBatchSampler(dataset, 8, shuffle=shuffle))
+        else:
+            dataloader = DataLoader(dataset, batch_size=8, shuffle=shuffle)
+        # Two epochs, to check that the order also matches between epochs
+        return [batch for _ in range(2) for batch in dataloader]
+
+    def test_same_batches_as_dataloader(self):
+        for shuffle in [True, False]:
+            expected = self.batches(
+                BertEmbeddingDataset(self.X, self.Y), False, shuffle, 7)
+            batches = self.batches(
+                TensorEmbeddingDataset(self.X, self.Y), True, shuffle, 7)
+            self.assertEqual(len(batches), len(expected))
+            for (inputs, labels), (expected_inputs, expected_labels) in zip(
+                batches, expected
+            ):
+                self.assertEqual(inputs.dtype, expected_inputs.dtype)
+                self.assertEqual(labels.dtype, expected_labels.dtype)
+                torch.testing.assert_close(inputs, expected_inputs)
+                torch.testing.assert_close(labels, expected_labels)
+
+    def test_tensors_are_contiguous_float32(self):
+        dataset = TensorEmbeddingDataset(self.X, self.Y)
+        self.assertEqual(len(dataset), 37)
+        for tensor in [dataset.X, dataset.Y]:
+            self.assertEqual(tensor.dtype, torch.float32)
+            self.assertTrue(tensor.is_contiguous())
+
+
+class TestFoldCache(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        rng = np.random.default_rng(0)
+
+        def preprocess_fold(run_number, dataset_path, test_path):
+            self.calls.append(run_number)
+            X = pd.Series(rng.normal(size=(6, 2)).tolist())
+            Y = pd.Series(np.eye(3)[[0, 1, 2, 0, 1, 1]].tolist())
+            return X, X, X, Y, Y, Y
+
+        self.preprocess_fold = preprocess_fold
+
+    def test_runs_of_a_fold_share_the_datasets(self):
+        calls = self.calls
+        preprocess_fold = self.preprocess_fold
+        fold_cache = FoldCache(
+            "dataset.csv", "test.csv", share_memory=True,
+            keep_all_folds=True)
+        run_0 = fold_cache.get(preprocess_fold, 0)
+        run_1 = fold_cache.get(preprocess_fold, 1)
+        run_2 = fold_cache.get(preprocess_fold, 2)
+        self.assertEqual(calls, [0, 2])
+        self.assertIs(run_0, run_1)
+        self.assertIsNot(run_0[0], run_2[0])
+        # The test set is the same for every fold
+        self.assertIs(run_0[2], run_2[2])
+        self.assertEqual(run_0[3], 3)
+        self.assertTrue(run_0[0].X.is_shared())
+        self.assertEqual(len(fold_cache.folds), 2)
+
+    def test_sequential_runs_hold_one_fold(self):
+        fold_cache = FoldCache("dataset.csv", "test.csv")
+        run_0 = fold_cache.get(self.preprocess_fold, 0)
+        run_1 = fold_cache.get(self.preprocess_fold, 1)
+        run_2 = fold_cache.get(self.preprocess_fold, 2)
+        self.assertIs(run_0, run_1)
+        self.assertEqual(list(fold_cache.folds.values()), [run_2])
+        self.assertIs(run_0[2], run_2[2])
+        fold_cache.get(self.preprocess_fold, 0)
+        self.assertEqual(self.calls, [0, 2, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
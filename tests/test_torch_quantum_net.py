@@ -0,0 +1,76 @@
+import unittest
+import os
+import sys
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../neasqc_wp61/models/quantum/alpha/module/")
+sys.path.append(current_path + "/../neasqc_wp61/models/quantum/beta_2_3/")
+from alpha_3_multiclass_model import Alpha_3_multiclass_model
+from beta_2_3_model import Beta_2_3_model
+import torch
+
+
+def outputs_and_gradients(model, inputs):
+    model.zero_grad()
+    outputs = model(inputs)
+    outputs[:, 0].sum().backward()
+    return outputs.detach(), model.q_params.grad.clone()
+
+
+class TestTorchQuantumNet(unittest.TestCase):
+
+    def assert_simulators_match(self, model_class, n_qubits, n_features):
+        torch.manual_seed(n_qubits)
+        model = model_class(n_qubits, 1.0, 4, "cpu")
+        inputs = torch.randn(5, n_features)
+        model.simulator = "pennylane"
+        qnode_outputs, qnode_grad = outputs_and_gradients(model, inputs)
+        model.simulator = "torch"
+        torch_outputs, torch_grad = outputs_and_gradients(model, inputs)
+        self.assertEqual(torch_outputs.shape, (5, 4))
+        torch.testing.assert_close(
+            torch_outputs, qnode_outputs, atol=1e-6, rtol=0)
+        torch.testing.assert_close(
+            torch_grad, qnode_grad, atol=1e-6, rtol=0)
+
+    def test_alpha_3_simulators_match(self):
+        for n_qubits in [1, 3, 5]:
+            self.assert_simulators_match(
+                Alpha_3_multiclass_model, n_qubits, 768)
+
+    def test_beta_2_3_simulators_match(self):
+        for n_qubits in [2, 4]:
+            self.assert_simulators_match(Beta_2_3_model, n_qubits, n_qubits)
+
+    def test_frozen_model_matches_simulation(self):
+        for model_class, n_qubits, n_features in [
+            (Alpha_3_multiclass_model, 3, 768),
+            (Beta_2_3_model, 1, 1),
+            (Beta_2_3_model, 5, 5),
+        ]:
+            torch.manual_seed(n_qubits)
+            model = model_class(n_qubits, 1.0, 4, "cpu")
+            inputs = torch.randn(300, n_features)
+            with torch.no_grad():
+                expected = model(inputs)
+                model.freeze()
+                frozen = model(inputs)
+                model.unfreeze()
+                unfrozen = model(inputs)
+            torch.testing.assert_close(frozen, expected, atol=1e-6, rtol=0)
+            torch.testing.assert_close(unfrozen, expected)
+
+    def test_state_dict_does_not_depend_on_simulator(self):
+        pennylane_model = Beta_2_3_model(3, 0.01, 4, "cpu")
+        torch_model = Beta_2_3_model(3, 0.01, 4, "cpu", simulator="torch")
+        self.assertEqual(
+            pennylane_model.state_dict().keys(),
+            torch_model.state_dict().keys())
+        torch_model.load_state_dict(pennylane_model.state_dict())
+
+    def test_unknown_simulator(self):
+        with self.assertRaises(ValueError):
+            Beta_2_3_model(3, 0.01, 4, "cpu", simulator="qiskit")
+
+
+if __name__ == "__main__":
+    unittest.main()
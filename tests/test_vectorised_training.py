@@ -0,0 +1,80 @@
+import unittest
+import os
+import sys
+import tempfile
+current_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_path + "/../neasqc_wp61/models/quantum/alpha/module/")
+sys.path.append(current_path + "/../neasqc_wp61/models/quantum/common/")
+sys.path.append(current_path)
+from alpha_3_multiclass_trainer import Alpha_3_multiclass_trainer
+from fold_cache import FoldCache
+from vectorised_training import train_vectorised
+from synthetic_datasets import write_dataset
+import numpy as np
+import torch
+
+
+class TestVectorisedTraining(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dataset = os.path.join(self.directory.name, "dataset.csv")
+        self.test = os.path.join(self.directory.name, "test.csv")
+        write_dataset(self.dataset, 90, 0, sentence_dim=768)
+        write_dataset(
+            self.test, 20, 1, with_split=False, sentence_dim=768)
+        self.fold_cache = FoldCache(self.dataset, self.test)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_trainer(self, run_number, simulator="torch"):
+        return Alpha_3_multiclass_trainer(
+            "Adam", run_number, 3, self.dataset, self.test,
+            100 + run_number, 3, 0.01, 8, 0.05, 0.0, 2, 0.5,
+            simulator=simulator, fold_cache=self.fold_cache)
+
+    def test_same_results_as_sequential_runs(self):
+        # Runs 0 and 1 share a fold, run 2 trains on another fold with a
+        # different number of batches
+        runs = [0, 1, 2]
+        expected = []
+        for run_number in runs:
+            trainer = self.make_trainer(run_number)
+            result = trainer.train()
+            expected.append(
+                result + (trainer.compute_test_logs(result[-1]),))
+
+        trainers = []
+        rng_states = []
+        for run_number in runs:
+            trainers.append(self.make_trainer(run_number))
+            rng_states.append(torch.get_rng_state())
+        self.assertNotEqual(
+            len(trainers[0].training_dataloader),
+            len(trainers[2].training_dataloader))
+        results = train_vectorised(trainers, rng_states)
+
+        for trainer, result, expected_result in zip(
+                trainers, results, expected):
+            for values, expected_values in zip(
+                    result[:5], expected_result[:5]):
+                np.testing.assert_allclose(
+                    values, expected_values, rtol=1e-5, atol=1e-6)
+            # Adam amplifies the float32 rounding of the batched matrix
+            # products for the weights with small gradients
+            for name, value in result[5].items():
+                torch.testing.assert_close(
+                    value, expected_result[5][name], rtol=1e-4, atol=1e-4)
+            np.testing.assert_allclose(
+                trainer.compute_test_logs(result[5]), expected_result[6],
+                rtol=1e-5, atol=1e-6)
+
+    def test_rejects_pennylane_simulator(self):
+        trainer = self.make_trainer(0, simulator="pennylane")
+        with self.assertRaises(ValueError):
+            train_vectorised([trainer], [torch.get_rng_state()])
+
+
+if __name__ == "__main__":
+    unittest.main()